@@ -3,12 +3,11 @@ import os
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox, Canvas, Scrollbar, Frame
-from PIL import Image, ImageTk
 import yt_dlp
-import io
-import requests
 import datetime
 import re
+from thumbnail_cache import ThumbnailLoader
+from ydl_profiles import AUDIO_FORMAT
 
 class VideoDownloader:
     def __init__(self, master):
@@ -25,6 +24,7 @@ class VideoDownloader:
 
         self.tk_thumbnail_images = {} # Dictionary to store thumbnail images for multiple items
         self.media_info_list = [] # To store all extracted info for playlist items
+        self.thumbnail_loader = ThumbnailLoader(self.master, size=(120, 67)) # Background, cached thumbnail fetching
 
         self.create_widgets()
 
@@ -56,7 +56,7 @@ class VideoDownloader:
 
         ttk.Label(input_frame, text="Choose Quality:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
         self.quality_combo = ttk.Combobox(input_frame, textvariable=self.selected_quality, state="readonly", width=15)
-        self.quality_combo['values'] = ("best", "worst", "audio")
+        self.quality_combo['values'] = ("best", "worst", "audio", "audio-mp3")
         self.quality_combo.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         self.quality_combo.set("best")
 
@@ -134,6 +134,7 @@ class VideoDownloader:
         for widget in self.scrollable_content.winfo_children():
             widget.destroy()
         self.tk_thumbnail_images.clear() # Clear stored image references
+        self.thumbnail_loader.cancel_pending() # Ignore thumbnails still loading for the old list
 
         self.update_status("Analyzing URL...")
         self.progress['value'] = 0
@@ -192,28 +193,14 @@ class VideoDownloader:
             item_frame = ttk.Frame(self.scrollable_content, style="ItemFrame.TFrame")
             item_frame.pack(fill="x", pady=5, padx=5, expand=True) # Use pack for item frames within scrollable_content
 
-            # Thumbnail
+            # Thumbnail: placeholder now, loaded in the background and swapped in
             thumbnail_url = item_info.get("thumbnail")
-            tk_img = None
+            thumbnail_label = ttk.Label(item_frame, text="Loading..." if thumbnail_url else "No Image",
+                                        style="ItemLabel.TLabel", width=15, anchor="center")
+            thumbnail_label.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
             if thumbnail_url:
-                try:
-                    response = requests.get(thumbnail_url, timeout=5)
-                    response.raise_for_status()
-                    img_data = response.content
-                    img = Image.open(io.BytesIO(img_data))
-                    img.thumbnail((120, 67), Image.LANCZOS) # Standard 16:9 ratio, smaller size
-                    tk_img = ImageTk.PhotoImage(img)
-                    self.tk_thumbnail_images[item_info.get('id', i)] = tk_img # Store reference
-                except Exception as img_e:
-                    print(f"Failed to load thumbnail for {item_info.get('title', 'N/A')}: {img_e}")
-            
-            if tk_img:
-                thumbnail_label = ttk.Label(item_frame, image=tk_img, style="ItemLabel.TLabel")
-                thumbnail_label.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
-                thumbnail_label.image = tk_img # Keep reference
-            else:
-                fallback_label = ttk.Label(item_frame, text="No Image", style="ItemLabel.TLabel", width=15, anchor="center")
-                fallback_label.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
+                self.thumbnail_loader.request(
+                    thumbnail_url, lambda tk_img, label=thumbnail_label, key=item_info.get('id', i): self._set_thumbnail(label, key, tk_img))
 
             # Info and Button Frame
             info_button_frame = ttk.Frame(item_frame, style="ItemFrame.TFrame")
@@ -233,6 +220,17 @@ class VideoDownloader:
         self.canvas.yview_moveto(0) # Scroll to top after loading all items
         self.canvas.update_idletasks() # Ensure scroll region is updated
 
+    def _set_thumbnail(self, label, key, tk_img):
+        """Swap a row's placeholder for its thumbnail once it has loaded."""
+        if not label.winfo_exists():
+            return
+        if tk_img is None:
+            label.config(text="No Image")
+            return
+        self.tk_thumbnail_images[key] = tk_img # Store reference
+        label.config(image=tk_img, text="", width=0)
+        label.image = tk_img # Keep reference
+
     def start_single_download(self, media_url, title):
         """Initiates download for a single media item."""
         if self.download_in_progress:
@@ -334,11 +332,12 @@ class VideoDownloader:
         }
 
         quality = self.selected_quality.get()
-        if quality == "audio":
-            opts['format'] = "bestaudio/best"
+        if quality in ("audio", "audio-mp3"):
+            # Pure audio format; "audio" copies the native m4a/opus stream, "audio-mp3" re-encodes
+            opts['format'] = AUDIO_FORMAT
             opts['postprocessors'].append({
                 'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
+                'preferredcodec': 'mp3' if quality == "audio-mp3" else 'best',
                 'preferredquality': '192',
             })
             opts['extract_audio'] = True
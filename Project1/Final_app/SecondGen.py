@@ -2,14 +2,22 @@
 import os
 import threading
 import tkinter as tk
-from tkinter import filedialog, ttk, messagebox, Canvas, Scrollbar, Frame
-from PIL import Image, ImageTk
+from tkinter import filedialog, ttk, messagebox
 import yt_dlp
-import io
-import requests
-import datetime
-import re
 import logging
+import multiprocessing
+import bandwidth
+import disk_space
+import downloader_core
+import extraction_service
+import format_ranking
+import postprocess_pool
+import playlist_resolver
+import telemetry
+from job_scheduler import JobScheduler, DownloadJob, FINAL_STATES, PAUSED
+from progress_reporter import ProgressReporter, describe, describe_fragments
+from thumbnail_cache import ThumbnailLoader
+from virtual_list import VirtualList
 
 class VideoDownloader:
     def __init__(self, master):
@@ -20,23 +28,41 @@ class VideoDownloader:
         self.master.configure(bg="#2E2E2E")
 
         self.url = tk.StringVar()
-        self.download_in_progress = False
         self.output_path = tk.StringVar(value=os.getcwd())
         self.selected_quality = tk.StringVar(value="best")
+        self.max_concurrent = tk.IntVar(value=4)
+        self.turbo = tk.BooleanVar(value=True)
+        # Shared by every job, e.g. "2M" or "08:00-18:00=1M,10M"; empty means unlimited
+        self.speed_limit = tk.StringVar()
+        self.job_speed_limit = tk.StringVar()
+        # Size budgets such as "500M"; empty means no limit
+        self.item_budget = tk.StringVar()
+        self.batch_budget = tk.StringVar()
+        self._format_choices = {}
 
-        self.tk_thumbnail_images = {}
         self.media_info_list = []
+        self.job_rows = {}
+        # Resolves flat playlist entries in the background; replaced on every analysis
+        self.resolver = None
+        # Analysis and playlist resolving run in worker processes, one per core
+        self.extraction = extraction_service.get_default_service()
+        downloader_core.use_extraction_service(self.extraction)
+
+        # Downloads that would not fit on the disk wait in the queue until they do
+        self.disk_admission = disk_space.DiskAdmission()
+        self.scheduler = JobScheduler(self._download_video_task, max_workers=self.max_concurrent.get(),
+                                      per_host_limit=2, on_update=self._on_job_update, admission=self.disk_admission)
+
+        self.thumbnail_loader = ThumbnailLoader(self.master, size=(120, 67))
+        self.progress_reporter = ProgressReporter(self.master, self._update_progress_gui, interval_ms=100)
 
         self.setup_logging()
         self.create_widgets()
 
     def setup_logging(self):
-        log_file = os.path.join(os.path.dirname(__file__), 'download_log.txt')
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        app_dir = os.path.dirname(__file__)
+        telemetry.setup_logging(os.path.join(app_dir, 'download_log.txt'),
+                                os.path.join(app_dir, 'telemetry.jsonl'))
 
     def create_widgets(self):
         style = ttk.Style()
@@ -63,13 +89,40 @@ class VideoDownloader:
 
         ttk.Label(input_frame, text="Choose Quality:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
         self.quality_combo = ttk.Combobox(input_frame, textvariable=self.selected_quality, state="readonly", width=15)
-        self.quality_combo['values'] = ("best", "worst", "audio")
+        self.quality_combo['values'] = ("best", "worst", "audio", "audio-mp3")
         self.quality_combo.grid(row=1, column=1, padx=5, pady=5, sticky="ew")
         self.quality_combo.set("best")
 
         ttk.Button(input_frame, text="Choose Download Location", command=self.choose_directory).grid(row=2, column=0, padx=5, pady=5, sticky="w")
         ttk.Label(input_frame, textvariable=self.output_path, wraplength=350, justify="left").grid(row=2, column=1, padx=5, pady=5, sticky="ew")
 
+        ttk.Label(input_frame, text="Parallel downloads:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        tk.Spinbox(input_frame, from_=1, to=8, width=5, textvariable=self.max_concurrent,
+                   command=self._on_concurrency_change).grid(row=3, column=1, padx=5, pady=5, sticky="w")
+        ttk.Checkbutton(input_frame, text="Turbo (parallel HLS/DASH fragments)",
+                        variable=self.turbo).grid(row=4, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
+        ttk.Label(input_frame, text="Speed limit (total / per item):").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+        limit_frame = ttk.Frame(input_frame, style="TLabel")
+        limit_frame.grid(row=5, column=1, padx=5, pady=5, sticky="w")
+        for col, var in enumerate((self.speed_limit, self.job_speed_limit)):
+            entry = ttk.Entry(limit_frame, textvariable=var, width=28 if col == 0 else 8)
+            entry.grid(row=0, column=col, padx=(0, 5))
+            entry.bind("<Return>", self._apply_speed_limit)
+            entry.bind("<FocusOut>", self._apply_speed_limit)
+        ttk.Label(limit_frame, text="e.g. 2M or 08:00-18:00=1M", foreground="#888888").grid(row=0, column=2)
+
+        ttk.Label(input_frame, text="Max size (per item / Download All):").grid(row=6, column=0, padx=5, pady=5, sticky="w")
+        budget_frame = ttk.Frame(input_frame, style="TLabel")
+        budget_frame.grid(row=6, column=1, padx=5, pady=5, sticky="w")
+        for col, var in enumerate((self.item_budget, self.batch_budget)):
+            entry = ttk.Entry(budget_frame, textvariable=var, width=10)
+            entry.grid(row=0, column=col, padx=(0, 5))
+            entry.bind("<Return>", self._refresh_format_choices)
+            entry.bind("<FocusOut>", self._refresh_format_choices)
+        ttk.Label(budget_frame, text="e.g. 700M or 5G", foreground="#888888").grid(row=0, column=2)
+        self.quality_combo.bind("<<ComboboxSelected>>", self._refresh_format_choices)
+
         input_frame.grid_columnconfigure(1, weight=1)
 
         action_buttons_frame = ttk.Frame(self.master, style="TLabel")
@@ -78,25 +131,27 @@ class VideoDownloader:
         self.analyze_button = ttk.Button(action_buttons_frame, text="Analyze URL", command=self.start_analyze)
         self.analyze_button.pack(side="left", expand=True, fill="x", padx=5)
 
+        self.download_all_button = ttk.Button(action_buttons_frame, text="Download All", command=self.start_download_all)
+        self.download_all_button.pack(side="left", expand=True, fill="x", padx=5)
+
+        # Overall batch progress; every job also gets its own row in jobs_frame
         self.progress = ttk.Progressbar(self.master, length=500, mode='determinate')
         self.progress.pack(pady=(15, 5), padx=20, fill="x")
 
         self.status_label = ttk.Label(self.master, text="Idle", foreground="#888888")
         self.status_label.pack(pady=5)
+
+        self.jobs_frame = ttk.Frame(self.master, style="TLabel")
+        self.jobs_frame.pack(fill="x", padx=20)
         
         self.preview_canvas_frame = ttk.Frame(self.master, style="TLabel")
         self.preview_canvas_frame.pack(fill="both", expand=True, padx=20, pady=10)
 
-        self.canvas = Canvas(self.preview_canvas_frame, bg="#fdf6ec", highlightthickness=0)
-        self.scrollbar = Scrollbar(self.preview_canvas_frame, orient="vertical", command=self.canvas.yview)
-        self.scrollable_content = Frame(self.canvas, bg="#fdf6ec")
-
-        self.scrollable_content.bind("<Configure>", lambda e: self.canvas.configure(scrollregion=self.canvas.bbox("all")))
-        self.canvas.create_window((0, 0), window=self.scrollable_content, anchor="nw")
-        self.canvas.configure(yscrollcommand=self.scrollbar.set)
-
-        self.canvas.pack(side="left", fill="both", expand=True)
-        self.scrollbar.pack(side="right", fill="y")
+        # Only the rows in view get widgets; they are recycled while scrolling
+        self.media_list = VirtualList(self.preview_canvas_frame, row_height=90, make_row=self._make_media_row,
+                                      bind_row=self._bind_media_row, unbind_row=self._unbind_media_row)
+        self.media_list.pack(fill="both", expand=True)
+        self.canvas = self.media_list.canvas
 
         self.canvas.bind_all("<MouseWheel>", self._on_mousewheel)
         self.canvas.bind_all("<Button-4>", self._on_mousewheel_linux)
@@ -122,14 +177,12 @@ class VideoDownloader:
         if not url:
             messagebox.showerror("Error", "Please enter a video or playlist URL.")
             return
-        
-        if self.download_in_progress:
-            messagebox.showinfo("Please Wait", "A download is in progress, please wait.")
-            return
 
-        for widget in self.scrollable_content.winfo_children():
-            widget.destroy()
-        self.tk_thumbnail_images.clear()
+        if self.resolver:
+            self.resolver.cancel()
+            self.resolver = None
+        self.media_list.set_items([])
+        self.thumbnail_loader.cancel_pending()
 
         self.update_status("Analyzing URL...")
         self.progress['value'] = 0
@@ -161,22 +214,14 @@ class VideoDownloader:
 
     def _try_facebook_methods(self, url):
         """Try multiple methods for Facebook videos"""
-        methods = [
-            self._try_facebook_method_1,
-            self._try_facebook_method_2,
-            self._try_facebook_method_3,
-            self._try_facebook_method_4
-        ]
-        
-        for i, method in enumerate(methods, 1):
-            try:
-                self.master.after(0, lambda: self.update_status(f"Trying Facebook method {i}..."))
-                if method(url):
-                    return True
-            except Exception as e:
-                logging.error(f"Facebook method {i} failed: {e}")
-                continue
-        
+        try:
+            info = downloader_core.extract_facebook(url, on_attempt=lambda name: self.update_status(f"Trying {name}..."))
+            self.media_info_list = [info]
+            self.update_status(f"Found Facebook video: {info.get('title', 'Untitled')}")
+            return True
+        except downloader_core.ExtractionError as e:
+            logging.error(str(e))
+
         # If all methods fail, show error
         self.master.after(0, lambda: self.update_status("All Facebook methods failed"))
         self.master.after(0, lambda: messagebox.showerror("Facebook Error", 
@@ -192,198 +237,22 @@ class VideoDownloader:
             "3. Trying a different Facebook video"))
         return False
 
-    def _try_facebook_method_1(self, url):
-        """Method 1: Standard Facebook extraction with cookies"""
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-User': '?1',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info and self._has_valid_media(info):
-                    self.media_info_list = [info]
-                    self.master.after(0, lambda: self.update_status(f"Found Facebook video: {info.get('title', 'Untitled')}"))
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 1 failed: {e}")
-        return False
-
-    def _try_facebook_method_2(self, url):
-        """Method 2: Facebook with external hit headers"""
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info and self._has_valid_media(info):
-                    self.media_info_list = [info]
-                    self.master.after(0, lambda: self.update_status(f"Found Facebook video: {info.get('title', 'Untitled')}"))
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 2 failed: {e}")
-        return False
-
-    def _try_facebook_method_3(self, url):
-        """Method 3: Try with mobile URL format"""
-        # Convert to mobile URL format
-        mobile_url = url.replace('www.facebook.com', 'm.facebook.com')
-        if '/reel/' in mobile_url:
-            mobile_url = mobile_url.replace('/reel/', '/watch/?v=')
-        
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_7_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Mobile/15E148 Safari/604.1',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(mobile_url, download=False)
-                if info and self._has_valid_media(info):
-                    self.media_info_list = [info]
-                    self.master.after(0, lambda: self.update_status(f"Found Facebook video: {info.get('title', 'Untitled')}"))
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 3 failed: {e}")
-        return False
-
-    def _try_facebook_method_4(self, url):
-        """Method 4: Try with different URL format and no redirects"""
-        # Try different URL formats
-        url_variants = [
-            url,
-            url.replace('/reel/', '/watch/?v='),
-            url.replace('www.facebook.com', 'm.facebook.com'),
-            url.replace('m.facebook.com', 'www.facebook.com')
-        ]
-        
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            },
-            'nocheckcertificate': True,
-            'allow_unplayable_formats': True,
-        }
-        
-        for variant_url in url_variants:
-            try:
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(variant_url, download=False)
-                    if info and self._has_valid_media(info):
-                        self.media_info_list = [info]
-                        self.master.after(0, lambda: self.update_status(f"Found Facebook video: {info.get('title', 'Untitled')}"))
-                        return True
-            except Exception as e:
-                logging.error(f"Facebook method 4 failed for {variant_url}: {e}")
-                continue
-        return False
-
     def _try_standard_extraction(self, url):
         """Standard extraction for non-Facebook URLs"""
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'force_generic_extractor': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            },
-        }
-        
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                logging.info(f"Extracted info for URL: {url} - Extractor: {info.get('extractor', 'Unknown')}")
-                
-                if 'entries' in info and info['entries']:
-                    self.media_info_list = [entry for entry in info['entries'] if entry and self._has_valid_media(entry)]
-                    self.master.after(0, lambda: self.update_status(f"Found {len(self.media_info_list)} items in playlist."))
-                elif info and self._has_valid_media(info):
-                    self.media_info_list = [info]
-                    self.master.after(0, lambda: self.update_status(f"Found single video: {info.get('title', 'Untitled')}"))
-                else:
-                    self.media_info_list = []
-                    self.master.after(0, lambda: self.update_status("Error: No valid media found at URL."))
-                    logging.warning(f"No valid media extracted from {url}")
-                    return False
-                return True
+            # Playlists are listed flat first; _start_resolver fills in each entry afterwards
+            info = downloader_core.extract_listing(url)
+            self.media_info_list = downloader_core.media_entries(info)
+
+            if 'entries' in info and info['entries']:
+                self.master.after(0, lambda: self.update_status(f"Found {len(self.media_info_list)} items in playlist."))
+            elif self.media_info_list:
+                self.master.after(0, lambda: self.update_status(f"Found single video: {info.get('title', 'Untitled')}"))
+            else:
+                self.master.after(0, lambda: self.update_status("Error: No valid media found at URL."))
+                logging.warning(f"No valid media extracted from {url}")
+                return False
+            return True
         except Exception as e:
             self.master.after(0, lambda err=e: self.update_status(f"Error analyzing: {err}"))
             self.master.after(0, lambda err=e: messagebox.showerror("Analysis Error", f"Failed to analyze URL:\n{err}"))
@@ -392,33 +261,11 @@ class VideoDownloader:
 
     def _has_valid_media(self, item_info):
         """Check if item has valid media for download"""
-        if item_info.get('url'):
-            return True
-        
-        formats = item_info.get('formats', [])
-        for fmt in formats:
-            if fmt.get('url'):
-                return True
-        
-        if item_info.get('webpage_url'):
-            return True
-            
-        return False
+        return downloader_core.has_valid_media(item_info)
 
     def _get_download_url(self, item_info):
         """Get the best download URL for an item"""
-        if item_info.get('webpage_url'):
-            return item_info['webpage_url']
-        
-        if item_info.get('url'):
-            return item_info['url']
-        
-        formats = item_info.get('formats', [])
-        for fmt in formats:
-            if fmt.get('url'):
-                return fmt['url']
-        
-        return None
+        return downloader_core.get_download_url(item_info)
 
     def _display_media_items(self):
         if not self.media_info_list:
@@ -426,65 +273,214 @@ class VideoDownloader:
             self.update_status("Idle")
             return
 
-        for i, item_info in enumerate(self.media_info_list):
-            item_frame = ttk.Frame(self.scrollable_content, style="ItemFrame.TFrame")
-            item_frame.pack(fill="x", pady=5, padx=5, expand=True)
-
-            thumbnail_url = item_info.get("thumbnail")
-            tk_img = None
-            if thumbnail_url:
-                try:
-                    response = requests.get(thumbnail_url, timeout=5)
-                    response.raise_for_status()
-                    img_data = response.content
-                    img = Image.open(io.BytesIO(img_data))
-                    img.thumbnail((120, 67), Image.LANCZOS)
-                    tk_img = ImageTk.PhotoImage(img)
-                    self.tk_thumbnail_images[item_info.get('id', i)] = tk_img
-                except Exception as img_e:
-                    logging.error(f"Failed to load thumbnail for {item_info.get('title', 'N/A')}: {img_e}")
-            
-            if tk_img:
-                thumbnail_label = ttk.Label(item_frame, image=tk_img, style="ItemLabel.TLabel")
-                thumbnail_label.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
-                thumbnail_label.image = tk_img
-            else:
-                fallback_label = ttk.Label(item_frame, text="No Image", style="ItemLabel.TLabel", width=15, anchor="center")
-                fallback_label.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
-
-            info_button_frame = ttk.Frame(item_frame, style="ItemFrame.TFrame")
-            info_button_frame.grid(row=0, column=1, rowspan=2, padx=5, pady=5, sticky="nsew")
-            
-            title = item_info.get("title", "Untitled Video")
-            if title is None:
-                title = "Untitled Video"
-                logging.warning(f"Title was None for item {item_info.get('id', i)}, using fallback.")
-            
-            platform = item_info.get('extractor', 'Unknown')
-            title_with_platform = f"[{platform.upper()}] {title}"
-            
-            ttk.Label(info_button_frame, text=title_with_platform, font=("Arial", 10, "bold"), style="ItemLabel.TLabel", wraplength=450, justify="left").pack(pady=(0, 2), anchor="w")
-            ttk.Label(info_button_frame, text=item_info.get("duration_string", "N/A"), style="ItemLabel.TLabel", foreground="#bbb").pack(pady=(0, 5), anchor="w")
+        self._format_choices = {}
+        if any(item.get('_flat') for item in self.media_info_list):
+            self._start_resolver()
+        self.media_list.set_items(self.media_info_list)
+
+    def _start_resolver(self):
+        resolver = playlist_resolver.PlaylistResolver(
+            self._resolve_entry,
+            on_resolved=lambda index, info: self.master.after(0, self._apply_resolved, resolver, index, info),
+            on_failed=lambda index, error: self.master.after(0, self._apply_resolve_failure, resolver, index, error),
+            workers=self.extraction.workers)
+        self.resolver = resolver
+        resolver.start(list(self.media_info_list))
+
+    @staticmethod
+    def _resolve_entry(item):
+        """Runs on the resolver's workers; entries without media count as failed, so their rows say so"""
+        if not item.get('_flat'):
+            return item
+        info = downloader_core.resolve_entry(item)
+        if not info or not downloader_core.has_valid_media(info):
+            raise downloader_core.ExtractionError(f"No downloadable media for {item.get('title') or item.get('url')}")
+        return info
+
+    def _apply_resolved(self, resolver, index, info):
+        if resolver is not self.resolver:
+            return  # from an earlier analysis
+        if info is not self.media_info_list[index]:
+            self.media_info_list[index] = info
+            self.media_list.update_item(index, info)
+        self._show_resolve_progress(resolver)
+
+    def _apply_resolve_failure(self, resolver, index, error):
+        if resolver is not self.resolver:
+            return
+        # Keep the flat entry: downloading it still extracts it from scratch
+        item = dict(self.media_info_list[index], _flat=False, _error=str(error))
+        self.media_info_list[index] = item
+        self.media_list.update_item(index, item)
+        self._show_resolve_progress(resolver)
+
+    def _show_resolve_progress(self, resolver):
+        done = resolver.resolved + resolver.failed
+        if done == resolver.total:
+            failed = f", {resolver.failed} unavailable" if resolver.failed else ""
+            self.status_label.config(text=f"Found {resolver.total} items in playlist{failed}.")
+        elif not self.scheduler.active_count():
+            self.status_label.config(text=f"Found {resolver.total} items, details for {done} so far...")
+
+    def _make_media_row(self, parent):
+        row = ttk.Frame(parent, style="ItemFrame.TFrame")
+        row.index = None
+        row.item = None
+
+        row.thumbnail = ttk.Label(row, style="ItemLabel.TLabel", width=15, anchor="center")
+        row.thumbnail.grid(row=0, column=0, rowspan=2, padx=10, pady=5, sticky="n")
+
+        info_button_frame = ttk.Frame(row, style="ItemFrame.TFrame")
+        info_button_frame.grid(row=0, column=1, rowspan=2, padx=5, pady=5, sticky="nsew")
+
+        row.title = ttk.Label(info_button_frame, font=("Arial", 10, "bold"), style="ItemLabel.TLabel", wraplength=450, justify="left")
+        row.title.pack(pady=(0, 2), anchor="w")
+        row.duration = ttk.Label(info_button_frame, style="ItemLabel.TLabel", foreground="#bbb")
+        row.duration.pack(pady=(0, 5), anchor="w")
+        row.download_btn = ttk.Button(info_button_frame, text="Download", style="ItemButton.TButton",
+                                      command=lambda r=row: self._download_row(r))
+        row.download_btn.pack(pady=(0, 5), anchor="w")
+
+        row.grid_columnconfigure(1, weight=1)
+        return row
+
+    def _bind_media_row(self, row, index, item_info):
+        row.index = index
+        row.item = item_info
+
+        title = item_info.get("title", "Untitled Video")
+        if title is None:
+            title = "Untitled Video"
+            logging.warning(f"Title was None for item {item_info.get('id', index)}, using fallback.")
+        platform = item_info.get('extractor', 'Unknown')
+        row.title.config(text=f"[{platform.upper()}] {title}")
+        if item_info.get('_flat'):
+            # Listed but not resolved yet: rows in view jump the resolver queue
+            if self.resolver:
+                self.resolver.prioritize(index)
+            row.duration.config(text="Loading details...")
+        elif item_info.get('_error'):
+            row.duration.config(text="Details unavailable")
+        else:
+            choice = self._format_choice(index, item_info)
+            row.duration.config(text=" · ".join(filter(None, (item_info.get("duration_string", "N/A"),
+                                                              format_ranking.describe(choice)))))
 
+        if self._get_download_url(item_info):
+            row.download_btn.state(['!disabled'])
+        else:
+            logging.warning(f"No valid URL found for item {item_info.get('id', index)}, disabling download button.")
+            row.download_btn.state(['disabled'])
+
+        # Placeholder now, real image swapped in when the loader delivers it
+        # Flat playlist entries only have the 'thumbnails' list; the last one is the largest
+        thumbnail_url = item_info.get("thumbnail") or ((item_info.get("thumbnails") or [{}])[-1]).get("url")
+        row.thumbnail.config(image="", text="Loading..." if thumbnail_url else "No Image", width=15)
+        row.thumbnail.image = None
+        if thumbnail_url:
+            self.thumbnail_loader.request(thumbnail_url, lambda tk_img, r=row, i=index: self._set_thumbnail(r, i, tk_img))
+
+    def _unbind_media_row(self, row):
+        # Free the PhotoImage as soon as the row scrolls away
+        row.index = None
+        row.item = None
+        row.thumbnail.config(image="", text="")
+        row.thumbnail.image = None
+
+    def _item_budget(self):
+        try:
+            return format_ranking.parse_size(self.item_budget.get())
+        except ValueError:
+            return None
+
+    def _format_choice(self, index, item_info):
+        """Ranked format for a preview item under the per-item budget; memoised per quality and budget"""
+        quality = self.selected_quality.get()
+        if quality == "worst" or not item_info.get('formats'):
+            return None
+        key = (index, quality, self._item_budget())
+        if key not in self._format_choices:
+            self._format_choices[key] = format_ranking.select(item_info, quality, budget=key[2])
+        return self._format_choices[key]
+
+    def _refresh_format_choices(self, event=None):
+        for var in (self.item_budget, self.batch_budget):
+            try:
+                format_ranking.parse_size(var.get())
+            except ValueError as e:
+                messagebox.showerror("Invalid size", str(e))
+                return
+        # Re-bind the rows in view so their predicted sizes follow the new quality/budget
+        first, last = self.media_list.visible_range()
+        for index in range(first, last):
+            self.media_list.update_item(index, self.media_list.items[index])
+
+    def _download_row(self, row):
+        item_info = row.item
+        if not item_info:
+            return
+        title = item_info.get("title") or "Untitled Video"
+        if item_info.get('_flat') and self.resolver:
+            self.resolver.prioritize(row.index, playlist_resolver.SELECTED)
+        choice = self._format_choice(row.index, item_info)
+        if choice is None and self._item_budget() and item_info.get('formats'):
+            messagebox.showerror("Too large", f"No format of '{title}' fits in {self.item_budget.get()}.")
+            return
+        self.start_single_download(self._get_download_url(item_info), title, item_info.get('extractor', 'Unknown'),
+                                   info=item_info, choice=choice)
+
+    def _on_concurrency_change(self):
+        try:
+            self.scheduler.set_max_workers(self.max_concurrent.get())
+        except (tk.TclError, ValueError):
+            pass
+
+    def _apply_speed_limit(self, event=None):
+        # Running downloads pick the new limits up right away
+        try:
+            bandwidth.get_default_governor().configure_from_text(self.speed_limit.get(), self.job_speed_limit.get())
+        except ValueError as e:
+            messagebox.showerror("Invalid speed limit", str(e))
+
+    def start_download_all(self):
+        if not self.media_info_list:
+            messagebox.showinfo("Info", "Analyze a URL first.")
+            return
+        try:
+            batch_budget = format_ranking.parse_size(self.batch_budget.get())
+        except ValueError as e:
+            messagebox.showerror("Invalid size", str(e))
+            return
+        quality = self.selected_quality.get()
+        if batch_budget and quality != "worst":
+            choices = format_ranking.select_batch(self.media_info_list, quality, budget=batch_budget)
+            total = sum(choice['bytes'] for choice in choices if choice)
+            if total > batch_budget and not messagebox.askyesno(
+                    "Over budget", f"Even the smallest formats need ~{format_ranking.format_size(total)}, "
+                                   f"more than {self.batch_budget.get()}.\nDownload them anyway?"):
+                return
+        else:
+            choices = [self._format_choice(index, item_info) for index, item_info in enumerate(self.media_info_list)]
+        for item_info, choice in zip(self.media_info_list, choices):
             download_url = self._get_download_url(item_info)
-            if not download_url:
-                logging.warning(f"No valid URL found for item {item_info.get('id', i)}, skipping download button.")
-                continue
-                
-            download_btn = ttk.Button(info_button_frame, text="Download", style="ItemButton.TButton",
-                                      command=lambda url=download_url, title=title, platform=platform: self.start_single_download(url, title, platform))
-            download_btn.pack(pady=(0, 5), anchor="w")
-
-            item_frame.grid_columnconfigure(1, weight=1)
-
-        self.canvas.yview_moveto(0)
-        self.canvas.update_idletasks()
-
-    def start_single_download(self, media_url, title, platform="Unknown"):
-        if self.download_in_progress:
-            messagebox.showinfo("Please Wait", "Another download is already in progress.")
+            if download_url:
+                title = item_info.get("title") or "Untitled Video"
+                if choice is None and self._item_budget() and not batch_budget and item_info.get('formats'):
+                    logging.warning(f"Skipping {title}: no format fits in {self.item_budget.get()}")
+                    continue
+                self.start_single_download(download_url, title, item_info.get('extractor', 'Unknown'),
+                                           info=item_info, choice=choice)
+
+    def _set_thumbnail(self, row, index, tk_img):
+        if row.index != index:
+            return  # Row was recycled for another item while the image loaded
+        if tk_img is None:
+            row.thumbnail.config(text="No Image")
             return
+        row.thumbnail.config(image=tk_img, text="", width=0)
+        row.thumbnail.image = tk_img
 
+    def start_single_download(self, media_url, title, platform="Unknown", info=None, choice=None):
         if not self.output_path.get():
             messagebox.showerror("Error", "Please choose a download location first.")
             return
@@ -493,140 +489,152 @@ class VideoDownloader:
             messagebox.showerror("Error", "No valid download URL available.")
             return
 
-        self.download_in_progress = True
-        self.analyze_button.config(state=tk.DISABLED)
+        job = DownloadJob(media_url, title, platform, data={'output_path': self.output_path.get(),
+                                                            'quality': self.selected_quality.get(),
+                                                            'turbo': self.turbo.get()})
+        if choice is not None:
+            # Pinned, so yt-dlp downloads exactly what the preview showed, from the info we already have
+            job.data['format'] = choice['format']
+            job.data['info'] = info
+        job.data['disk_bytes'] = disk_space.required_bytes(info, job.data['quality'],
+                                                           format=choice['format'] if choice else None)
+        # Shown under the job until the download reports fragment timings
+        job.data['savings'] = " · ".join(filter(None, (
+            format_ranking.describe(choice),
+            downloader_core.describe_audio_savings(info) if job.data['quality'].startswith('audio') else "")))
+        self._create_job_row(job)
+        self.scheduler.submit(job)
+
+    def _create_job_row(self, job):
+        row = ttk.Frame(self.jobs_frame, style="ItemFrame.TFrame")
+        row.pack(fill="x", pady=2)
+
+        ttk.Label(row, text=job.title[:60], style="ItemLabel.TLabel", width=45).grid(row=0, column=0, padx=5, sticky="w")
+        progress = ttk.Progressbar(row, length=150, mode='determinate')
+        progress.grid(row=0, column=1, padx=5, sticky="ew")
+        status = ttk.Label(row, text="Queued", style="ItemLabel.TLabel", width=30)
+        status.grid(row=0, column=2, padx=5, sticky="w")
+        pause_btn = ttk.Button(row, text="Pause", style="ItemButton.TButton", width=7,
+                               command=lambda job_id=job.id: self._toggle_pause(job_id))
+        pause_btn.grid(row=0, column=3, padx=2)
+        cancel_btn = ttk.Button(row, text="Cancel", style="ItemButton.TButton", width=7,
+                                command=lambda job_id=job.id: self.scheduler.cancel(job_id))
+        cancel_btn.grid(row=0, column=4, padx=2)
+        # Second line for fragment timings of turbo downloads; empty otherwise
+        detail = ttk.Label(row, text=job.data.get('savings', ""), style="ItemLabel.TLabel")
+        detail.grid(row=1, column=0, columnspan=5, padx=5, sticky="w")
+        row.grid_columnconfigure(1, weight=1)
+
+        self.job_rows[job.id] = {'frame': row, 'progress': progress, 'status': status, 'detail': detail,
+                                 'pause': pause_btn, 'cancel': cancel_btn}
+
+    def _toggle_pause(self, job_id):
+        job = self.scheduler.get(job_id)
+        if job and job.state == PAUSED:
+            self.scheduler.resume(job_id)
+        else:
+            self.scheduler.pause(job_id)
 
-        self.update_status(f"Starting download for: {title[:70]}...")
-        self.progress['value'] = 0
-        self.progress.start()
+    def _on_job_update(self, job):
+        self.master.after(0, self._update_job_row, job)
 
-        threading.Thread(target=self._download_video_task, args=(media_url, title, platform), daemon=True).start()
+    def _update_job_row(self, job):
+        row = self.job_rows.get(job.id)
+        if not row:
+            return
+        postprocess = job.result.get('postprocess') if job.state == "done" and job.result else None
+        if postprocess is not None and not job.data.get('postprocess_watched'):
+            job.data['postprocess_watched'] = True
+            job.status_text = "Downloaded, waiting to convert"
+            postprocess.add_done_callback(lambda future: self.master.after(0, self._finish_postprocess, job, future))
+        elif job.state == "done" and job.result and job.result.get('skipped') and not job.result.get('files'):
+            job.status_text = "Already downloaded"
+        row['status'].config(text=job.status_text[:40])
+        row['pause'].config(text="Resume" if job.state == PAUSED else "Pause")
+        if job.state in FINAL_STATES:
+            self.progress_reporter.discard(job)
+            fragments = job.result.get('fragments') if job.state == "done" and job.result else None
+            if fragments and fragments['seconds_per_fragment'] is not None:
+                row['detail'].config(text=f"{fragments['fragments']} fragments, {fragments['seconds_per_fragment']:.2f}s each, "
+                                          f"{fragments['concurrency']} in parallel")
+            row['pause'].config(state=tk.DISABLED)
+            row['cancel'].config(state=tk.DISABLED)
+            row['progress'].stop()
+            row['progress'].config(mode='determinate', value=100 if job.state == "done" else 0)
+        self._update_overall_progress()
+
+    def _finish_postprocess(self, job, future):
+        row = self.job_rows.get(job.id)
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Post-processing failed for {job.title}: {error}")
+            job.status_text = f"Conversion failed: {error}"
+        else:
+            job.status_text = "Done"
+        if row:
+            row['status'].config(text=job.status_text[:40])
 
-    def _download_video_task(self, url, title_for_display="Unknown Title", platform="Unknown"):
+    def _update_overall_progress(self):
+        jobs = self.scheduler.jobs()
+        if not jobs:
+            return
+        finished = sum(1 for job in jobs if job.state in FINAL_STATES)
+        self.progress.config(mode='determinate', value=finished * 100 / len(jobs))
+        active = self.scheduler.active_count()
+        if active:
+            self.status_label.config(text=f"Downloading {active} item(s), {finished}/{len(jobs)} finished")
+        elif finished == len(jobs):
+            self.status_label.config(text=f"All downloads finished ({finished}/{len(jobs)})")
+
+    def _download_video_task(self, job):
+        pinned = {'format': job.data['format'], 'info': job.data['info']} if job.data.get('format') else {}
         try:
-            ydl_opts = self.get_common_ydl_opts()
-            
-            sanitized_title = re.sub(r'[\\/:*?"<>|]', '', title_for_display) if title_for_display else f"video_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-            sanitized_title = sanitized_title[:50].strip()
-            ydl_opts['outtmpl'] = os.path.join(self.output_path.get(), f'{sanitized_title}_%(id)s.%(ext)s')
-
-            # Add platform-specific options
-            if 'facebook' in platform.lower():
-                ydl_opts.update({
-                    'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-                    'http_headers': {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                        'Accept-Language': 'en-US,en;q=0.9',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'DNT': '1',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                    }
-                })
-
-            ffmpeg_path = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-            if os.path.exists(ffmpeg_path):
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logging.info(f"Starting download for URL: {url} from {platform}")
-                ydl.download([url])
-                logging.info(f"Download completed successfully: {title_for_display}")
-
-            self.master.after(0, lambda: self.update_status(f"Download complete: {title_for_display}"))
-            self.master.after(0, lambda: messagebox.showinfo("Success", f"'{title_for_display}' downloaded successfully!"))
-
+            return downloader_core.download(
+                job.url, job.data.get('output_path') or self.output_path.get(),
+                quality=job.data.get('quality') or "best", title=job.title, platform=job.platform,
+                turbo=job.data.get('turbo', False), connections=4 if job.data.get('turbo') else 1,
+                progress_hooks=[lambda d: self.update_progress(job, d), self.disk_admission.hook(job.id)],
+                # Merging and audio extraction run in the post-processing pool, freeing this download slot
+                pipeline=postprocess_pool.get_default_pipeline(), **pinned)
         except yt_dlp.utils.DownloadError as e:
-            self.master.after(0, lambda err=e: self.update_status(f"Download Error: {err}"))
-            self.master.after(0, lambda err=e: messagebox.showerror("Download Error", f"Failed to download '{title_for_display}':\n{err}\n\nCheck URL, internet connection, or try updating yt-dlp.\n\nCheck log for more details."))
-            logging.error(f"Download error for {title_for_display}: {e}")
+            if not job.cancelled:
+                logging.error(f"Download error for {job.title}: {e}")
+            raise
         except Exception as e:
-            self.master.after(0, lambda err=e: self.update_status(f"An error occurred: {err}"))
-            self.master.after(0, lambda err=e: messagebox.showerror("Error", f"An unexpected error occurred for '{title_for_display}':\n{err}\n\nCheck log for more details."))
-            logging.error(f"Unexpected error for {title_for_display}: {e}")
-        finally:
-            self.master.after(0, self.reset_download_state)
-
-    def update_progress(self, d):
-        self.master.after(0, self._update_progress_gui, d)
-
-    def _update_progress_gui(self, d):
-        if d['status'] == 'downloading':
-            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
-            downloaded_bytes = d.get('downloaded_bytes', 0)
-            
-            if total_bytes:
-                try:
-                    percent = (downloaded_bytes / total_bytes) * 100
-                    self.progress.config(mode='determinate', value=percent)
-                    status_text = f"Downloading: {d.get('_percent_str', '')} of {d.get('_total_bytes_str', 'Unknown Size')} at {d.get('_speed_str', 'N/A')}"
-                except ZeroDivisionError:
-                    self.progress.config(mode='indeterminate')
-                    status_text = f"Downloading: {d.get('_percent_str', '')} (Progress Unknown)"
+            if not job.cancelled:
+                logging.error(f"Unexpected error for {job.title}: {e}")
+            raise
+
+    def update_progress(self, job, d):
+        # Runs on the download thread: honour pause/cancel, then just record the latest state.
+        # The reporter hands it to _update_progress_gui at a fixed rate.
+        job.checkpoint()
+        self.progress_reporter.report(job, d)
+
+    def _update_progress_gui(self, job, snapshot):
+        row = self.job_rows.get(job.id)
+        if not row or job.state in FINAL_STATES:
+            return
+        progress = row['progress']
+        if snapshot['status'] == 'downloading':
+            if snapshot['percent'] is not None:
+                progress.config(mode='determinate', value=snapshot['percent'])
             else:
-                self.progress.config(mode='indeterminate')
-                status_text = f"Downloading: {d.get('_percent_str', '')} (Live Stream/Unknown Size)"
-
-            self.status_label.config(text=status_text)
-            self.master.update_idletasks()
-
-        elif d['status'] == 'finished':
-            self.progress['value'] = 100
-            self.status_label.config(text="Processing...")
-            self.progress.stop()
-
-    def get_common_ydl_opts(self):
-        opts = {
-            'progress_hooks': [self.update_progress],
-            'restrictfilenames': True,
-            'retries': 10,
-            'fragment_retries': 10,
-            'extractor_retries': 5,
-            'postprocessors': [],
-            'no_warnings': True,
-            'quiet': True,
-            'noplaylist': False,
-            'outtmpl': '%(title)s_%(id)s.%(ext)s',
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            },
-        }
+                progress.config(mode='indeterminate')
+            status_text = describe(snapshot)
+            row['detail'].config(text=describe_fragments(snapshot) or job.data.get('savings', ""))
 
-        quality = self.selected_quality.get()
-        if quality == "audio":
-            opts['format'] = "bestaudio/best"
-            opts['postprocessors'].append({
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            })
-            opts['extract_audio'] = True
-            opts['postvideo'] = True
-        elif quality == "worst":
-            opts['format'] = "worstvideo+worstaudio/worst"
-            opts['merge_output_format'] = 'mp4'
-        else:  # "best"
-            opts['format'] = "best[height<=1080]/bestvideo[height<=1080]+bestaudio/best"
-            opts['merge_output_format'] = 'mp4'
-
-        return opts
-
-    def reset_download_state(self):
-        self.download_in_progress = False
-        self.progress.stop()
-        self.progress['value'] = 0
-        self.progress.config(mode='determinate')
-        self.update_status("Idle")
-        self.analyze_button.config(state=tk.NORMAL)
+            if job.state != PAUSED:
+                job.status_text = status_text
+                row['status'].config(text=status_text[:40])
+
+        elif snapshot['status'] == 'finished':
+            progress.config(mode='determinate', value=100)
+            job.status_text = "Processing..."
+            row['status'].config(text="Processing...")
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = VideoDownloader(root)
     root.mainloop()
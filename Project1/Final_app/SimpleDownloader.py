@@ -2,10 +2,9 @@ import os
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import yt_dlp
-import re
-import datetime
 import logging
+import downloader_core
+import telemetry
 
 class SimpleDownloader:
     def __init__(self, master):
@@ -24,12 +23,9 @@ class SimpleDownloader:
         self.create_widgets()
 
     def setup_logging(self):
-        log_file = os.path.join(os.path.dirname(__file__), 'download_log.txt')
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        app_dir = os.path.dirname(__file__)
+        telemetry.setup_logging(os.path.join(app_dir, 'download_log.txt'),
+                                os.path.join(app_dir, 'telemetry.jsonl'))
 
     def create_widgets(self):
         # Configure styles
@@ -67,7 +63,7 @@ class SimpleDownloader:
 
         ttk.Label(quality_frame, text="Quality:").pack(anchor="w")
         self.quality_combo = ttk.Combobox(quality_frame, textvariable=self.selected_quality, 
-                                         values=["best", "worst", "audio"], state="readonly")
+                                         values=["best", "worst", "audio", "audio-mp3"], state="readonly")
         self.quality_combo.pack(fill="x", pady=(5, 10))
         self.quality_combo.set("best")
 
@@ -141,58 +137,15 @@ Note: Some Facebook videos may not work due to restrictions.
 
     def _download_video(self, url):
         try:
-            # Sanitize filename
-            timestamp = datetime.datetime.now().strftime('%Y%m%d%H%M%S')
-            filename = f"video_{timestamp}"
-
-            ydl_opts = {
-                'progress_hooks': [self.update_progress],
-                'outtmpl': os.path.join(self.output_path.get(), f'{filename}.%(ext)s'),
-                'restrictfilenames': True,
-                'retries': 5,
-                'fragment_retries': 5,
-                'extractor_retries': 3,
-                'no_warnings': True,
-                'quiet': True,
-                'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                },
-            }
-
-            # Set quality
-            quality = self.selected_quality.get()
-            if quality == "audio":
-                ydl_opts['format'] = "bestaudio/best"
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-                ydl_opts['extract_audio'] = True
-            elif quality == "worst":
-                ydl_opts['format'] = "worstvideo+worstaudio/worst"
-                ydl_opts['merge_output_format'] = 'mp4'
-            else:  # "best"
-                ydl_opts['format'] = "best[height<=1080]/bestvideo[height<=1080]+bestaudio/best"
-                ydl_opts['merge_output_format'] = 'mp4'
-
-            # Add ffmpeg path if available
-            ffmpeg_path = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-            if os.path.exists(ffmpeg_path):
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logging.info(f"Starting download for URL: {url}")
-                ydl.download([url])
-                logging.info(f"Download completed for URL: {url}")
-
+            # Title and id in the name (not a timestamp) so the same video maps to the same file
+            result = downloader_core.download(url, self.output_path.get(), quality=self.selected_quality.get(),
+                                              progress_hooks=[self.update_progress], use_cookies=True,
+                                              retries=5, fragment_retries=5, extractor_retries=3)
+
+            if result['skipped'] and not result['files']:
+                self.master.after(0, lambda: self.update_status("Already downloaded, skipped"))
+                self.master.after(0, lambda: messagebox.showinfo("Already Downloaded", "This video is already in the download archive."))
+                return
             self.master.after(0, lambda: self.update_status("Download complete!"))
             self.master.after(0, lambda: messagebox.showinfo("Success", "Video downloaded successfully!"))
 
@@ -2,10 +2,10 @@ import os
 import threading
 import tkinter as tk
 from tkinter import filedialog, ttk, messagebox
-import yt_dlp
-import re
-import datetime
 import logging
+import downloader_core
+import telemetry
+from progress_reporter import describe_fragments
 
 class UniversalDownloader:
     def __init__(self, master):
@@ -19,17 +19,15 @@ class UniversalDownloader:
         self.download_in_progress = False
         self.output_path = tk.StringVar(value=os.getcwd())
         self.selected_quality = tk.StringVar(value="best")
+        self.turbo = tk.BooleanVar(value=True)
 
         self.setup_logging()
         self.create_widgets()
 
     def setup_logging(self):
-        log_file = os.path.join(os.path.dirname(__file__), 'download_log.txt')
-        logging.basicConfig(
-            filename=log_file,
-            level=logging.DEBUG,
-            format='%(asctime)s - %(levelname)s - %(message)s'
-        )
+        app_dir = os.path.dirname(__file__)
+        telemetry.setup_logging(os.path.join(app_dir, 'download_log.txt'),
+                                os.path.join(app_dir, 'telemetry.jsonl'))
 
     def create_widgets(self):
         # Configure styles
@@ -67,9 +65,10 @@ class UniversalDownloader:
 
         ttk.Label(quality_frame, text="Quality:").pack(anchor="w")
         self.quality_combo = ttk.Combobox(quality_frame, textvariable=self.selected_quality, 
-                                         values=["best", "worst", "audio"], state="readonly")
+                                         values=["best", "worst", "audio", "audio-mp3"], state="readonly")
         self.quality_combo.pack(fill="x", pady=(5, 10))
         self.quality_combo.set("best")
+        ttk.Checkbutton(quality_frame, text="Turbo (parallel HLS/DASH fragments)", variable=self.turbo).pack(anchor="w")
 
         # Download location
         location_frame = ttk.Frame(main_frame)
@@ -145,30 +144,8 @@ Just paste any video link and click 'Analyze & Download'
                     self.master.after(0, lambda: self.analyze_button.config(state=tk.NORMAL))
                     return
             else:
-                # Universal extraction options for non-Facebook URLs
-                ydl_opts = {
-                    'quiet': True,
-                    'extract_flat': False,
-                    'skip_download': True,
-                    'simulate': True,
-                    'getthumbnail': True,
-                    'ignoreerrors': False,
-                    'dump_single_json': True,
-                    'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-                    'http_headers': {
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                        'Accept-Language': 'en-US,en;q=0.9',
-                        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                        'Accept-Encoding': 'gzip, deflate, br',
-                        'DNT': '1',
-                        'Connection': 'keep-alive',
-                        'Upgrade-Insecure-Requests': '1',
-                    },
-                }
-                
-                with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                    info = ydl.extract_info(url, download=False)
-                    self._handle_extracted_info(info, url)
+                info = downloader_core.extract_standard(url)
+                self._handle_extracted_info(info, url)
 
         except Exception as e:
             error_msg = f"Error analyzing URL: {str(e)}"
@@ -179,20 +156,12 @@ Just paste any video link and click 'Analyze & Download'
 
     def _try_facebook_extraction(self, url):
         """Try multiple methods for Facebook videos"""
-        methods = [
-            self._try_facebook_method_1,
-            self._try_facebook_method_2,
-            self._try_facebook_method_3
-        ]
-        
-        for i, method in enumerate(methods, 1):
-            try:
-                self.master.after(0, lambda: self.update_status(f"Trying Facebook method {i}..."))
-                if method(url):
-                    return True
-            except Exception as e:
-                logging.error(f"Facebook method {i} failed: {e}")
-                continue
+        try:
+            info = downloader_core.extract_facebook(url, on_attempt=lambda name: self.update_status(f"Trying {name}..."))
+            self._handle_extracted_info(info, url)
+            return True
+        except downloader_core.ExtractionError as e:
+            logging.error(str(e))
         
         # If all methods fail, show helpful error
         self.master.after(0, lambda: self.update_status("Facebook extraction failed"))
@@ -208,102 +177,6 @@ Just paste any video link and click 'Analyze & Download'
             "3. Trying a different Facebook video"))
         return False
 
-    def _try_facebook_method_1(self, url):
-        """Method 1: Standard Facebook extraction"""
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                'Accept-Language': 'en-US,en;q=0.9',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info and self._has_valid_media(info):
-                    self._handle_extracted_info(info, url)
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 1 failed: {e}")
-        return False
-
-    def _try_facebook_method_2(self, url):
-        """Method 2: Facebook with mobile URL format"""
-        mobile_url = url.replace('www.facebook.com', 'm.facebook.com')
-        if '/reel/' in mobile_url:
-            mobile_url = mobile_url.replace('/reel/', '/watch/?v=')
-        
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_7_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Mobile/15E148 Safari/604.1',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(mobile_url, download=False)
-                if info and self._has_valid_media(info):
-                    self._handle_extracted_info(info, url)
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 2 failed: {e}")
-        return False
-
-    def _try_facebook_method_3(self, url):
-        """Method 3: Facebook with external hit headers"""
-        ydl_opts = {
-            'quiet': True,
-            'extract_flat': False,
-            'skip_download': True,
-            'simulate': True,
-            'getthumbnail': True,
-            'ignoreerrors': False,
-            'dump_single_json': True,
-            'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-            'http_headers': {
-                'User-Agent': 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip, deflate',
-                'Connection': 'keep-alive',
-            },
-        }
-        
-        try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=False)
-                if info and self._has_valid_media(info):
-                    self._handle_extracted_info(info, url)
-                    return True
-        except Exception as e:
-            logging.error(f"Facebook method 3 failed: {e}")
-        return False
-
     def _has_valid_media(self, item_info):
         """Check if item has valid media for download"""
         if item_info.get('url'):
@@ -329,7 +202,9 @@ Just paste any video link and click 'Analyze & Download'
             self.master.after(0, lambda: self.update_status(f"Found: {title} ({platform})"))
             
             # Show info and ask for confirmation
-            confirm_msg = f"Found video:\n\nTitle: {title}\nPlatform: {platform}\nDuration: {duration}\n\nDownload this video?"
+            savings = downloader_core.describe_audio_savings(info) if self.selected_quality.get().startswith("audio") else ""
+            confirm_msg = (f"Found video:\n\nTitle: {title}\nPlatform: {platform}\nDuration: {duration}\n"
+                           + (f"{savings}\n" if savings else "") + "\nDownload this video?")
             
             if self.master.after(0, lambda: messagebox.askyesno("Confirm Download", confirm_msg)):
                 self.master.after(0, lambda: self._start_download(url, title, platform))
@@ -351,62 +226,20 @@ Just paste any video link and click 'Analyze & Download'
         self.update_status(f"Starting download: {title}")
         self.progress['value'] = 0
 
-        threading.Thread(target=self._download_video, args=(url, title, platform), daemon=True).start()
+        threading.Thread(target=self._download_video, args=(url, title, platform, self.turbo.get()), daemon=True).start()
 
-    def _download_video(self, url, title, platform):
+    def _download_video(self, url, title, platform, turbo=False):
         try:
-            # Sanitize filename
-            sanitized_title = re.sub(r'[\\/:*?"<>|]', '', title) if title else f"video_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-            sanitized_title = sanitized_title[:50].strip()
-
-            ydl_opts = {
-                'progress_hooks': [self.update_progress],
-                'outtmpl': os.path.join(self.output_path.get(), f'{sanitized_title}.%(ext)s'),
-                'restrictfilenames': True,
-                'retries': 10,
-                'fragment_retries': 10,
-                'extractor_retries': 5,
-                'no_warnings': True,
-                'quiet': True,
-                'cookiefile': 'cookies.txt' if os.path.exists('cookies.txt') else None,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                },
-            }
-
-            # Set quality
-            quality = self.selected_quality.get()
-            if quality == "audio":
-                ydl_opts['format'] = "bestaudio/best"
-                ydl_opts['postprocessors'] = [{
-                    'key': 'FFmpegExtractAudio',
-                    'preferredcodec': 'mp3',
-                    'preferredquality': '192',
-                }]
-                ydl_opts['extract_audio'] = True
-            elif quality == "worst":
-                ydl_opts['format'] = "worstvideo+worstaudio/worst"
-                ydl_opts['merge_output_format'] = 'mp4'
-            else:  # "best"
-                ydl_opts['format'] = "best[height<=1080]/bestvideo[height<=1080]+bestaudio/best"
-                ydl_opts['merge_output_format'] = 'mp4'
-
-            # Add ffmpeg path if available
-            ffmpeg_path = os.path.join(os.path.dirname(__file__), 'ffmpeg.exe')
-            if os.path.exists(ffmpeg_path):
-                ydl_opts['ffmpeg_location'] = ffmpeg_path
-
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                logging.info(f"Starting download: {title} from {platform}")
-                ydl.download([url])
-                logging.info(f"Download completed: {title}")
-
+            result = downloader_core.download(url, self.output_path.get(), quality=self.selected_quality.get(),
+                                              title=title, platform=platform, turbo=turbo,
+                                              connections=4 if turbo else 1,
+                                              filename=downloader_core.sanitize_title(title),
+                                              progress_hooks=[self.update_progress], use_cookies=True)
+
+            if result['skipped'] and not result['files']:
+                self.master.after(0, lambda: self.update_status(f"Already downloaded: {title}"))
+                self.master.after(0, lambda: messagebox.showinfo("Already Downloaded", f"'{title}' is already in the download archive."))
+                return
             self.master.after(0, lambda: self.update_status(f"Download complete: {title}"))
             self.master.after(0, lambda: messagebox.showinfo("Success", f"'{title}' downloaded successfully!"))
 
@@ -438,6 +271,9 @@ Just paste any video link and click 'Analyze & Download'
                 self.progress.config(mode='indeterminate')
                 status_text = f"Downloading: {d.get('_percent_str', '')}"
 
+            fragments = describe_fragments(d)
+            if fragments:
+                status_text += f" ({fragments})"
             self.status_label.config(text=status_text)
 
         elif d['status'] == 'finished':
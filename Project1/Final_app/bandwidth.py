@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""Global bandwidth governor shared by every download in the process.
+
+Each active job drains its own token bucket. The aggregate limit is split
+between jobs max-min fairly: a job capped below its equal share keeps only
+its cap and the rest goes to the others, so one large file cannot starve
+small ones. Limits follow an optional time-of-day schedule and can be
+changed at any time; waiting jobs pick up the new rates within a fraction
+of a second.
+
+The governor is enforced from a progress hook: the hook sleeps on the
+download thread until the job is back within its rate, which stalls the
+socket reads behind it. Limits are therefore averaged over a few
+seconds rather than exact per packet."""
+import datetime
+import logging
+import re
+import threading
+import time
+
+# Longest single sleep, so rate changes take effect quickly
+MAX_SLEEP = 0.25
+# Unused allowance a job may save up, in seconds of its rate
+BURST_SECONDS = 0.5
+# A job that has not reported for this long no longer takes a share
+ACTIVE_WINDOW = 2.0
+
+RATE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+RATE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?(?:/s)?\s*$', re.IGNORECASE)
+WINDOW_PATTERN = re.compile(r'^\s*(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})\s*=\s*(.+)$')
+
+
+def parse_rate(text):
+    """'2M' -> 2097152 bytes/s; '', '0' and 'unlimited' -> None"""
+    if text is None:
+        return None
+    text = str(text).strip()
+    if not text or text.lower() in ('0', 'unlimited', 'none', 'off'):
+        return None
+    match = RATE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid rate: {text!r} (expected e.g. 500K or 2M)")
+    rate = float(match.group(1)) * RATE_UNITS[match.group(2).upper()]
+    return int(rate) or None
+
+
+def format_rate(rate):
+    if rate is None:
+        return "unlimited"
+    for unit in ('', 'K', 'M'):
+        if rate < 1024 or unit == 'M':
+            return f"{rate:.0f}B/s" if not unit else f"{rate:.1f}{unit}iB/s"
+        rate /= 1024
+
+
+def parse_limit(text):
+    """Parse a limit such as '2M' or '08:00-18:00=1M,18:00-23:00=4M,10M'.
+
+    Windows are 'HH:MM-HH:MM=rate' and may wrap past midnight; a plain rate
+    applies outside all windows (unlimited when there is none). Returns
+    (default_rate, [(start_minute, end_minute, rate), ...])."""
+    default = None
+    windows = []
+    for part in (text or '').split(','):
+        if not part.strip():
+            continue
+        match = WINDOW_PATTERN.match(part)
+        if match:
+            start_h, start_m, end_h, end_m, rate = match.groups()
+            start, end = int(start_h) * 60 + int(start_m), int(end_h) * 60 + int(end_m)
+            if start >= 24 * 60 or end > 24 * 60:
+                raise ValueError(f"Invalid time window: {part.strip()!r}")
+            windows.append((start, end, parse_rate(rate)))
+        else:
+            default = parse_rate(part)
+    return default, windows
+
+
+def _in_window(minute, start, end):
+    if start <= end:
+        return start <= minute < end
+    return minute >= start or minute < end  # e.g. 22:00-06:00
+
+
+class _Job:
+    def __init__(self, now):
+        self.tokens = 0.0
+        self.updated = now
+        self.last_seen = now
+        self.filename = None
+        self.last_bytes = 0
+        self.cap = None
+
+
+class BandwidthGovernor:
+    """Token-bucket limiter; hook(key) gives a yt-dlp progress hook for one job.
+
+    rate is the aggregate limit in bytes/s and job_rate the default cap for
+    each job (None means unlimited). schedule is the window list from
+    parse_limit(); while a window matches, its rate replaces rate."""
+
+    def __init__(self, rate=None, job_rate=None, schedule=None, clock=time.monotonic):
+        self.rate = rate
+        self.job_rate = job_rate
+        self.schedule = list(schedule or [])
+        self._clock = clock
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._logged_rate = rate
+
+    # --- configuration, safe to call while downloads run ---
+
+    def configure(self, rate=None, job_rate=None, schedule=None):
+        with self._lock:
+            self.rate = rate
+            self.job_rate = job_rate
+            self.schedule = list(schedule or [])
+        logging.info(f"Bandwidth limit set to {format_rate(rate)}, {format_rate(job_rate)} per job"
+                     + (f", {len(self.schedule)} scheduled window(s)" if self.schedule else ""))
+
+    def configure_from_text(self, limit, job_limit=None):
+        """Apply the textual forms used by the GUIs and the CLI; raises ValueError on bad input"""
+        rate, schedule = parse_limit(limit)
+        self.configure(rate, parse_rate(job_limit), schedule)
+
+    def set_job_cap(self, key, rate):
+        """Cap one job below the default per-job rate (None removes the cap)"""
+        with self._lock:
+            self._job(key).cap = rate
+
+    def current_rate(self, now=None):
+        """Aggregate limit in force right now, after the schedule"""
+        minute = now if now is not None else self._minute_of_day()
+        for start, end, rate in self.schedule:
+            if _in_window(minute, start, end):
+                return rate
+        return self.rate
+
+    @property
+    def limited(self):
+        with self._lock:
+            return self.current_rate() is not None or self.job_rate is not None or \
+                any(job.cap is not None for job in self._jobs.values())
+
+    def _minute_of_day(self):
+        now = datetime.datetime.now()
+        return now.hour * 60 + now.minute
+
+    # --- progress hook side ---
+
+    def hook(self, key):
+        """A progress hook charging the bytes of each report to key"""
+        return lambda d: self.report(key, d)
+
+    def release(self, key):
+        """Forget a finished job so its share goes back to the others"""
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def report(self, key, d):
+        if d['status'] != 'downloading':
+            if d['status'] in ('finished', 'error'):
+                with self._lock:
+                    job = self._jobs.get(key)
+                    if job is not None:
+                        job.filename, job.last_bytes = None, 0
+            return
+        downloaded = d.get('downloaded_bytes') or 0
+        filename = d.get('tmpfilename') or d.get('filename')
+        with self._lock:
+            job = self._job(key)
+            if filename != job.filename:
+                # A new file (e.g. the audio stream after the video one)
+                job.filename, job.last_bytes = filename, 0
+            if downloaded <= job.last_bytes:
+                # Concurrent fragment/segment threads can report slightly out of order
+                return
+            used, job.last_bytes = downloaded - job.last_bytes, downloaded
+        self.consume(key, used)
+
+    def consume(self, key, amount):
+        """Charge amount bytes to key, then block until the job is within its rate again"""
+        with self._lock:
+            now = self._clock()
+            rates = self._rates(now)
+            job = self._job(key)
+            job.last_seen = now
+            self._refill(job, rates.get(key), now)
+            job.tokens -= amount
+        while True:
+            with self._lock:
+                now = self._clock()
+                job = self._jobs.get(key)
+                if job is None:
+                    return  # released while we waited
+                rate = self._rates(now).get(key)
+                self._refill(job, rate, now)
+                job.last_seen = now
+                if job.tokens >= 0:
+                    return
+                wait = -job.tokens / rate
+            time.sleep(min(wait, MAX_SLEEP))
+
+    # --- internals, called with the lock held ---
+
+    def _job(self, key):
+        job = self._jobs.get(key)
+        if job is None:
+            job = self._jobs[key] = _Job(self._clock())
+        return job
+
+    def _refill(self, job, rate, now):
+        if rate is None:
+            job.tokens = 0.0
+        else:
+            job.tokens = min(job.tokens + rate * (now - job.updated), rate * BURST_SECONDS)
+        job.updated = now
+
+    def _rates(self, now):
+        """Max-min fair rate of every active job; None means unlimited"""
+        total = self.current_rate()
+        if total != self._logged_rate:
+            logging.info(f"Bandwidth schedule: aggregate limit is now {format_rate(total)}")
+            self._logged_rate = total
+        active = {key: job for key, job in self._jobs.items() if now - job.last_seen < ACTIVE_WINDOW}
+        caps = {}
+        for key, job in self._jobs.items():
+            limits = [rate for rate in (job.cap, self.job_rate) if rate is not None]
+            caps[key] = min(limits) if limits else None
+        if total is None:
+            return caps
+        rates = dict(caps)
+        remaining = float(total)
+        # Water-filling: jobs capped below the equal share keep their cap, the rest split what is left
+        pending = sorted(active, key=lambda key: float('inf') if caps[key] is None else caps[key])
+        while pending:
+            share = remaining / len(pending)
+            key = pending[0]
+            if caps[key] is not None and caps[key] <= share:
+                rates[key] = caps[key]
+                remaining -= caps[key]
+                pending.pop(0)
+                continue
+            for key in pending:
+                rates[key] = share
+            break
+        for key in self._jobs:
+            if key not in active:
+                # Idle jobs (e.g. merging) get an equal share if they wake up, until the next recount
+                rates[key] = min(total / max(len(active), 1), caps[key] or total)
+        return rates
+
+
+_default_governor = None
+_default_governor_lock = threading.Lock()
+
+
+def get_default_governor():
+    """Process-wide governor; unlimited until configured"""
+    global _default_governor
+    with _default_governor_lock:
+        if _default_governor is None:
+            _default_governor = BandwidthGovernor()
+        return _default_governor
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""Headless batch downloader.
+
+Reads URLs from a file (or stdin with '-'), downloads them with N parallel
+workers and writes one JSON line per URL with path, bytes, duration and error.
+Anything already in the download archive is skipped, so re-running a channel
+or playlist only fetches new items.
+
+    python batch_download.py urls.txt -o /srv/media -j 4 --results results.jsonl
+    cat urls.txt | python batch_download.py - -q audio
+    python batch_download.py urls.txt --limit-rate '08:00-18:00=2M' --job-rate 500K
+    python batch_download.py urls.txt -j 8 --extract-workers 16
+"""
+import argparse
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import bandwidth
+import disk_space
+import download_archive
+import downloader_core
+import extraction_service
+import format_ranking
+import postprocess_pool
+import telemetry
+import ydl_profiles
+from job_scheduler import JobScheduler, DownloadJob
+
+
+def read_urls(source):
+    """Yield URLs from a file object, skipping blank lines and # comments"""
+    for line in source:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+class ResultWriter:
+    """Thread-safe JSON-lines writer, flushed after every record"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+def run_batch(urls, output_path, quality="best", workers=4, per_host=2, writer=None, use_archive=True, turbo=False,
+              connections=1, pipeline=None, max_bytes=None, prefetch=0):
+    """Download every URL and return the list of result records.
+
+    With a pipeline, merging and audio extraction run there while the
+    workers move on to the next download; a record is written once its
+    post-processing is done too.
+    With prefetch=N, N threads extract every URL ahead of its download
+    (in worker processes, after downloader_core.use_extraction_service()),
+    so analysis is not limited to the number of download workers. URLs are
+    then queued in the order their extraction finishes, and a download that
+    would not fit in the free disk space waits until it does."""
+    results = []
+    results_lock = threading.Lock()
+    pending = []
+    extracted = {}
+
+    def finish(record):
+        with results_lock:
+            results.append(record)
+        if writer:
+            writer.write(record)
+
+    def finish_postprocess(record, future, done):
+        try:
+            path = future.result()
+            record['path'] = path
+            record['bytes'] = sum(os.path.getsize(f) for f in record['files'] if os.path.exists(f))
+        except Exception as e:
+            record['error'] = str(e)
+            logging.error(f"Post-processing failed for {record['url']}: {e}")
+        record['duration'] = round(time.monotonic() - record.pop('started'), 3)
+        finish(record)
+        done.set()
+
+    def run_job(job):
+        record = {'url': job.url, 'path': None, 'files': [], 'bytes': 0, 'duration': None, 'skipped': [],
+                  'fragments': None, 'segments': None, 'error': None}
+        started = time.monotonic()
+        try:
+            with results_lock:
+                future = extracted.pop(job.url, None)
+            info = future.result() if future is not None else None
+            result = downloader_core.download(job.url, output_path, quality=quality, use_archive=use_archive, turbo=turbo,
+                                              info=info, connections=connections, pipeline=pipeline, max_bytes=max_bytes,
+                                              progress_hooks=[admission.hook(job.id)],
+                                              platform='facebook' if downloader_core.is_facebook_url(job.url) else 'Unknown')
+            future = result.pop('postprocess', None)
+            record.update(result)
+            if future is not None:
+                record['started'] = started
+                # Future.done() turns true before its callbacks run; wait for the record itself
+                done = threading.Event()
+                with results_lock:
+                    pending.append(done)
+                future.add_done_callback(lambda f: finish_postprocess(record, f, done))
+                return record
+        except Exception as e:
+            record['error'] = str(e)
+            logging.error(f"Download error for {job.url}: {e}")
+        finish(record)
+        return record
+
+    admission = disk_space.DiskAdmission()
+    scheduler = JobScheduler(run_job, max_workers=workers, per_host_limit=per_host, admission=admission)
+
+    def submit(url, info=None):
+        # With the info at hand the scheduler can hold the job until its files fit on the disk
+        needed = disk_space.required_bytes(info, quality, budget=max_bytes)
+        scheduler.submit(DownloadJob(url, data={'output_path': output_path, 'disk_bytes': needed}))
+
+    prefetched = set()
+    if prefetch:
+        extractor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="prefetch")
+        archive = download_archive.get_default_archive() if use_archive else None
+        for url in dict.fromkeys(urls):
+            key = download_archive.url_key(url) if archive is not None else None
+            if key is not None and key in archive:
+                continue  # download() skips it without a request
+            extracted[url] = future = extractor.submit(downloader_core.extract_media, url)
+            prefetched.add(url)
+            # Queued for download as soon as its extraction is done (run_job reports failures)
+            future.add_done_callback(lambda f, url=url: submit(url, None if f.exception() else f.result()))
+    for url in urls:
+        if url in prefetched:
+            prefetched.discard(url)
+        else:
+            submit(url)
+    if prefetch:
+        # Returns once every extraction, and so every submit, is done
+        extractor.shutdown()
+    scheduler.wait()
+    for done in pending:
+        done.wait()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Download a list of video URLs without a GUI.")
+    parser.add_argument('input', help="file with one URL per line, or '-' for stdin")
+    parser.add_argument('-o', '--output-path', default=os.getcwd(), help="download directory (default: current directory)")
+    parser.add_argument('-q', '--quality', choices=tuple(ydl_profiles.QUALITY_PROFILES), default="best",
+                        help="'audio' keeps the native audio codec, 'audio-mp3' re-encodes to MP3")
+    parser.add_argument('-j', '--workers', type=int, default=4, help="parallel downloads (default: 4)")
+    parser.add_argument('--per-host', type=int, default=2, help="parallel downloads per host (default: 2)")
+    parser.add_argument('--results', help="write JSON lines here instead of stdout")
+    parser.add_argument('--log-file', help="log file (default: warnings to stderr)")
+    parser.add_argument('--telemetry', metavar='FILE', help="write per-download phase timings here as JSON lines")
+    parser.add_argument('--turbo', action='store_true', help="fetch HLS/DASH fragments in parallel, tuned per host")
+    parser.add_argument('--connections', type=int, default=1,
+                        help="connections per file for plain HTTP formats (default: 1)")
+    parser.add_argument('--max-size', metavar='SIZE',
+                        help="best format of each video that fits in SIZE, e.g. 700M (videos with no such format fail)")
+    parser.add_argument('--limit-rate', metavar='LIMIT',
+                        help="total bandwidth, e.g. 5M, or a schedule such as '08:00-18:00=1M,20M' (default: unlimited)")
+    parser.add_argument('--job-rate', metavar='RATE', help="bandwidth cap for each download, e.g. 500K")
+    parser.add_argument('--pp-workers', type=int, default=os.cpu_count() or 2,
+                        help="parallel merge/audio extraction jobs, 0 to run them inside each download "
+                             "(default: one per CPU)")
+    parser.add_argument('--extract-workers', type=int, default=os.cpu_count() or 2,
+                        help="processes extracting video info, 0 to extract inside each download thread "
+                             "(default: one per CPU)")
+    parser.add_argument('--no-archive', action='store_true', help="download even what the archive says is already fetched")
+    parser.add_argument('--hash-content', action='store_true', help="store a SHA-256 of each file and warn about duplicates")
+    args = parser.parse_args(argv)
+
+    if args.log_file:
+        telemetry.setup_logging(args.log_file, args.telemetry)
+    else:
+        logging.basicConfig(level=logging.WARNING, format='%(levelname)s - %(message)s')
+        if args.telemetry:
+            telemetry.setup_logging(telemetry_file=args.telemetry)
+
+    if args.input == '-':
+        urls = list(read_urls(sys.stdin))
+    else:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            urls = list(read_urls(f))
+
+    try:
+        bandwidth.get_default_governor().configure_from_text(args.limit_rate, args.job_rate)
+        max_bytes = format_ranking.parse_size(args.max_size)
+    except ValueError as e:
+        parser.error(str(e))
+
+    os.makedirs(args.output_path, exist_ok=True)
+    if args.hash_content:
+        download_archive.get_default_archive().hash_content = True
+
+    pipeline = postprocess_pool.PostprocessPipeline(args.pp_workers) if args.pp_workers > 0 else None
+    service = extraction_service.ExtractionService(args.extract_workers) if args.extract_workers > 0 else None
+    downloader_core.use_extraction_service(service)
+    results_stream = open(args.results, 'a', encoding='utf-8') if args.results else sys.stdout
+    try:
+        results = run_batch(urls, args.output_path, args.quality, args.workers, args.per_host,
+                            writer=ResultWriter(results_stream), use_archive=not args.no_archive, turbo=args.turbo,
+                            connections=args.connections, pipeline=pipeline, max_bytes=max_bytes,
+                            prefetch=args.extract_workers)
+    finally:
+        if pipeline is not None:
+            pipeline.shutdown()
+        if service is not None:
+            service.shutdown()
+        if args.results:
+            results_stream.close()
+
+    if pipeline is not None:
+        for stage, metrics in pipeline.metrics().items():
+            if metrics['completed'] or metrics['failed']:
+                logging.info(f"Post-processing {stage}: {metrics}")
+                sys.stderr.write(f"{stage}: {metrics['completed']} done, {metrics['failed']} failed, "
+                                 f"avg {metrics['avg_seconds']}s, avg queue wait {metrics['avg_wait']}s, "
+                                 f"max queue {metrics['max_depth']}\n")
+
+    if service is not None:
+        health = service.health()
+        logging.info(f"Extraction workers: {health}")
+        hangs = sum(worker['hangs'] for worker in health)
+        if hangs:
+            sys.stderr.write(f"{hangs} extraction(s) hung and their worker was restarted\n")
+
+    downloaded = sum(len(record['files']) for record in results)
+    skipped = sum(len(record['skipped']) for record in results)
+    failed = sum(1 for record in results if record['error'])
+    sys.stderr.write(f"{downloaded} file(s) downloaded, {skipped} skipped (already in archive), {failed} URL(s) failed\n")
+
+    return 1 if any(record['error'] for record in results) else 0
+
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
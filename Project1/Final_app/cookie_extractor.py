@@ -1,8 +1,38 @@
 # cookie_extractor.py
+import argparse
 import browser_cookie3
+import concurrent.futures
+import glob
 import http.cookiejar
 import os
 import sys
+import time
+
+import cookie_index
+
+# Sites the downloaders use cookies for; --domains all refreshes these
+DEFAULT_DOMAINS = ['.facebook.com', '.instagram.com', '.youtube.com', '.google.com', '.tiktok.com',
+                   '.twitter.com', '.x.com', '.vimeo.com']
+
+# browser_cookie3 loader -> where its profiles live ('~' and %VAR% are expanded).
+# Chromium-based browsers keep a Cookies database per profile folder, Firefox a cookies.sqlite.
+BROWSER_PROFILES = {
+    'chrome': ['%LOCALAPPDATA%/Google/Chrome/User Data/*', '~/Library/Application Support/Google/Chrome/*',
+               '~/.config/google-chrome/*'],
+    'chromium': ['%LOCALAPPDATA%/Chromium/User Data/*', '~/Library/Application Support/Chromium/*',
+                 '~/.config/chromium/*'],
+    'edge': ['%LOCALAPPDATA%/Microsoft/Edge/User Data/*', '~/Library/Application Support/Microsoft Edge/*',
+             '~/.config/microsoft-edge/*'],
+    'brave': ['%LOCALAPPDATA%/BraveSoftware/Brave-Browser/User Data/*',
+              '~/Library/Application Support/BraveSoftware/Brave-Browser/*', '~/.config/BraveSoftware/Brave-Browser/*'],
+    'vivaldi': ['%LOCALAPPDATA%/Vivaldi/User Data/*', '~/Library/Application Support/Vivaldi/*', '~/.config/vivaldi/*'],
+    'opera': ['%APPDATA%/Opera Software/Opera Stable', '~/Library/Application Support/com.operasoftware.Opera',
+              '~/.config/opera'],
+    'firefox': ['%APPDATA%/Mozilla/Firefox/Profiles/*', '~/Library/Application Support/Firefox/Profiles/*',
+                '~/.mozilla/firefox/*'],
+    'safari': [],
+}
+COOKIE_DB_NAMES = ['Network/Cookies', 'Cookies', 'cookies.sqlite']
 
 def extract_facebook_cookies():
     """Extract Facebook cookies from browser"""
@@ -47,23 +77,7 @@ def extract_facebook_cookies():
     cookie_file = 'cookies.txt'
     
     try:
-        with open(cookie_file, 'w', encoding='utf-8') as f:
-            f.write("# Netscape HTTP Cookie File\n")
-            f.write("# https://curl.se/rfc/cookie_spec.html\n")
-            f.write(f"# Generated from {browser_name} browser\n")
-            f.write("# This file contains Facebook cookies for video downloading\n\n")
-            
-            cookie_count = 0
-            for cookie in cookies:
-                # Format: domain, domain_specified, path, secure, expires, name, value
-                f.write(f"{cookie.domain}\t")
-                f.write("TRUE\t")
-                f.write(f"{cookie.path}\t")
-                f.write("TRUE\t")
-                f.write(f"{int(cookie.expires) if cookie.expires else 0}\t")
-                f.write(f"{cookie.name}\t")
-                f.write(f"{cookie.value}\n")
-                cookie_count += 1
+        cookie_count = write_cookie_file(list(cookies), cookie_file, source=f"{browser_name} browser")
         
         print(f"\n✅ Successfully extracted {cookie_count} Facebook cookies!")
         print(f"📁 Cookie file saved as: {os.path.abspath(cookie_file)}")
@@ -85,33 +99,192 @@ def extract_facebook_cookies():
         print(f"\n❌ Error saving cookie file: {str(e)}")
         return False
 
-def verify_cookie_file():
-    """Verify that the cookie file exists and has content"""
-    cookie_file = 'cookies.txt'
-    
+def find_browser_profiles():
+    """[(browser, profile_label, cookie_db_or_None)] for every profile found on this machine.
+
+    A browser with no profile folder found is still tried once with its
+    default location (cookie_db None), e.g. Safari or unusual installs."""
+    found = []
+    for browser, patterns in BROWSER_PROFILES.items():
+        if not hasattr(browser_cookie3, browser):
+            continue
+        databases = []
+        for pattern in patterns:
+            pattern = os.path.expanduser(os.path.expandvars(pattern))
+            if '%' in pattern:
+                continue  # Windows variable on another OS
+            for folder in sorted(glob.glob(pattern)):
+                for name in COOKIE_DB_NAMES:
+                    candidate = os.path.join(folder, name)
+                    if os.path.isfile(candidate):
+                        databases.append((os.path.basename(folder), candidate))
+                        break
+        if databases:
+            found.extend((browser, label, path) for label, path in databases)
+        else:
+            found.append((browser, 'default', None))
+    return found
+
+
+def _matches(cookie_domain, domains):
+    """True when cookie_domain is one of domains or a subdomain of one"""
+    cookie_domain = cookie_domain.lstrip('.')
+    for domain in domains:
+        domain = domain.lstrip('.')
+        if cookie_domain == domain or cookie_domain.endswith('.' + domain):
+            return True
+    return False
+
+
+def _read_profile(browser, cookie_db, domains):
+    """Cookies of one profile for the given domains; one read of the whole store, filtered here"""
+    loader = getattr(browser_cookie3, browser)
+    jar = loader(cookie_file=cookie_db) if cookie_db else loader()
+    return [cookie for cookie in jar if _matches(cookie.domain, domains)]
+
+
+def extract_cookies(domains=None, workers=None):
+    """Read every browser profile at once and merge their cookies for domains.
+
+    When two profiles have the same cookie (domain, path, name), the one that
+    expires last wins; session cookies lose to ones with an expiry.
+    Returns (cookies, report) where report lists (browser, profile, count or error, seconds)."""
+    domains = domains or DEFAULT_DOMAINS
+    profiles = find_browser_profiles()
+    merged = {}
+    report = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or len(profiles) or 1) as executor:
+        started = {}
+        futures = {}
+        for browser, label, cookie_db in profiles:
+            futures[executor.submit(_read_profile, browser, cookie_db, domains)] = (browser, label)
+            started[(browser, label)] = time.monotonic()
+        for future in concurrent.futures.as_completed(futures):
+            browser, label = futures[future]
+            seconds = time.monotonic() - started[(browser, label)]
+            try:
+                cookies = future.result()
+            except Exception as e:
+                report.append((browser, label, str(e) or type(e).__name__, seconds))
+                continue
+            report.append((browser, label, len(cookies), seconds))
+            for cookie in cookies:
+                key = (cookie.domain, cookie.path, cookie.name)
+                current = merged.get(key)
+                if current is None or (cookie.expires or 0) > (current[0].expires or 0):
+                    merged[key] = (cookie, f"{browser}/{label}")
+    return [cookie for cookie, _ in merged.values()], report
+
+
+def write_cookie_file(cookies, cookie_file='cookies.txt', source="browser"):
+    """Write a Netscape cookie file through a temp file, so readers never see half of it"""
+    tmp = f"{cookie_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write("# Netscape HTTP Cookie File\n")
+            f.write("# https://curl.se/rfc/cookie_spec.html\n")
+            f.write(f"# Generated from {source}\n\n")
+            for cookie in cookies:
+                # Format: domain, include subdomains, path, secure, expires, name, value
+                f.write(f"{cookie.domain}\t")
+                f.write(f"{'TRUE' if cookie.domain.startswith('.') else 'FALSE'}\t")
+                f.write(f"{cookie.path}\t")
+                f.write(f"{'TRUE' if cookie.secure else 'FALSE'}\t")
+                f.write(f"{int(cookie.expires) if cookie.expires else 0}\t")
+                f.write(f"{cookie.name}\t")
+                f.write(f"{cookie.value}\n")
+        os.replace(tmp, cookie_file)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return len(cookies)
+
+
+def refresh_all_cookies(domains, cookie_file='cookies.txt'):
+    """--domains mode: all browsers and profiles in parallel, one merged cookies.txt"""
+    print(f"Reading cookies for {', '.join(domains)} from every browser profile...")
+    started = time.monotonic()
+    cookies, report = extract_cookies(domains)
+    for browser, label, result, seconds in sorted(report):
+        if isinstance(result, int):
+            print(f"  ✅ {browser} ({label}): {result} cookies in {seconds:.1f}s")
+        else:
+            print(f"  {browser} ({label}): {result}")
+
+    if not cookies:
+        print("\n❌ No cookies found for these domains in any browser.")
+        return False
+
+    try:
+        count = write_cookie_file(cookies, cookie_file, source="all browser profiles, newest expiry wins")
+    except Exception as e:
+        print(f"\n❌ Error saving cookie file: {str(e)}")
+        return False
+    print(f"\n✅ Saved {count} cookies in {time.monotonic() - started:.1f}s")
+    print(f"📁 Cookie file saved as: {os.path.abspath(cookie_file)}")
+    for domain in domains:
+        names = sorted({cookie.name for cookie in cookies if _matches(cookie.domain, [domain])})
+        print(f"  {'✅' if names else '⚠️ '} {domain}: {len(names)} cookies")
+    return True
+
+
+def verify_cookie_file(cookie_file='cookies.txt', domains=None):
+    """Verify that the cookie file exists, and which sites it has a valid session for"""
     if not os.path.exists(cookie_file):
         print(f"❌ Cookie file '{cookie_file}' not found!")
         return False
     
     try:
-        with open(cookie_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        if not content.strip():
-            print(f"❌ Cookie file '{cookie_file}' is empty!")
-            return False
-        
-        lines = content.strip().split('\n')
-        cookie_lines = [line for line in lines if line and not line.startswith('#')]
-        
-        print(f"✅ Cookie file verified: {len(cookie_lines)} cookies found")
-        return True
-        
+        index = cookie_index.index_file(cookie_file)
     except Exception as e:
         print(f"❌ Error reading cookie file: {str(e)}")
         return False
 
-def main():
+    if not index.cookies:
+        print(f"❌ Cookie file '{cookie_file}' is empty!")
+        return False
+
+    print(f"✅ Cookie file verified: {index.cookies} cookies for {len(index.domains)} domains"
+          + (f" ({index.invalid_lines} unreadable lines)" if index.invalid_lines else ""))
+    now = time.time()
+    for domain, count, earliest, expired in index.summary(now):
+        if domains and not _matches(domain, domains):
+            continue
+        expiry = time.strftime('%Y-%m-%d', time.localtime(earliest)) if earliest else "session only"
+        print(f"  {domain}: {count} cookies, earliest expiry {expiry}" + (f", {expired} expired" if expired else ""))
+
+    usable = True
+    for site in cookie_index.SESSION_COOKIES:
+        if domains and not _matches(site, domains):
+            continue
+        ok, reason = cookie_index.preflight(f"https://{site}/", cookie_file, now)
+        if ok:
+            print(f"  ✅ {site} login")
+        elif domains or site == 'facebook.com':
+            print(f"  ⚠️  {reason}")
+            # The downloaders only need a login for Facebook
+            usable = usable and site != 'facebook.com'
+    return usable
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export browser cookies to cookies.txt for the downloaders.")
+    parser.add_argument('--domains', metavar='LIST',
+                        help="comma-separated domains to refresh from every browser profile at once, "
+                             f"or 'all' for {','.join(DEFAULT_DOMAINS)}")
+    parser.add_argument('-o', '--output', default='cookies.txt', help="cookie file to write (default: cookies.txt)")
+    args = parser.parse_args(argv)
+
+    if args.domains:
+        domains = DEFAULT_DOMAINS if args.domains == 'all' else \
+            ['.' + domain.strip().lstrip('.') for domain in args.domains.split(',') if domain.strip()]
+        print("🍪 Cookie Refresh")
+        print("=" * 40)
+        if not refresh_all_cookies(domains, args.output):
+            return 1
+        print("\n🔍 Verifying cookie file...")
+        verify_cookie_file(args.output, domains)
+        return 0
+
     print("🍪 Facebook Cookie Extractor")
     print("=" * 40)
     
@@ -148,4 +321,4 @@ def main():
         print("5. Save as 'cookies.txt' in your script directory")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
\ No newline at end of file
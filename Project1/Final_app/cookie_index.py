@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Per-domain index of a Netscape cookies.txt, for checking a session before using it.
+
+index_file() reads the file once, line by line, hashing as it goes, and
+records for every domain the cookie names and their expiry. Results are
+kept by content hash; a file whose mtime and size have not changed is not
+read again at all.
+
+preflight(url) answers in microseconds whether the login cookies a site
+needs are present and unexpired, so extractors can skip strategies that
+only work logged in instead of finding out through a chain of failures."""
+import hashlib
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Cookies that make up a logged-in session, per site
+SESSION_COOKIES = {
+    'facebook.com': ('c_user', 'xs'),
+    'instagram.com': ('sessionid',),
+    'youtube.com': ('LOGIN_INFO',),
+    'tiktok.com': ('sessionid',),
+    'twitter.com': ('auth_token',),
+    'x.com': ('auth_token',),
+}
+# A session that expires sooner than this counts as stale already
+EXPIRY_MARGIN = 5 * 60
+# Indexes kept for different file contents
+CACHE_SIZE = 16
+
+
+def _lasts(expires):
+    # Session cookies (no expiry) last as long as the browser session, i.e. longest
+    return expires or float('inf')
+
+
+class CookieIndex:
+    def __init__(self, digest):
+        self.digest = digest
+        self.domains = {}
+        self.cookies = 0
+        self.invalid_lines = 0
+
+    def add(self, domain, name, expires):
+        domain = domain.lstrip('.').lower()
+        names = self.domains.setdefault(domain, {})
+        # Of duplicates, the one that lasts longest is what a browser would send
+        if name not in names or _lasts(names[name]) < _lasts(expires):
+            names[name] = expires
+        self.cookies += 1
+
+    def cookies_for(self, host):
+        """{name: expires} of every cookie sent to host (its domain and parent domains)"""
+        host = host.lower()
+        found = {}
+        parts = host.split('.')
+        for n in range(len(parts) - 1):
+            for name, expires in self.domains.get('.'.join(parts[n:]), {}).items():
+                if name not in found or _lasts(found[name]) < _lasts(expires):
+                    found[name] = expires
+        return found
+
+    def earliest_expiry(self, domain):
+        expiries = [expires for expires in self.domains.get(domain, {}).values() if expires]
+        return min(expiries) if expiries else None
+
+    def summary(self, now=None):
+        """[(domain, cookie_count, earliest_expiry, expired_count)] sorted by domain"""
+        now = now or time.time()
+        return [(domain, len(names), self.earliest_expiry(domain),
+                 sum(1 for expires in names.values() if expires and expires < now))
+                for domain, names in sorted(self.domains.items())]
+
+
+def _parse_into(index, line):
+    line = line.strip()
+    if line.startswith('#HttpOnly_'):
+        line = line[len('#HttpOnly_'):]
+    elif not line or line.startswith('#'):
+        return
+    fields = line.split('\t')
+    if len(fields) != 7:
+        index.invalid_lines += 1
+        return
+    domain, _, _, _, expires, name, _ = fields
+    try:
+        expires = int(float(expires)) or None  # 0 is a session cookie
+    except ValueError:
+        index.invalid_lines += 1
+        return
+    index.add(domain, name, expires)
+
+
+_by_stat = {}
+_by_digest = {}
+_cache_lock = threading.Lock()
+
+
+def index_file(path):
+    """CookieIndex for path, or None when it does not exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    path = os.path.abspath(path)
+    stat = (st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        seen = _by_stat.get(path)
+        if seen and seen[0] == stat and seen[1] in _by_digest:
+            return _by_digest[seen[1]]
+
+    sha = hashlib.sha256()
+    index = CookieIndex(None)
+    with open(path, 'rb') as f:
+        for raw in f:
+            sha.update(raw)
+            _parse_into(index, raw.decode('utf-8', errors='replace'))
+    index.digest = sha.hexdigest()
+    with _cache_lock:
+        # Same content under a new mtime (e.g. rewritten unchanged) shares the index built first
+        index = _by_digest.setdefault(index.digest, index)
+        _by_stat[path] = (stat, index.digest)
+        while len(_by_digest) > CACHE_SIZE:
+            _by_digest.pop(next(iter(_by_digest)))
+    return index
+
+
+def site_of(url_or_host):
+    host = (urlparse(url_or_host).hostname if '://' in url_or_host else url_or_host) or ''
+    host = host.lower().lstrip('.')
+    for site in SESSION_COOKIES:
+        if host == site or host.endswith('.' + site):
+            return site, host
+    return None, host
+
+
+def preflight(url, cookie_path, now=None):
+    """(ok, reason) for using cookie_path's session on url.
+
+    ok is True when the site needs no known session cookies, or all of them
+    are present and valid for EXPIRY_MARGIN more; otherwise reason says
+    which are missing or expired."""
+    site, host = site_of(url)
+    if site is None:
+        return True, ""
+    if not cookie_path:
+        return False, "no cookies.txt"
+    index = index_file(cookie_path)
+    if index is None:
+        return False, f"{cookie_path} not found"
+    now = now or time.time()
+    cookies = index.cookies_for(host)
+    missing = [name for name in SESSION_COOKIES[site] if name not in cookies]
+    if missing:
+        return False, f"no {', '.join(missing)} cookie for {site} in {os.path.basename(cookie_path)}"
+    expired = [name for name in SESSION_COOKIES[site]
+               if cookies[name] is not None and cookies[name] < now + EXPIRY_MARGIN]
+    if expired:
+        earliest = min(cookies[name] for name in expired)
+        when = time.strftime('%Y-%m-%d %H:%M', time.localtime(earliest))
+        return False, f"{site} session cookie {', '.join(expired)} {'expired' if earliest < now else 'expires'} {when}"
+    return True, ""
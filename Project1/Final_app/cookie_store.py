@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+"""One in-memory cookie jar per cookies.txt, shared by every YoutubeDL in the process.
+
+Given 'cookiefile', each YoutubeDL parses the Netscape file when it starts
+and writes the whole jar back when it closes. With several extraction
+strategies racing, that is repeated file I/O, and two instances closing
+at once can leave a corrupt cookies.txt.
+
+open_ydl() takes 'cookiefile' out of the options and hands the YoutubeDL
+the shared jar instead. The jar is reloaded in place when the file
+changes on disk: cheap stat checks first, and a SHA-256 comparison only
+when the mtime or size moved. Cookies that sites set during a job are
+written back when the YoutubeDL closes, only if something changed, by
+one writer at a time, through a temp file and os.replace.
+
+Extraction worker processes (see extraction_service) call
+set_read_only(): their stores never write the file. take_changes() hands
+the cookies sites set there back to the parent, whose store merges them
+and is the only process that writes cookies.txt."""
+import hashlib
+import http.cookiejar
+import logging
+import os
+import threading
+import time
+
+import yt_dlp
+
+try:
+    from yt_dlp.cookies import YoutubeDLCookieJar as _CookieJar
+except ImportError:  # older yt-dlp
+    _CookieJar = http.cookiejar.MozillaCookieJar
+
+# The file is stat'ed at most this often
+CHECK_INTERVAL = 2.0
+
+
+def _digest(path):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(64 * 1024), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _entry(cookie):
+    return cookie.domain, cookie.path, cookie.name, cookie.value or '', cookie.expires or 0
+
+
+def _snapshot(jar):
+    return sorted(_entry(cookie) for cookie in jar)
+
+
+# Set in processes that must leave cookie files alone
+_read_only = False
+
+
+def set_read_only():
+    """Never write cookie files from this process; see take_changes()"""
+    global _read_only
+    _read_only = True
+
+
+def _key(cookie):
+    return cookie.domain, cookie.path, cookie.name
+
+
+class CookieStore:
+    def __init__(self, path, read_only=False):
+        self.path = os.path.abspath(path)
+        self.read_only = read_only
+        self.jar = _CookieJar()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stat = None
+        self._hash = None
+        self._saved = []
+        self._checked = 0.0
+        self.loads = 0
+        self.saves = 0
+        self.refresh(force=True)
+
+    def refresh(self, force=False):
+        """Reload the jar if cookies.txt changed on disk; returns True when it did"""
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._checked < CHECK_INTERVAL:
+                return False
+            self._checked = now
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return False  # keep what we have; the file may be being replaced
+            stat = (st.st_mtime_ns, st.st_size)
+            if stat == self._stat:
+                return False
+            self._stat = stat
+            try:
+                digest = _digest(self.path)
+                if digest == self._hash:
+                    return False  # touched, not changed
+                fresh = _CookieJar()
+                fresh.load(self.path, ignore_discard=True, ignore_expires=True)
+            except (OSError, http.cookiejar.LoadError) as e:
+                logging.error(f"Could not load cookies from {self.path}: {e}")
+                return False
+            self._hash = digest
+            # In place: every YoutubeDL holding the jar sees the new cookies
+            self.jar.clear()
+            for cookie in fresh:
+                self.jar.set_cookie(cookie)
+            self._saved = _snapshot(self.jar)
+            self.loads += 1
+        logging.info(f"Loaded {len(self._saved)} cookies from {self.path}")
+        return True
+
+    def persist(self):
+        """Write the jar back if sites changed any cookie; returns True when the file was written"""
+        self.refresh()
+        with self._write_lock:
+            snapshot = _snapshot(self.jar)
+            if snapshot == self._saved:
+                return False
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            try:
+                self.jar.save(tmp, ignore_discard=True, ignore_expires=True)
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.error(f"Could not save cookies to {self.path}: {e}")
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                return False
+            st = os.stat(self.path)
+            with self._lock:
+                # Our own write must not trigger a reload
+                self._stat = (st.st_mtime_ns, st.st_size)
+                self._hash = _digest(self.path)
+                self._saved = snapshot
+            self.saves += 1
+        return True
+
+    def take_changes(self):
+        """(cookies set or changed, keys (domain, path, name) removed) since the file was loaded or last asked"""
+        with self._lock:
+            saved = set(self._saved)
+            changed = [cookie for cookie in self.jar if _entry(cookie) not in saved]
+            current = {_key(cookie) for cookie in self.jar}
+            removed = sorted({entry[:3] for entry in self._saved} - current)
+            self._saved = _snapshot(self.jar)
+        return changed, removed
+
+    def merge(self, cookies, removed=()):
+        """Apply changes from take_changes() in another process, and write them out"""
+        self.refresh()  # on top of the file as it is now, not an older copy
+        with self._lock:
+            for domain, path, name in removed:
+                try:
+                    self.jar.clear(domain, path, name)
+                except KeyError:
+                    pass
+            for cookie in cookies:
+                self.jar.set_cookie(cookie)
+        return self.persist()
+
+    def attach(self, ydl):
+        """Make ydl use the shared jar, and save through the store when it closes"""
+        self.refresh()
+        ydl.cookiejar = self.jar
+        ydl.save_cookies = (lambda: None) if self.read_only else self.persist
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path):
+    """The process-wide store for a cookie file"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = CookieStore(key, read_only=_read_only)
+        return store
+
+
+def take_all_changes():
+    """{path: take_changes()} of every store with something to hand back"""
+    with _stores_lock:
+        stores = list(_stores.values())
+    changes = {}
+    for store in stores:
+        cookies, removed = store.take_changes()
+        if cookies or removed:
+            changes[store.path] = (cookies, removed)
+    return changes
+
+
+def open_ydl(opts):
+    """yt_dlp.YoutubeDL(opts), using the shared jar for opts['cookiefile'] if there is one"""
+    cookiefile = opts.get('cookiefile')
+    if not cookiefile:
+        return yt_dlp.YoutubeDL(opts)
+    # Without 'cookiefile' yt-dlp neither reads nor rewrites the file itself
+    ydl = yt_dlp.YoutubeDL({key: value for key, value in opts.items() if key != 'cookiefile'})
+    get_store(cookiefile).attach(ydl)
+    return ydl
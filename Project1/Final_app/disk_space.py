@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""Disk-space admission for downloads, and file preallocation.
+
+A job's peak disk use is predicted from its info dict: the size of the
+format that will be downloaded (see format_ranking), doubled when the
+parts are merged or the file is converted, since input and output exist
+side by side until ffmpeg is done. DiskAdmission is plugged into
+JobScheduler and only starts a job when that much is free on the target
+filesystem, after subtracting what running jobs still have to write and a
+reserve. Held jobs stay queued with the reason as their status, smaller
+jobs behind them can still start, and the check is repeated as jobs finish
+and every few seconds (for space freed outside the app).
+
+Jobs without a known size are always admitted."""
+import logging
+import os
+import shutil
+import threading
+
+import format_ranking
+
+# Always left free on the target filesystem
+DEFAULT_RESERVE = 256 * 1024 * 1024
+# Merged or converted downloads hold input and output at once
+POSTPROCESS_FACTOR = 2
+
+
+class InsufficientSpace(OSError):
+    pass
+
+
+def _existing(path):
+    # The download directory may not exist yet; its nearest existing parent is on the same filesystem
+    path = os.path.abspath(path)
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return path
+
+
+def free_bytes(path):
+    """Free space for path's filesystem; path may not exist yet"""
+    return shutil.disk_usage(_existing(path)).free
+
+
+def ensure_space(path, needed, reserve=DEFAULT_RESERVE):
+    """Raise InsufficientSpace unless needed bytes (None: unknown) fit in path's free space"""
+    if not needed:
+        return
+    free = free_bytes(path)
+    if free - reserve < needed:
+        raise InsufficientSpace(f"Not enough disk space in {path}: needs {format_ranking.format_size(needed)}, "
+                                f"{format_ranking.format_size(max(free - reserve, 0))} free")
+
+
+def preallocate(f, size):
+    """Reserve size bytes for an open file, as one extent where the filesystem supports it.
+
+    posix_fallocate allocates real blocks (ext4, xfs, btrfs); elsewhere the
+    file is extended to size, which NTFS allocates and others keep sparse."""
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError:
+            pass  # e.g. not supported by the filesystem
+    f.truncate(size)
+
+
+def required_bytes(info, quality='best', format=None, budget=None, max_height=1080):
+    """Peak bytes a download of info needs on disk, or None when no size is known.
+
+    format is a pinned format string; without one the option select() would
+    pick (under budget, when given) is assumed. Playlists add up their entries."""
+    if not info:
+        return None
+    if info.get('entries') is not None:
+        sizes = [required_bytes(entry, quality, None, budget, max_height) for entry in info['entries'] if entry]
+        return sum(size for size in sizes if size) or None
+    options = format_ranking.options_for(info, quality, max_height)
+    if format:
+        option = next((option for option in options if option['format'] == format), None)
+    else:
+        option = format_ranking.select(info, quality, budget, max_height)
+    if option is None or not option['bytes']:
+        return None
+    postprocessed = '+' in option['format'] or quality == 'audio-mp3'
+    return option['bytes'] * (POSTPROCESS_FACTOR if postprocessed else 1)
+
+
+class _Reservation:
+    def __init__(self, device, needed):
+        self.device = device
+        self.needed = needed
+        self.written = {}
+
+    @property
+    def remaining(self):
+        return max(self.needed - sum(self.written.values()), 0)
+
+
+class DiskAdmission:
+    """JobScheduler admission by free disk space.
+
+    Jobs carry their target directory in job.data['output_path'] and their
+    predicted need in job.data['disk_bytes']. hook(job.id) gives a progress
+    hook that counts what a running job has already written, so it is not
+    subtracted twice."""
+
+    def __init__(self, reserve=DEFAULT_RESERVE, free=free_bytes):
+        self.reserve = reserve
+        self._free = free
+        self._reserved = {}
+        self._held = set()
+        self._lock = threading.Lock()
+
+    def admit(self, job):
+        """None when job may start (its space is then reserved), else the reason it waits"""
+        needed = job.data.get('disk_bytes')
+        path = job.data.get('output_path')
+        if not needed or not path:
+            return None
+        try:
+            device = os.stat(_existing(path)).st_dev
+            free = self._free(path)
+        except OSError as e:
+            logging.warning(f"Could not check free space in {path}: {e}")
+            return None
+        with self._lock:
+            promised = sum(reservation.remaining for reservation in self._reserved.values()
+                           if reservation.device == device)
+            available = max(free - promised - self.reserve, 0)
+            if needed <= available:
+                self._reserved[job.id] = _Reservation(device, needed)
+                self._held.discard(job.id)
+                return None
+            first_time = job.id not in self._held
+            self._held.add(job.id)
+        reason = f"Low disk: needs {format_ranking.format_size(needed)}, {format_ranking.format_size(available)} free"
+        if first_time:
+            logging.warning(f"Holding {job.title}: needs {format_ranking.format_size(needed)} in {path}, "
+                            f"{format_ranking.format_size(free)} free, {format_ranking.format_size(promised)} "
+                            f"promised to running downloads, {format_ranking.format_size(self.reserve)} reserve")
+        return reason
+
+    def release(self, job):
+        with self._lock:
+            self._reserved.pop(job.id, None)
+            self._held.discard(job.id)
+
+    def hook(self, key):
+        return lambda d: self.report(key, d)
+
+    def report(self, key, d):
+        if d.get('status') not in ('downloading', 'finished'):
+            return
+        name = d.get('tmpfilename') or d.get('filename')
+        done = d.get('downloaded_bytes') or d.get('total_bytes') or 0
+        with self._lock:
+            reservation = self._reserved.get(key)
+            if reservation is not None and done > reservation.written.get(name, 0):
+                reservation.written[name] = done
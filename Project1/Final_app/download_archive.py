@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""Persistent index of media that has already been downloaded.
+
+Entries are keyed by (extractor, id) the same way yt-dlp's own archive file
+is, and optionally carry a SHA-256 of the downloaded file. All keys are held
+in an in-memory set, so lookups stay O(1) for archives with hundreds of
+thousands of entries. The check plugs into yt-dlp as a match_filter, which
+runs before an entry is downloaded - for playlists and channels even before
+the entry is extracted - so re-running a sync only transfers new items."""
+import functools
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import yt_dlp
+from yt_dlp.postprocessor import PostProcessor
+
+HASH_CHUNK_SIZE = 1024 * 1024
+# URLs whose archive key is remembered; batch lists and re-runs look the same URLs up again
+URL_KEY_CACHE_SIZE = 65536
+
+
+def archive_key(info):
+    """'extractor id' for an info dict or flat playlist entry, or None"""
+    extractor = info.get('extractor_key') or info.get('ie_key') or info.get('extractor')
+    media_id = info.get('id')
+    if not extractor or not media_id:
+        return None
+    return f"{extractor.lower()} {media_id}"
+
+
+@functools.lru_cache(maxsize=1)
+def _extractor_classes():
+    # Building the list imports every extractor module; do it once
+    return tuple(yt_dlp.extractor.gen_extractor_classes())
+
+
+@functools.lru_cache(maxsize=URL_KEY_CACHE_SIZE)
+def url_key(url):
+    """Archive key worked out from the URL alone, without touching the network.
+
+    The first suitable extractor decides, as in yt-dlp; results are memoized per URL."""
+    for ie in _extractor_classes():
+        if not ie.suitable(url):
+            continue
+        if ie.ie_key() == 'Generic':
+            return None
+        try:
+            temp_id = ie.get_temp_id(url)
+        except Exception:
+            return None
+        return f"{ie.ie_key().lower()} {temp_id}" if temp_id else None
+    return None
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DownloadArchive:
+    def __init__(self, path, hash_content=False):
+        self.path = path
+        self.hash_content = hash_content
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS archive (
+                extractor TEXT NOT NULL,
+                media_id TEXT NOT NULL,
+                title TEXT,
+                path TEXT,
+                size INTEGER,
+                sha256 TEXT,
+                added REAL NOT NULL,
+                PRIMARY KEY (extractor, media_id)
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS archive_sha256 ON archive (sha256)")
+        self._conn.commit()
+        self._keys = {f"{extractor} {media_id}" for extractor, media_id
+                      in self._conn.execute("SELECT extractor, media_id FROM archive")}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def contains_info(self, info):
+        key = archive_key(info)
+        return key is not None and key in self._keys
+
+    def contains_url(self, url):
+        key = url_key(url)
+        return key is not None and key in self._keys
+
+    def find_hash(self, sha256):
+        """(extractor, id, path) of an entry with this content hash, or None"""
+        with self._lock:
+            return self._conn.execute("SELECT extractor, media_id, path FROM archive WHERE sha256 = ?",
+                                      (sha256,)).fetchone()
+
+    def add(self, info, filepath=None):
+        """Record a finished download. Returns the entry it duplicates by content, if any."""
+        key = archive_key(info)
+        if key is None:
+            return None
+        extractor, media_id = key.split(' ', 1)
+        size = os.path.getsize(filepath) if filepath and os.path.exists(filepath) else None
+        sha256 = None
+        duplicate = None
+        if self.hash_content and size is not None:
+            sha256 = file_sha256(filepath)
+            duplicate = self.find_hash(sha256)
+            if duplicate:
+                logging.warning(f"{filepath} has the same content as {duplicate[0]} {duplicate[1]} ({duplicate[2]})")
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO archive (extractor, media_id, title, path, size, sha256, added) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (extractor, media_id, info.get('title'), filepath, size, sha256, time.time()))
+            self._conn.commit()
+            self._keys.add(key)
+        return duplicate
+
+    def remove(self, key):
+        extractor, media_id = key.split(' ', 1)
+        with self._lock:
+            self._conn.execute("DELETE FROM archive WHERE extractor = ? AND media_id = ?", (extractor, media_id))
+            self._conn.commit()
+            self._keys.discard(key)
+
+    def match_filter(self, on_skip=None):
+        """yt-dlp match_filter that skips archived entries and reports them to on_skip(key, title)"""
+        def check(info, incomplete=False):
+            key = archive_key(info)
+            if key is not None and key in self._keys:
+                if on_skip:
+                    on_skip(key, info.get('title'))
+                return f"{info.get('title') or key} is already in the download archive"
+            return None
+        return check
+
+    def attach(self, ydl, on_skip=None):
+        """Make a YoutubeDL instance skip archived entries and record what it downloads"""
+        ydl.params['match_filter'] = self.match_filter(on_skip)
+        ydl.add_post_processor(ArchiveRecorder(self, ydl), when='after_move')
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ArchiveRecorder(PostProcessor):
+    """Adds each entry to the archive once its file is in its final place"""
+
+    def __init__(self, archive, downloader=None):
+        super().__init__(downloader)
+        self.archive = archive
+
+    def run(self, info):
+        self.archive.add(info, info.get('filepath'))
+        return [], info
+
+
+class SkipSummary:
+    """Collects the entries skipped during one download, for the status line"""
+
+    def __init__(self):
+        self.items = []
+        self._lock = threading.Lock()
+
+    def __call__(self, key, title=None):
+        with self._lock:
+            self.items.append({'key': key, 'title': title})
+
+    def __len__(self):
+        return len(self.items)
+
+    def describe(self):
+        if not self.items:
+            return ""
+        return f"{len(self.items)} already downloaded, skipped"
+
+
+_default_archive = None
+_default_archive_lock = threading.Lock()
+
+
+def get_default_archive():
+    """Process-wide archive stored next to the downloader scripts"""
+    global _default_archive
+    with _default_archive_lock:
+        if _default_archive is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'download_archive.sqlite3')
+            try:
+                _default_archive = DownloadArchive(path)
+            except sqlite3.Error as e:
+                logging.error(f"Could not open download archive {path}: {e}")
+                _default_archive = DownloadArchive(':memory:')
+        return _default_archive
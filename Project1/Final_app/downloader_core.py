@@ -0,0 +1,727 @@
+# -*- coding: utf-8 -*-
+"""Download logic shared by the tkinter downloaders and batch_download.py.
+
+Nothing in here imports tkinter or PIL, so it can be used on a headless box."""
+import collections
+import concurrent.futures
+import datetime
+import logging
+import os
+import re
+import threading
+import time
+
+import yt_dlp
+
+import bandwidth
+import cookie_index
+import cookie_store
+import disk_space
+import download_archive
+import format_ranking
+import fragment_tuner
+import metadata_cache
+import postprocess_pool
+import segmented_download
+import telemetry
+import ydl_profiles
+from job_scheduler import host_of
+
+class ExtractionError(Exception):
+    """Raised when a URL yields no downloadable media"""
+
+
+def cookie_file():
+    return ydl_profiles.get_default_registry().cookie_file()
+
+
+def ffmpeg_location():
+    return ydl_profiles.get_default_registry().ffmpeg_location()
+
+
+def is_facebook_url(url):
+    return 'facebook.com' in url.lower()
+
+
+def sanitize_title(title, max_length=50):
+    """Make a title safe to use as a file name"""
+    if not title:
+        return f"video_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+    sanitized = re.sub(r'[\\/:*?"<>|]', '', title)[:max_length].strip()
+    return sanitized or f"video_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def has_valid_media(item_info):
+    """Check if item has valid media for download"""
+    if item_info.get('url'):
+        return True
+
+    for fmt in item_info.get('formats') or []:
+        if fmt.get('url'):
+            return True
+
+    if item_info.get('webpage_url'):
+        return True
+
+    return False
+
+
+def get_download_url(item_info):
+    """Get the best download URL for an item"""
+    if item_info.get('webpage_url'):
+        return item_info['webpage_url']
+
+    if item_info.get('url'):
+        return item_info['url']
+
+    for fmt in item_info.get('formats') or []:
+        if fmt.get('url'):
+            return fmt['url']
+
+    return None
+
+
+def media_entries(info):
+    """Return the downloadable items of an extracted info dict (playlist or single video)"""
+    if not info:
+        return []
+    if 'entries' in info and info['entries']:
+        return [entry for entry in info['entries'] if entry and has_valid_media(entry)]
+    if has_valid_media(info):
+        return [info]
+    return []
+
+
+def predict_audio_savings(info, max_height=1080):
+    """Estimated bytes of the audio-only path against the 'best' video path.
+
+    Returns {'audio_bytes', 'video_bytes', 'saved_bytes', 'ratio'}, or None
+    when the info has no sizes or bitrates to go by (or no pure audio format)."""
+    audio = format_ranking.select(info, 'audio')
+    video = format_ranking.select(info, 'best', max_height=max_height)
+    if not audio or not video or not audio['bytes'] or not video['bytes']:
+        return None
+    return {'audio_bytes': audio['bytes'], 'video_bytes': video['bytes'],
+            'saved_bytes': max(video['bytes'] - audio['bytes'], 0), 'ratio': audio['bytes'] / video['bytes']}
+
+
+def describe_audio_savings(info):
+    """'Audio only: ~4.1MiB instead of ~61.2MiB (93% less)', or '' when it cannot be predicted"""
+    savings = predict_audio_savings(info) if info else None
+    if not savings:
+        return ""
+    mib = 1024 * 1024
+    return (f"Audio only: ~{savings['audio_bytes'] / mib:.1f}MiB instead of ~{savings['video_bytes'] / mib:.1f}MiB "
+            f"({1 - savings['ratio']:.0%} less)")
+
+
+# --- Extraction ---
+
+def extraction_opts(profile='desktop', use_cookies=False, **extra):
+    """Options for info extraction: 'desktop', 'navigation', 'mobile' or 'externalhit'"""
+    return ydl_profiles.get_default_registry().build(profile, cookies=use_cookies, **extra)
+
+
+# Set by use_extraction_service(); extraction then runs in its worker processes
+_extraction_service = None
+
+
+def use_extraction_service(service):
+    """Route every extraction through an extraction_service.ExtractionService (None: back in-process)"""
+    global _extraction_service
+    _extraction_service = service
+
+
+def _extract(url, opts, race=None):
+    service = _extraction_service
+    if service is not None:
+        future = service.submit(url, opts)
+        if race is not None:
+            race.track(service, future)
+        return future.result()
+    with cookie_store.open_ydl(opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+
+def cache_info(url, info):
+    """Store an extracted info dict, and each resolved playlist entry, in the metadata cache"""
+    if not info:
+        return
+    cache = metadata_cache.get_default_cache()
+    try:
+        info = yt_dlp.YoutubeDL.sanitize_info(info)
+        cache.put(url, info)
+        # Downloads are started from each item's webpage_url, so index those too
+        for item in [info] + list(info.get('entries') or []):
+            if item and item.get('webpage_url') and item.get('formats') and item['webpage_url'] != url:
+                cache.put(item['webpage_url'], item)
+    except Exception as e:
+        logging.error(f"Could not cache metadata for {url}: {e}")
+
+
+def cached_info(url):
+    try:
+        return metadata_cache.get_default_cache().get(url)
+    except Exception as e:
+        logging.error(f"Metadata cache lookup failed for {url}: {e}")
+        return None
+
+
+# How recent extractions went (strategy, seconds), picked up by download()'s telemetry
+_extractions = collections.OrderedDict()
+_extractions_lock = threading.Lock()
+EXTRACTIONS_KEPT = 256
+
+
+def _record_extraction(url, strategy, started, info):
+    with _extractions_lock:
+        _extractions[url] = {'strategy': strategy, 'extractor': info.get('extractor'),
+                             'seconds': time.monotonic() - started}
+        _extractions.move_to_end(url)
+        while len(_extractions) > EXTRACTIONS_KEPT:
+            _extractions.popitem(last=False)
+
+
+def _take_extraction(url):
+    with _extractions_lock:
+        return _extractions.pop(url, None)
+
+
+def extract_standard(url, use_cache=True):
+    """Standard extraction for non-Facebook URLs; returns the raw info dict"""
+    started = time.monotonic()
+    info = cached_info(url) if use_cache else None
+    if info:
+        logging.info(f"Using cached info for URL: {url} - Extractor: {info.get('extractor', 'Unknown')}")
+        _record_extraction(url, 'cache', started, info)
+        return info
+    info = _extract(url, extraction_opts())
+    logging.info(f"Extracted info for URL: {url} - Extractor: {info.get('extractor', 'Unknown')}")
+    _record_extraction(url, 'standard', started, info)
+    cache_info(url, info)
+    return info
+
+
+def extract_listing(url, use_cache=True):
+    """Fast first pass: playlists come back flat (titles and URLs, one request), single videos in full.
+
+    Flat playlist entries carry '_flat': True until resolve_entry() replaces them."""
+    info = cached_info(url) if use_cache else None
+    if info:
+        return info
+    info = _extract(url, extraction_opts(extract_flat='in_playlist'))
+    if info.get('entries') is not None:
+        # Not cached: the cache holds fully resolved info under the playlist URL
+        info['entries'] = [dict(entry, _flat=True) for entry in info['entries'] if entry]
+        logging.info(f"Listed {len(info['entries'])} entries of {url} - Extractor: {info.get('extractor', 'Unknown')}")
+    else:
+        logging.info(f"Extracted info for URL: {url} - Extractor: {info.get('extractor', 'Unknown')}")
+        cache_info(url, info)
+    return info
+
+
+def resolve_entry(entry):
+    """Full info for a flat playlist entry (cached per entry URL)"""
+    url = entry.get('webpage_url') or entry.get('url')
+    if is_facebook_url(url):
+        return extract_facebook(url)
+    return extract_standard(url)
+
+
+# auth: the strategy only makes sense with a logged-in session
+Strategy = collections.namedtuple('Strategy', 'name key url opts auth', defaults=(False,))
+
+# domain -> key of the strategy that most recently produced media there
+_strategy_wins = {}
+_strategy_wins_lock = threading.Lock()
+
+
+def facebook_strategies(url, session=True):
+    """Every way of getting at a Facebook video, in the default order they are tried.
+
+    With session=False (cookies.txt has no valid Facebook login) the strategies
+    that need one are left out and the others go without cookies."""
+    mobile_url = url.replace('www.facebook.com', 'm.facebook.com')
+    if '/reel/' in mobile_url:
+        mobile_url = mobile_url.replace('/reel/', '/watch/?v=')
+
+    strategies = [
+        # A logged-in browser navigating to the page
+        Strategy("Facebook method 1", "navigation", url, extraction_opts('navigation', use_cookies=session), auth=True),
+        Strategy("Facebook method 2", "externalhit", url, extraction_opts('externalhit', use_cookies=session)),
+        Strategy("Facebook method 3", "mobile", mobile_url, extraction_opts('mobile', use_cookies=session)),
+    ]
+
+    # Method 4: different URL formats, no certificate checks
+    seen = set()
+    for label, variant in (("original", url),
+                           ("reel-as-watch", url.replace('/reel/', '/watch/?v=')),
+                           ("m-host", url.replace('www.facebook.com', 'm.facebook.com')),
+                           ("www-host", url.replace('m.facebook.com', 'www.facebook.com'))):
+        if variant in seen:
+            continue
+        seen.add(variant)
+        strategies.append(Strategy("Facebook method 4", f"variant-{label}", variant, extraction_opts(
+            'desktop', use_cookies=session, nocheckcertificate=True, allow_unplayable_formats=True)))
+    if not session:
+        strategies = [strategy for strategy in strategies if not strategy.auth]
+    return strategies
+
+
+# domain -> last preflight failure that was logged
+_preflight_logged = {}
+
+
+def session_preflight(url):
+    """(ok, reason): does cookies.txt hold an unexpired login for url's site? Cheap enough to call per URL"""
+    try:
+        return cookie_index.preflight(url, cookie_file())
+    except OSError as e:
+        return False, f"cookies.txt unreadable: {e}"
+
+
+def _order_strategies(domain, strategies):
+    """Move the strategy that last won on this domain to the front"""
+    with _strategy_wins_lock:
+        preferred = _strategy_wins.get(domain)
+    return sorted(strategies, key=lambda strategy: strategy.key != preferred), preferred
+
+
+def _remember_winner(domain, strategy):
+    with _strategy_wins_lock:
+        _strategy_wins[domain] = strategy.key
+
+
+class _Race:
+    """Cancellation shared by the strategies of one race"""
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._lock = threading.Lock()
+        self._submitted = []
+
+    def is_set(self):
+        return self._cancelled.is_set()
+
+    def track(self, service, future):
+        """Remember an extraction-service task, so losers stop using its workers"""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._submitted.append((service, future))
+                return
+        service.cancel(future)
+
+    def cancel(self):
+        with self._lock:
+            self._cancelled.set()
+            submitted, self._submitted = self._submitted, []
+        for service, future in submitted:
+            service.cancel(future)
+
+
+def _run_strategy(strategy, race=None):
+    """Extract with one strategy; returns info with valid media or None"""
+    if race is not None and race.is_set():
+        return None
+    try:
+        info = _extract(strategy.url, strategy.opts, race)
+        if info and has_valid_media(info):
+            return info
+        logging.error(f"{strategy.name} failed for {strategy.url}: no valid media")
+    except Exception as e:
+        if race is None or not race.is_set():
+            logging.error(f"{strategy.name} failed for {strategy.url}: {e}")
+    return None
+
+
+def _race_strategies(strategies, preferred=None, on_attempt=None, hedge_delay=2.0):
+    """Run strategies concurrently and return (info, strategy) for the first one with valid media.
+
+    If a strategy won on this domain before, it gets hedge_delay seconds on its own
+    before the others are fired. Losers that have not started are cancelled. In
+    the extraction service, running losers are cancelled too (their workers are
+    restarted); in-process ones cannot be interrupted inside yt-dlp, so they
+    finish in the background and their results are dropped."""
+    race = _Race()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=len(strategies), thread_name_prefix="fb-strategy")
+    futures = {}
+
+    def launch(strategy):
+        if on_attempt:
+            on_attempt(strategy.name)
+        futures[executor.submit(_run_strategy, strategy, race)] = strategy
+
+    try:
+        remaining = list(strategies)
+        if preferred and remaining and remaining[0].key == preferred:
+            first = remaining.pop(0)
+            launch(first)
+            done, _ = concurrent.futures.wait(futures, timeout=hedge_delay)
+            for future in done:
+                if future.result() is not None:
+                    return future.result(), first
+        for strategy in remaining:
+            launch(strategy)
+
+        for future in concurrent.futures.as_completed(futures):
+            info = future.result()
+            if info is not None:
+                return info, futures[future]
+        return None, None
+    finally:
+        race.cancel()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_facebook(url, on_attempt=None, use_cache=True, hedged=True, hedge_delay=2.0):
+    """Return the first Facebook info dict with valid media.
+
+    hedged=True races all strategies at once; hedged=False tries them one after another."""
+    started = time.monotonic()
+    info = cached_info(url) if use_cache else None
+    if info and has_valid_media(info):
+        _record_extraction(url, 'cache', started, info)
+        return info
+
+    domain = host_of(url)
+    session, reason = session_preflight(url)
+    if not session and reason != _preflight_logged.get(domain):
+        # Once per reason, not for every entry of a playlist
+        _preflight_logged[domain] = reason
+        logging.warning(f"Skipping logged-in Facebook methods on {domain}: {reason}")
+    strategies, preferred = _order_strategies(domain, facebook_strategies(url, session))
+    if hedged:
+        info, winner = _race_strategies(strategies, preferred, on_attempt, hedge_delay)
+    else:
+        info, winner = None, None
+        for strategy in strategies:
+            if on_attempt:
+                on_attempt(strategy.name)
+            info = _run_strategy(strategy)
+            if info is not None:
+                winner = strategy
+                break
+
+    if info is None:
+        raise ExtractionError(f"All Facebook methods failed for {url}" + (f" ({reason})" if not session else ""))
+    _remember_winner(domain, winner)
+    logging.info(f"{winner.name} ({winner.key}) succeeded for {url} in {time.monotonic() - started:.2f}s")
+    _record_extraction(url, winner.key, started, info)
+    cache_info(url, info)
+    return info
+
+
+def extract_media(url, on_attempt=None, use_cache=True):
+    """Extract a URL with the right strategy for its site and return the raw info dict"""
+    if is_facebook_url(url):
+        return extract_facebook(url, on_attempt=on_attempt, use_cache=use_cache)
+    return extract_standard(url, use_cache=use_cache)
+
+
+# --- Download ---
+
+def download_opts(quality="best", output_path=None, filename=None, platform="Unknown", progress_hooks=None,
+                  use_cookies=None, **overrides):
+    """Build yt-dlp options for a download from the profile for quality ('best', 'worst', 'audio', 'audio-mp3').
+
+    use_cookies=None sends cookies.txt only for Facebook, which is what SecondGen always did.
+    Any other keyword (retries=5, concurrent_fragment_downloads=4, ...) overrides the profile."""
+    if use_cookies is None:
+        use_cookies = 'facebook' in (platform or '').lower()
+    opts = ydl_profiles.get_default_registry().for_quality(
+        quality, cookies=use_cookies, progress_hooks=list(progress_hooks or []), **overrides)
+    if output_path:
+        opts['outtmpl'] = os.path.join(output_path, f"{filename or '%(title)s_%(id)s'}.%(ext)s")
+    return opts
+
+
+def _download_segmented(ydl, info, connections, progress_hooks, files, archive, skipped):
+    """Fetch a single progressive format over several connections.
+
+    Returns the SegmentedDownloader result, True if the archive already has
+    it, or None when the selected format is not one plain HTTP file (merged
+    video+audio, HLS/DASH, live, playlists) and yt-dlp should handle it."""
+    if info.get('_type', 'video') != 'video':
+        return None
+    # Select the format with this download's options; cached info may have been selected differently
+    selected = ydl.process_ie_result(dict(info), download=False)
+    if (not selected or selected.get('requested_formats') or selected.get('is_live')
+            or selected.get('protocol') not in ('http', 'https') or not selected.get('url')):
+        return None
+    if archive is not None and archive.contains_info(selected):
+        skipped(download_archive.archive_key(selected), selected.get('title'))
+        return True
+
+    path = ydl.prepare_filename(selected)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    downloader = segmented_download.SegmentedDownloader(connections, headers=selected.get('http_headers'),
+                                                        progress_hooks=progress_hooks)
+    result = downloader.download(selected['url'], path)
+    for hook in progress_hooks or []:
+        hook({'status': 'finished', 'filename': path, 'total_bytes': result['bytes'],
+              'downloaded_bytes': result['bytes']})
+    files.append(path)
+    if archive is not None:
+        archive.add(selected, path)
+    return result
+
+
+def _download_staged(ydl, info, pipeline, postprocessors, files, archive, skipped, trace):
+    """Download the streams with yt-dlp's downloaders and queue merging / audio extraction on pipeline.
+
+    Returns (selected info, Future of the final path), True if the archive
+    already has it, or None when there is nothing to hand off (one file that
+    needs no post-processing, live streams, playlists) and yt-dlp should
+    handle it as usual."""
+    if info.get('_type', 'video') != 'video':
+        return None
+    extract = [pp for pp in postprocessors if pp.get('key') == 'FFmpegExtractAudio']
+    if len(extract) != len(postprocessors):
+        return None  # a postprocessor the pipeline has no stage for
+    selected = ydl.process_ie_result(dict(info), download=False)
+    if not selected or selected.get('is_live'):
+        return None
+    requested = selected.get('requested_formats')
+    if not requested and not extract:
+        return None
+    if archive is not None and archive.contains_info(selected):
+        skipped(download_archive.archive_key(selected), selected.get('title'))
+        return True
+
+    path = ydl.prepare_filename(selected)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ffmpeg_location = ydl.params.get('ffmpeg_location')
+    if requested:
+        base = os.path.splitext(path)[0]
+        parts = []
+        for fmt in requested:
+            part_info = dict(selected)
+            part_info.pop('requested_formats', None)
+            part_info.update(fmt)
+            part = f"{base}.f{fmt['format_id']}.{fmt['ext']}"
+            # dl() returns the downloader's (success, real_download), which is always truthy
+            success, _ = ydl.dl(part, part_info)
+            if not success:
+                raise yt_dlp.utils.DownloadError(f"Downloading format {fmt['format_id']} failed")
+            parts.append(part)
+        path = f"{base}.{ydl.params.get('merge_output_format') or selected['ext']}"
+    else:
+        success, _ = ydl.dl(path, selected)
+        if not success:
+            raise yt_dlp.utils.DownloadError(f"Downloading {selected.get('title') or path} failed")
+
+    submitted = time.monotonic()
+
+    def work():
+        queued = round(time.monotonic() - submitted, 3)
+        output = path
+        if requested:
+            with trace.phase(postprocess_pool.MERGE, queued=queued):
+                output = postprocess_pool.merge(parts, path, ffmpeg_location)
+        if extract:
+            with trace.phase(postprocess_pool.EXTRACT_AUDIO, queued=queued):
+                output = postprocess_pool.extract_audio(output, extract[0].get('preferredcodec', 'mp3'),
+                                                        extract[0].get('preferredquality', '192'), ffmpeg_location)
+        files.append(output)
+        if archive is not None:
+            archive.add(selected, output)
+        return output
+
+    return selected, pipeline.submit(postprocess_pool.EXTRACT_AUDIO if extract else postprocess_pool.MERGE, work)
+
+
+def download(url, output_path, quality="best", title=None, platform="Unknown", filename=None,
+             progress_hooks=None, info=None, use_cache=True, use_archive=True, turbo=False, connections=1,
+             governor=None, pipeline=None, max_bytes=None, **opts_kwargs):
+    """Download a URL and return a result dict (url, title, path, files, bytes, duration, skipped, fragments).
+
+    When an info dict is given, or the URL is in the metadata cache, yt-dlp goes
+    straight to format selection and download instead of extracting again.
+    With use_archive, anything already in the download archive is skipped and
+    listed in 'skipped' instead.
+    With turbo, HLS/DASH fragments are fetched in parallel at a concurrency
+    learned per host; progress dicts then carry fragment_seconds and
+    fragment_concurrency, and 'fragments' holds the timings.
+    With connections > 1, a format that is one plain HTTP file is fetched as
+    byte ranges over that many connections; 'segments' holds their throughput.
+    Transfer rates are held to the limits of governor (by default the
+    process-wide bandwidth governor, which is unlimited until configured).
+    With max_bytes, the best format under that size is picked from the info
+    (see format_ranking) and pinned; pass format='137+140' to pin one
+    chosen earlier. 'format' in the result is the pinned format string.
+    With a pipeline (postprocess_pool.PostprocessPipeline), merging and
+    audio extraction are queued there and the call returns once the
+    transfer is done; 'postprocess' is then a Future of the final path,
+    and 'path', 'bytes' stay empty: 'files' and the archive are updated
+    when it completes.
+    After use_extraction_service(), a URL that is not cached is extracted
+    in the service's worker processes first.
+    When the info is known and its predicted size (see disk_space) does not
+    fit in the free space of output_path, disk_space.InsufficientSpace is
+    raised before anything is written.
+    Every call writes its phases and outcome as telemetry records (see
+    telemetry.JobTelemetry); 'job' in the result is their job id.
+    Raises yt_dlp.utils.DownloadError (or whatever yt-dlp raises) on failure."""
+    trace = telemetry.JobTelemetry(url, platform=platform, quality=quality, turbo=turbo, connections=connections)
+    try:
+        result = _download(trace, url, output_path, quality, title, platform, filename, progress_hooks, info,
+                           use_cache, use_archive, turbo, connections, governor, pipeline, max_bytes, opts_kwargs)
+    except Exception as e:
+        trace.finish('failed', error=e)
+        raise
+    result['job'] = trace.id
+    if result['postprocess'] is not None:
+        def finished(future):
+            error = None if future.cancelled() else future.exception()
+            trace.finish('cancelled' if future.cancelled() else 'failed' if error else 'done', error=error,
+                         bytes=sum(os.path.getsize(path) for path in result['files'] if os.path.exists(path)))
+        result['postprocess'].add_done_callback(finished)
+    else:
+        trace.finish('skipped' if result['skipped'] and not result['files'] else 'done', bytes=result['bytes'])
+    return result
+
+
+def _note_extraction(trace, url, info):
+    extraction = _take_extraction(url)
+    if extraction is not None:
+        trace.note(strategy=extraction['strategy'], extractor=extraction['extractor'])
+        trace.record_phase('extract', extraction['seconds'])
+
+
+def _download(trace, url, output_path, quality, title, platform, filename, progress_hooks, info, use_cache,
+              use_archive, turbo, connections, governor, pipeline, max_bytes, opts_kwargs):
+    if info is not None:
+        # Extracted by the caller; _note_extraction() fills in how, if it went through extract_media()
+        trace.note(strategy='given', extractor=info.get('extractor'))
+    elif use_cache:
+        info = cached_info(url)
+        if info is not None:
+            trace.note(strategy='cache', extractor=info.get('extractor'))
+    if info is None and _extraction_service is not None:
+        # Extract in a worker process; this thread only has to transfer
+        info = extract_media(url, use_cache=use_cache)
+
+    if filename is None and title:
+        filename = f"{sanitize_title(title)}_%(id)s"
+
+    if max_bytes and 'format' not in opts_kwargs:
+        if not (info and info.get('formats')):
+            info = extract_media(url, use_cache=use_cache)
+        if info.get('_type', 'video') != 'video':
+            logging.warning(f"Size budget ignored for playlist {url}; budget single videos instead")
+        else:
+            option = format_ranking.select(info, quality, budget=max_bytes)
+            if option is None:
+                raise yt_dlp.utils.DownloadError(
+                    f"No format of {title or url} fits in {format_ranking.format_size(max_bytes)}")
+            logging.info(f"Picked format {option['format']} ({format_ranking.describe(option)}) for {title or url}")
+            opts_kwargs['format'] = option['format']
+    _note_extraction(trace, url, info)
+
+    files = []
+    skipped = download_archive.SkipSummary()
+    started = time.monotonic()
+
+    archive = download_archive.get_default_archive() if use_archive else None
+    if archive is not None:
+        # Single videos can often be recognised from the URL or cached info, with no request at all
+        key = download_archive.archive_key(info) if info else download_archive.url_key(url)
+        if key is not None and key in archive:
+            logging.info(f"Skipping {title or url}: already in the download archive")
+            skipped(key, title)
+            return {'url': url, 'title': title, 'path': None, 'files': [], 'bytes': 0,
+                    'duration': round(time.monotonic() - started, 3), 'skipped': skipped.items,
+                    'fragments': None, 'segments': None, 'postprocess': None, 'format': None}
+
+    if info is not None:
+        # Fail before the first byte rather than halfway, with large .part files left behind
+        disk_space.ensure_space(output_path or os.getcwd(),
+                                disk_space.required_bytes(info, quality, opts_kwargs.get('format'), max_bytes))
+
+    meter = None
+    if turbo:
+        tuner = fragment_tuner.get_default_tuner()
+        meter = tuner.meter_for(host_of(url))
+        progress_hooks = [meter.hook] + list(progress_hooks or [])
+        opts_kwargs.setdefault('concurrent_fragment_downloads', meter.concurrency)
+        opts_kwargs.setdefault('logger', meter)
+
+    if governor is None:
+        governor = bandwidth.get_default_governor()
+    # Each call is its own job for fair sharing, even when the same URL is downloaded twice
+    bandwidth_key = object()
+    progress_hooks = list(progress_hooks or []) + [governor.hook(bandwidth_key), trace.transfer_hook]
+
+    ydl_opts = download_opts(quality, output_path, filename, platform, progress_hooks, **opts_kwargs)
+    ydl_opts['post_hooks'] = [files.append]
+    ydl_opts['postprocessor_hooks'] = list(ydl_opts.get('postprocessor_hooks') or []) + [trace.postprocessor_hook]
+    # Post-processed downloads (audio extraction) go to the pipeline if there is one, else stay with yt-dlp
+    segmented = connections > 1 and not ydl_opts['postprocessors']
+    segmented_result = None
+    staged = None
+    transfer_error = None
+
+    try:
+        with cookie_store.open_ydl(ydl_opts) as ydl:
+            if archive is not None:
+                archive.attach(ydl, on_skip=skipped)
+            logging.info(f"Starting download for URL: {url} from {platform}")
+            reused = info is not None
+            if not reused:
+                # Extract here rather than inside ydl.download() so the phases can be told apart.
+                # process=False stops at the extractor's own result: playlist entries are still
+                # resolved one by one as they download, as ydl.download() would.
+                trace.note(strategy='download')
+                with trace.phase('extract'):
+                    info = ydl.extract_info(url, download=False, process=False)
+                trace.note(extractor=info.get('extractor'))
+                if info.get('_type', 'video') == 'video':
+                    cache_info(url, info)
+            trace.start_transfer()
+            if segmented:
+                try:
+                    segmented_result = _download_segmented(ydl, info, connections, ydl_opts['progress_hooks'],
+                                                           files, archive, skipped)
+                except segmented_download.NETWORK_ERRORS as e:
+                    logging.warning(f"Segmented download failed for {url}, using a single stream: {e}")
+                    files.clear()
+            if not segmented_result and pipeline is not None:
+                staged = _download_staged(ydl, info, pipeline, ydl_opts['postprocessors'], files, archive, skipped,
+                                          trace)
+            if segmented_result or staged:
+                pass
+            elif reused:
+                try:
+                    ydl.process_ie_result(info, download=True)
+                except yt_dlp.utils.DownloadError as e:
+                    # Usually signed format URLs that died early; extract again once
+                    logging.warning(f"Download from cached info failed for {url}, extracting again: {e}")
+                    metadata_cache.get_default_cache().invalidate(url)
+                    files.clear()
+                    ydl.download([url])
+            else:
+                ydl.process_ie_result(info, download=True)
+            logging.info(f"Download completed successfully: {title or url}")
+    except Exception as e:
+        transfer_error = e
+        raise
+    finally:
+        governor.release(bandwidth_key)
+        if meter is not None:
+            # Failures teach the tuner too: a throttled host should get fewer parallel fragments
+            tuner.record(host_of(url), meter)
+        trace.end_transfer(meter if meter is not None and meter.fragments else None, error=transfer_error)
+
+    return {
+        'url': url,
+        'title': title,
+        'path': files[0] if files else None,
+        'files': files,
+        'bytes': sum(os.path.getsize(path) for path in files if os.path.exists(path)),
+        'duration': round(time.monotonic() - started, 3),
+        'skipped': skipped.items,
+        'fragments': meter.stats() if meter is not None and meter.fragments else None,
+        'segments': segmented_result['segments'] if isinstance(segmented_result, dict) else None,
+        'postprocess': staged[1] if isinstance(staged, tuple) else None,
+        'format': ydl_opts.get('format'),
+    }
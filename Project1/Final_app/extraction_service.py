@@ -0,0 +1,342 @@
+# -*- coding: utf-8 -*-
+"""Info extraction in worker processes, so analysis uses every core.
+
+Extraction is mostly Python work (JSON/HTML parsing, signature solving,
+format sorting) and threads running it take turns on the GIL. Each worker
+here is a separate process that keeps its YoutubeDL instances warm between
+URLs (one per distinct option set), and sends back only what the app uses:
+the sanitized info dict, without captions, heatmaps and thumbnail lists,
+as zlib-compressed JSON.
+
+Every worker process has a dispatcher thread in this process that feeds it
+one URL at a time, so a hung extraction only blocks its own worker. When a
+URL takes longer than hang_timeout the process is killed and started
+again, and that URL fails with ExtractionTimeout. cancel() drops a queued
+URL, or stops a running one the same way, so attempts nobody waits for
+any more do not hold a worker. Workers are also replaced after max_tasks
+URLs to keep memory in check.
+
+Frozen (PyInstaller) builds must call multiprocessing.freeze_support() at
+the top of their __main__ block."""
+import concurrent.futures
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import zlib
+
+import yt_dlp
+
+import cookie_store
+
+DEFAULT_HANG_TIMEOUT = 120
+DEFAULT_MAX_TASKS = 500
+# YoutubeDL instances a worker keeps for different option sets
+MAX_WARM = 4
+# How often a dispatcher looks for a cancelled or hung task
+POLL_SECONDS = 0.25
+# Not used by the app, and often most of a YouTube info dict
+DROPPED_FIELDS = ('automatic_captions', 'subtitles', 'heatmap', 'requested_subtitles', 'comments')
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def compact(info):
+    """Drop the parts of an (already sanitized) info dict the app never reads, in place"""
+    for item in [info] + [entry for entry in info.get('entries') or [] if isinstance(entry, dict)]:
+        for field in DROPPED_FIELDS:
+            item.pop(field, None)
+        thumbnails = item.get('thumbnails')
+        if thumbnails:
+            # The last one is the largest; it is all the previews fall back to
+            item['thumbnails'] = thumbnails[-1:]
+    return info
+
+
+def _opts_key(opts):
+    return json.dumps(opts, sort_keys=True, default=str)
+
+
+def _worker_main(conn):
+    """Worker process: (task_id, url, opts) in, (task_id, ok, payload, cookie changes) out"""
+    # Only the parent writes cookies.txt; what sites set here goes back with each result
+    cookie_store.set_read_only()
+    warm = {}
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+        task_id, url, opts = task
+        try:
+            key = _opts_key(opts)
+            ydl = warm.pop(key, None)
+            if ydl is None:
+                while len(warm) >= MAX_WARM:
+                    warm.pop(next(iter(warm))).close()
+                # Warm instances share the worker's cookie jar, which reloads itself when cookies.txt changes
+                ydl = cookie_store.open_ydl(opts)
+            warm[key] = ydl  # most recently used last
+            info = compact(ydl.sanitize_info(ydl.extract_info(url, download=False)))
+            conn.send((task_id, True, zlib.compress(json.dumps(info).encode('utf-8'), 1),
+                       cookie_store.take_all_changes()))
+        except Exception as e:
+            conn.send((task_id, False, str(e), cookie_store.take_all_changes()))
+    for ydl in warm.values():
+        ydl.close()
+
+
+class _Worker:
+    def __init__(self, number):
+        self.number = number
+        self.process = None
+        self.conn = None
+        self.busy_since = None
+        self.url = None
+        self.future = None
+        self.cancel_requested = False
+        self.tasks = 0
+        self.tasks_since_start = 0
+        self.completed = 0
+        self.failed = 0
+        self.hangs = 0
+        self.cancelled = 0
+        self.restarts = 0
+        self.busy_seconds = 0.0
+        self.bytes_received = 0
+
+    def health(self, now):
+        return {
+            'worker': self.number,
+            'pid': self.process.pid if self.process else None,
+            'alive': bool(self.process and self.process.is_alive()),
+            'busy_seconds': round(now - self.busy_since, 1) if self.busy_since else None,
+            'url': self.url,
+            'completed': self.completed,
+            'failed': self.failed,
+            'hangs': self.hangs,
+            'cancelled': self.cancelled,
+            'restarts': self.restarts,
+            'avg_seconds': round(self.busy_seconds / self.tasks, 3) if self.tasks else None,
+            'avg_bytes': self.bytes_received // self.completed if self.completed else None,
+        }
+
+
+class ExtractionService:
+    """Pool of extraction processes; submit(url, opts) returns a Future of the info dict.
+
+    Failed extractions raise yt_dlp.utils.DownloadError from the Future, as
+    an in-process extract_info would."""
+
+    def __init__(self, workers=None, hang_timeout=DEFAULT_HANG_TIMEOUT, max_tasks=DEFAULT_MAX_TASKS):
+        self.workers = workers or os.cpu_count() or 2
+        self.hang_timeout = hang_timeout
+        self.max_tasks = max_tasks
+        # spawn everywhere: forking a process with running Tk and download threads is unsafe
+        self._context = multiprocessing.get_context('spawn')
+        self._tasks = queue.Queue()
+        self._lock = threading.Lock()
+        self._ids = iter(range(1, 1 << 62))
+        self._closed = False
+        self._cancel_on_start = set()
+        self._workers = [_Worker(n) for n in range(self.workers)]
+        self._threads = []
+        for worker in self._workers:
+            thread = threading.Thread(target=self._dispatch, args=(worker,), name=f"extract-{worker.number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, url, opts):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("extraction service is shut down")
+            task_id = next(self._ids)
+        future = concurrent.futures.Future()
+        self._tasks.put((task_id, url, opts, future))
+        return future
+
+    def extract(self, url, opts, timeout=None):
+        """Blocking extract_info(url, download=False) in a worker"""
+        return self.submit(url, opts).result(timeout)
+
+    def extract_many(self, urls, opts):
+        """Yield (url, info, error) in completion order; error is None on success"""
+        futures = {self.submit(url, opts): url for url in urls}
+        for future in concurrent.futures.as_completed(futures):
+            error = future.exception()
+            yield futures[future], (None if error else future.result()), error
+
+    def cancel(self, future):
+        """Stop a submitted extraction; returns False if it already finished.
+
+        A queued one is dropped. A running one cannot be interrupted inside
+        yt-dlp, so its worker process is killed and started again, and the
+        Future raises concurrent.futures.CancelledError."""
+        if future.cancel():
+            return True
+        with self._lock:
+            if future.done():
+                return False
+            worker = next((worker for worker in self._workers if worker.future is future), None)
+            if worker is None:
+                # Taken off the queue, but _run() has not picked it up yet
+                self._cancel_on_start.add(future)
+            else:
+                worker.cancel_requested = True
+        return True
+
+    def health(self):
+        """One dict per worker: pid, alive, busy_seconds and url of the current task, counters"""
+        now = time.monotonic()
+        with self._lock:
+            return [worker.health(now) for worker in self._workers]
+
+    def pending(self):
+        return self._tasks.qsize()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            self._closed = True
+        for _ in self._threads:
+            self._tasks.put(None)
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    # --- dispatcher side, one thread per worker process ---
+
+    def _start(self, worker):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,),
+                                        name=f"extract-worker-{worker.number}", daemon=True)
+        process.start()
+        child_conn.close()
+        worker.process, worker.conn = process, parent_conn
+        worker.tasks_since_start = 0
+
+    def _stop(self, worker, kill=False):
+        if worker.process is None:
+            return
+        if not kill:
+            try:
+                worker.conn.send(None)
+            except (OSError, ValueError):
+                pass
+            worker.process.join(5)
+        if worker.process.is_alive():
+            worker.process.terminate()
+            worker.process.join(2)
+            if worker.process.is_alive():
+                worker.process.kill()
+                worker.process.join()
+        worker.conn.close()
+        worker.process, worker.conn = None, None
+
+    def _dispatch(self, worker):
+        try:
+            while True:
+                task = self._tasks.get()
+                if task is None:
+                    break
+                task_id, url, opts, future = task
+                if not future.set_running_or_notify_cancel():
+                    continue
+                if worker.process is None or not worker.process.is_alive():
+                    if worker.process is not None:
+                        logging.warning(f"Extraction worker {worker.number} died, restarting it")
+                        self._stop(worker, kill=True)
+                        worker.restarts += 1
+                    self._start(worker)
+                self._run(worker, task_id, url, opts, future)
+                worker.tasks_since_start += 1
+                if worker.tasks_since_start >= self.max_tasks:
+                    self._stop(worker)
+        finally:
+            self._stop(worker)
+
+    def _merge_cookies(self, changes):
+        for path, (cookies, removed) in changes.items():
+            try:
+                cookie_store.get_store(path).merge(cookies, removed)
+            except Exception as e:
+                logging.error(f"Could not merge cookies from an extraction worker into {path}: {e}")
+
+    def _run(self, worker, task_id, url, opts, future):
+        started = time.monotonic()
+        with self._lock:
+            if future in self._cancel_on_start:
+                self._cancel_on_start.discard(future)
+                future.set_exception(concurrent.futures.CancelledError(f"Extraction of {url} cancelled"))
+                return
+            worker.busy_since, worker.url, worker.future = started, url, future
+            worker.cancel_requested = False
+        outcome = None
+        cancelled = False
+        try:
+            worker.conn.send((task_id, url, opts))
+            while outcome is None:
+                if worker.conn.poll(POLL_SECONDS):
+                    received_id, ok, payload, cookie_changes = worker.conn.recv()
+                    self._merge_cookies(cookie_changes)
+                    if received_id == task_id:
+                        outcome = (ok, payload)
+                elif worker.cancel_requested:
+                    cancelled = True
+                    break
+                elif not worker.process.is_alive():
+                    outcome = (False, f"extraction worker exited with code {worker.process.exitcode}")
+                elif time.monotonic() - started > self.hang_timeout:
+                    break
+        except (EOFError, OSError) as e:
+            outcome = (False, f"extraction worker failed: {e}")
+
+        with self._lock:
+            worker.busy_since, worker.url, worker.future = None, None, None
+            worker.tasks += 1
+            worker.busy_seconds += time.monotonic() - started
+            if cancelled:
+                worker.cancelled += 1
+                worker.restarts += 1
+            elif outcome is None:
+                worker.hangs += 1
+                worker.restarts += 1
+                worker.failed += 1
+            elif outcome[0]:
+                worker.completed += 1
+                worker.bytes_received += len(outcome[1])
+            else:
+                worker.failed += 1
+
+        if cancelled:
+            self._stop(worker, kill=True)
+            # Started again right away, so the next URL does not wait for the import of yt-dlp
+            self._start(worker)
+            future.set_exception(concurrent.futures.CancelledError(f"Extraction of {url} cancelled"))
+        elif outcome is None:
+            logging.error(f"Extraction of {url} hung for {self.hang_timeout}s, restarting worker {worker.number}")
+            self._stop(worker, kill=True)
+            future.set_exception(ExtractionTimeout(f"Extraction of {url} took longer than {self.hang_timeout}s"))
+        elif outcome[0]:
+            future.set_result(json.loads(zlib.decompress(outcome[1]).decode('utf-8')))
+        else:
+            future.set_exception(yt_dlp.utils.DownloadError(outcome[1]))
+
+
+_default_service = None
+_default_service_lock = threading.Lock()
+
+
+def get_default_service():
+    """Process-wide service with one worker per CPU; processes start on first use"""
+    global _default_service
+    with _default_service_lock:
+        if _default_service is None:
+            _default_service = ExtractionService()
+        return _default_service
@@ -3,15 +3,25 @@ import os
 import sys
 import threading
 import tkinter as tk
-from tkinter import ttk, filedialog
+from tkinter import ttk, filedialog, messagebox
 from PIL import Image, ImageTk
 from yt_dlp import YoutubeDL
-import queue
 import logging
+import time
+import bandwidth
+import download_archive
+import postprocess_planner
+import ydl_profiles
+from job_journal import JobJournal, QUEUED, DOWNLOADING, MERGED, DONE, FAILED
+from progress_reporter import ProgressReporter, describe
 
 # Initialize logging
 logging.basicConfig(filename="ferdous_downloader.log", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
+JOURNAL_FILE = "ferdous_downloader.journal"
+# Seconds between journal writes of the byte count while an entry downloads
+JOURNAL_PROGRESS_INTERVAL = 15
+
 def resource_path(relative_path):
     try:
         base_path = sys._MEIPASS  # PyInstaller
@@ -23,7 +33,7 @@ class VideoDownloaderApp:
     def __init__(self, root):
         self.root = root
         self.root.title("Ferdous Video Downloader")
-        self.root.geometry("700x400")
+        self.root.geometry("700x460")
         self.root.configure(bg="#2e2e2e")
 
         self.style = ttk.Style(self.root)
@@ -53,6 +63,15 @@ class VideoDownloaderApp:
         self.quality_combo.current(0)
         self.quality_combo.pack(pady=5)
 
+        self.limit_label = ttk.Label(root, text="Speed limit (e.g. 2M or 08:00-18:00=1M, empty = unlimited):")
+        self.limit_label.pack(pady=5)
+
+        self.limit_var = tk.StringVar()
+        self.limit_entry = ttk.Entry(root, textvariable=self.limit_var, width=30)
+        self.limit_entry.pack(pady=5)
+        self.limit_entry.bind("<Return>", self.apply_speed_limit)
+        self.limit_entry.bind("<FocusOut>", self.apply_speed_limit)
+
         self.download_button = ttk.Button(root, text="Download", style="Download.TButton", command=self.start_download_thread)
         self.download_button.pack(pady=10)
 
@@ -64,28 +83,85 @@ class VideoDownloaderApp:
 
         self.is_downloading = False
         self.active_button = None
-        self.progress_queue = queue.Queue()
-        self.check_progress_queue()
+        self.current_status = ""
+        self.progress_reporter = ProgressReporter(self.root, self.show_progress)
+        self.governor = bandwidth.get_default_governor()
+
+        # ffmpeg.exe is looked up where PyInstaller unpacks bundled files
+        self.profiles = ydl_profiles.ProfileRegistry(ffmpeg_dir=resource_path(''))
+        self.journal = JobJournal(JOURNAL_FILE)
+        self.archive = download_archive.get_default_archive()
+        self.journal.compact()
+        self.current_entry = None
+        self.current_path = None
+        self.last_journal_write = 0
+        self.root.after(500, self.offer_resume)
 
-    def check_progress_queue(self):
+    def offer_resume(self):
+        """Offer to finish entries an earlier run left queued or half-downloaded"""
+        entries = self.journal.unfinished()
+        if not entries or self.is_downloading:
+            return
+        if not messagebox.askyesno("Resume downloads",
+                                   f"{len(entries)} download(s) from a previous session did not finish.\nResume them now?"):
+            for entry in entries:
+                self.journal.record(entry['url'], FAILED, error="Not resumed")
+            return
+
+        self.download_button.configure(style="TButton")
+        self.is_downloading = True
+        self.active_button = self.download_button
+        self.status_label.config(text="Resuming previous downloads...", foreground="orange")
+        self.current_status = ""
+        threading.Thread(target=self.resume_downloads, args=(entries,), daemon=True).start()
+
+    def resume_downloads(self, entries):
+        # Entries from different batches may have different targets; keep their order within each
+        groups = {}
+        for entry in entries:
+            key = (entry.get('platform', 'youtube'), entry.get('save_path', os.path.abspath(".")), entry.get('quality', 'best'))
+            groups.setdefault(key, []).append(entry['url'])
         try:
-            while True:
-                msg_type, value, *extra = self.progress_queue.get_nowait()
-                if msg_type == 'progress':
-                    self.progress['value'] = value
-                elif msg_type == 'status':
-                    color = extra[0] if extra else 'lightblue'
-                    self.status_label.config(text=value, foreground=color)
-                    if 'finished' in value.lower() or 'success' in value.lower():
-                        self.progress['value'] = 0
-                        self.is_downloading = False
-                        if self.active_button:
-                            self.active_button.configure(style="Download.TButton")
-                            self.active_button = None
-                        self.url_entry.delete(0, tk.END)
-        except queue.Empty:
-            pass
-        self.root.after(100, self.check_progress_queue)
+            skipped = 0
+            for (platform, save_path, quality), urls in groups.items():
+                skipped += self.download_entries(urls, save_path, quality)
+            self.finish_status("Resumed downloads", skipped)
+        except Exception as e:
+            logging.error(f"Resume failed: {str(e)}")
+            self.progress_reporter.post(self.set_status, f"Error: {str(e)}", 'red')
+            self.progress_reporter.post(self.set_progress, 0)
+        finally:
+            self.governor.release('download')
+            self.is_downloading = False
+            self.active_button = None
+
+    def apply_speed_limit(self, event=None):
+        # Takes effect immediately, also for a download that is already running
+        try:
+            self.governor.configure_from_text(self.limit_var.get())
+        except ValueError as e:
+            self.status_label.config(text=str(e), foreground="red")
+
+    def set_progress(self, value):
+        self.progress['value'] = value
+
+    def set_status(self, value, color='lightblue'):
+        self.current_status = value
+        self.status_label.config(text=value, foreground=color)
+        if 'finished' in value.lower() or 'success' in value.lower():
+            self.progress_reporter.discard('download')
+            self.progress['value'] = 0
+            self.is_downloading = False
+            if self.active_button:
+                self.active_button.configure(style="Download.TButton")
+                self.active_button = None
+            self.url_entry.delete(0, tk.END)
+
+    def show_progress(self, key, snapshot):
+        if snapshot['percent'] is not None:
+            self.progress['value'] = snapshot['percent']
+        if snapshot['status'] == 'downloading':
+            self.status_label.config(text=f"{self.current_status} {describe(snapshot)}".strip())
 
     def start_download_thread(self):
         if self.is_downloading:
@@ -108,64 +184,118 @@ class VideoDownloaderApp:
         self.is_downloading = True
         self.active_button = self.download_button
         self.status_label.config(text="Starting download...", foreground="orange")
+        self.current_status = ""
 
         threading.Thread(target=self.download_video, args=(url, platform, save_path), daemon=True).start()
 
     def update_progress(self, d):
+        self.progress_reporter.report('download', d)
         if d['status'] == 'downloading':
-            total_bytes = d.get('total_bytes') or d.get('total_bytes_estimate')
             downloaded_bytes = d.get('downloaded_bytes', 0)
-            if total_bytes:
-                progress = int(downloaded_bytes / total_bytes * 100)
-                self.progress_queue.put(('progress', progress))
+            now = time.time()
+            if self.current_entry and now - self.last_journal_write >= JOURNAL_PROGRESS_INTERVAL:
+                self.last_journal_write = now
+                self.journal.record(self.current_entry, DOWNLOADING, bytes=downloaded_bytes,
+                                    part_file=d.get('tmpfilename'))
+        elif d['status'] == 'finished' and self.current_entry:
+            self.journal.record(self.current_entry, DOWNLOADING, bytes=d.get('total_bytes') or d.get('downloaded_bytes', 0),
+                                part_file=None)
+
+    def update_postprocess(self, d):
+        if d['status'] == 'finished' and self.current_entry and d.get('postprocessor') in ('Merger', 'ContainerPolicy'):
+            self.journal.record(self.current_entry, MERGED)
+
+    def record_output_path(self, filepath):
+        self.current_path = filepath
+
+    def build_ydl_opts(self, save_path, quality):
+        return self.profiles.build(
+            'best-1080',
+            outtmpl=os.path.join(save_path, '%(title).100s_%(id)s.%(ext)s'),
+            progress_hooks=[self.update_progress, self.governor.hook('download')],
+            postprocessor_hooks=[self.update_postprocess],
+            post_hooks=[self.record_output_path],
+            format=quality,
+            # Pick up .part files left by an interrupted run instead of starting over
+            continuedl=True,
+            nopart=False,
+        )
+
+    def report_postprocess(self, report):
+        labels = {postprocess_planner.NOOP: "Already MP4, nothing to convert",
+                  postprocess_planner.REMUX: "Remuxed to MP4",
+                  postprocess_planner.TRANSCODE: "Converted to MP4"}
+        self.progress_reporter.post(self.set_status, f"{labels[report['action']]} ({report['seconds']:.1f}s)", 'lightblue')
+
+    def download_entries(self, urls, save_path, quality):
+        """Download entry URLs in order, journaling each one. Returns how many were already done."""
+        total = len(urls)
+        skipped = 0
+        archive_skips = download_archive.SkipSummary()
+        with YoutubeDL(self.build_ydl_opts(save_path, quality)) as ydl:
+            self.archive.attach(ydl, on_skip=archive_skips)
+            # Replaces FFmpegVideoConvertor: only files whose codecs MP4 cannot hold get re-encoded
+            ydl.add_post_processor(postprocess_planner.ContainerPolicyPP(
+                ydl, ffmpeg_location=self.profiles.ffmpeg_location(), on_report=self.report_postprocess),
+                when='post_process')
+            for idx, entry_url in enumerate(urls, 1):
+                if self.journal.is_done(entry_url):
+                    skipped += 1
+                    continue
+                if total > 1:
+                    self.progress_reporter.post(self.set_status, f"Downloading video {idx}/{total}...", 'lightblue')
+                self.current_entry = entry_url
+                self.current_path = None
+                self.last_journal_write = 0
+                self.journal.record(entry_url, DOWNLOADING)
+                try:
+                    ydl.download([entry_url])
+                except Exception as e:
+                    self.journal.record(entry_url, FAILED, error=str(e))
+                    raise
+                finally:
+                    self.current_entry = None
+                self.journal.record(entry_url, DONE, path=self.current_path)
+        return skipped + len(archive_skips)
+
+    def finish_status(self, text, skipped):
+        if skipped:
+            text += f" ({skipped} already downloaded, skipped)"
+        self.progress_reporter.post(self.set_status, f"{text} finished!", 'green')
+        self.progress_reporter.post(self.set_progress, 100)
 
     def download_video(self, url, platform, save_path):
+        quality = self.quality_var.get()
         try:
-            ffmpeg_path = resource_path('ffmpeg.exe')
-            if not os.path.isfile(ffmpeg_path):
-                ffmpeg_path = 'ffmpeg'
-
-            ydl_opts = {
-                'outtmpl': os.path.join(save_path, '%(title).100s_%(id)s.%(ext)s'),
-                'progress_hooks': [self.update_progress],
-                'format': self.quality_var.get(),
-                'quiet': True,
-                'no_warnings': True,
-                'restrictfilenames': True,
-                'noplaylist': False,
-                'postprocessors': [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }],
-                'ffmpeg_location': ffmpeg_path,
-                'http_headers': {
-                    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64)...',
-                    'Accept-Language': 'en-US,en;q=0.9',
-                },
-            }
-
-            with YoutubeDL(ydl_opts) as ydl:
+            # List playlists flat: archived entries are then skipped without being extracted
+            with YoutubeDL(dict(self.build_ydl_opts(save_path, quality), extract_flat='in_playlist')) as ydl:
                 logging.info(f"Starting download for URL: {url}")
                 info_dict = ydl.extract_info(url, download=False)
-                is_playlist = 'entries' in info_dict
 
-                if is_playlist:
-                    videos = info_dict['entries']
-                    total = len(videos)
-                    for idx, video in enumerate(videos, 1):
-                        self.progress_queue.put(('status', f"Downloading video {idx}/{total}...", 'lightblue'))
-                        ydl.download([video['webpage_url']])
-                else:
-                    ydl.download([url])
+            if 'entries' in info_dict:
+                videos = [video for video in info_dict['entries'] if video]
+                skipped_before = sum(1 for video in videos if self.archive.contains_info(video))
+                urls = [video.get('webpage_url') or video['url'] for video in videos
+                        if not self.archive.contains_info(video)]
+            else:
+                skipped_before = 0
+                urls = [url]
+
+            # Journal the whole batch up front so a crash part-way through can be resumed
+            for entry_url in urls:
+                if not self.journal.is_done(entry_url):
+                    self.journal.record(entry_url, QUEUED, batch=url, platform=platform,
+                                        save_path=save_path, quality=quality)
 
-            self.progress_queue.put(('status', f"{platform.capitalize()} download finished!", 'green'))
-            self.progress_queue.put(('progress', 100))
+            skipped = skipped_before + self.download_entries(urls, save_path, quality)
+            self.finish_status(f"{platform.capitalize()} download", skipped)
 
         except Exception as e:
             logging.error(f"Download failed: {str(e)}")
-            self.progress_queue.put(('status', f"Error: {str(e)}", 'red'))
-            self.progress_queue.put(('progress', 0))
+            self.progress_reporter.post(self.set_status, f"Error: {str(e)}", 'red')
+            self.progress_reporter.post(self.set_progress, 0)
         finally:
+            self.governor.release('download')
             self.is_downloading = False
             self.active_button = None
 
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Rank the formats of an extracted info dict and pick one under a byte budget.
+
+A profile's format string (best[height<=1080]/bestvideo+bestaudio/best) is
+resolved by yt-dlp again at download time and says nothing about size.
+Here the 'formats' already in the info are turned into downloadable
+options (muxed formats, and video-only formats paired with the best audio),
+ranked by resolution, then bitrate weighted by codec efficiency. The
+chosen option's format string ('137+140' or '18') is then pinned for the
+download.
+
+Sizes come from filesize, filesize_approx, or bitrate times duration.
+Options with no size at all never count as fitting a budget."""
+import re
+
+# How much picture a codec gets out of each bit, relative to H.264
+VIDEO_EFFICIENCY = {'av01': 1.5, 'av1': 1.5, 'vp9': 1.3, 'vp09': 1.3, 'hevc': 1.3, 'hvc1': 1.3, 'hev1': 1.3,
+                    'avc1': 1.0, 'h264': 1.0, 'vp8': 0.8, 'mp4v': 0.7}
+AUDIO_EFFICIENCY = {'opus': 1.4, 'mp4a': 1.0, 'aac': 1.0, 'vorbis': 1.1, 'mp3': 0.9}
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([KMG]?)(?:i?B)?\s*$', re.IGNORECASE)
+
+
+def parse_size(text):
+    """'500M' -> 524288000; '' or '0' -> None (no budget)"""
+    text = (text or '').strip()
+    if not text or text == '0':
+        return None
+    match = SIZE_PATTERN.match(text)
+    if not match:
+        raise ValueError(f"Invalid size: {text!r} (expected e.g. 700M or 2G)")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()]) or None
+
+
+def format_size(value):
+    if value is None:
+        return "size unknown"
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024 or unit == 'GiB':
+            return f"{value:.0f}{unit}" if unit == 'B' else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+def _efficiency(codec, table):
+    codec = (codec or '').lower()
+    for prefix, factor in table.items():
+        if codec.startswith(prefix):
+            return factor
+    return 1.0
+
+
+def _size(fmt, duration):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    bitrate = fmt.get('tbr') or (fmt.get('vbr') or 0) + (fmt.get('abr') or 0)
+    if not size and bitrate and duration:
+        size = bitrate * 1000 / 8 * duration
+    return int(size) if size else None
+
+
+def _has_video(fmt):
+    return fmt.get('vcodec') not in (None, 'none') or (fmt.get('height') and fmt.get('vcodec') is None)
+
+
+def _has_audio(fmt):
+    return fmt.get('acodec') not in (None, 'none')
+
+
+def _downloadable(fmt):
+    # Storyboards and manifests-only entries carry no media yt-dlp can fetch directly
+    return fmt.get('format_id') and fmt.get('ext') != 'mhtml' and not (fmt.get('format_note') or '').startswith('storyboard')
+
+
+def audio_options(info):
+    """Pure audio formats as options, best first"""
+    duration = info.get('duration')
+    options = []
+    for fmt in info.get('formats') or []:
+        if not _downloadable(fmt) or _has_video(fmt) or not _has_audio(fmt):
+            continue
+        bitrate = fmt.get('abr') or fmt.get('tbr') or 0
+        options.append({
+            'format': fmt['format_id'],
+            'height': None,
+            'bytes': _size(fmt, duration),
+            'score': (0, bitrate * _efficiency(fmt.get('acodec'), AUDIO_EFFICIENCY)),
+            'label': f"{fmt.get('ext', '?')} {bitrate:.0f}k",
+        })
+    return _ranked(options)
+
+
+def video_options(info, max_height=None):
+    """Muxed formats and video-only + best audio pairs up to max_height, best first"""
+    duration = info.get('duration')
+    audio = audio_options(info)
+    best_audio = audio[0] if audio else None
+    options = []
+    for fmt in info.get('formats') or []:
+        if not _downloadable(fmt) or not _has_video(fmt):
+            continue
+        height = fmt.get('height') or 0
+        if max_height and height > max_height:
+            continue
+        size = _size(fmt, duration)
+        weighted = (fmt.get('vbr') or fmt.get('tbr') or 0) * _efficiency(fmt.get('vcodec'), VIDEO_EFFICIENCY)
+        label = f"{height}p" if height else fmt.get('format_note') or fmt['format_id']
+        if _has_audio(fmt):
+            options.append({'format': fmt['format_id'], 'height': height, 'bytes': size,
+                            'score': (height, weighted), 'label': label})
+        elif best_audio:
+            total = size + best_audio['bytes'] if size and best_audio['bytes'] else None
+            options.append({'format': f"{fmt['format_id']}+{best_audio['format']}", 'height': height, 'bytes': total,
+                            'score': (height, weighted + best_audio['score'][1]), 'label': label})
+    return _ranked(options)
+
+
+def _ranked(options):
+    # Higher score first; between equal scores the smaller file
+    return sorted(options, key=lambda option: (option['score'], -(option['bytes'] or 0)), reverse=True)
+
+
+def options_for(info, quality='best', max_height=1080):
+    if (quality or '').startswith('audio'):
+        return audio_options(info)
+    if quality == 'worst':
+        return list(reversed(video_options(info)))
+    return video_options(info, max_height)
+
+
+def select(info, quality='best', budget=None, max_height=1080):
+    """The best option for quality that fits budget bytes (any size when budget is None), or None"""
+    for option in options_for(info, quality, max_height):
+        if budget is None or (option['bytes'] is not None and option['bytes'] <= budget):
+            return option
+    return None
+
+
+def select_batch(infos, quality='best', budget=None, max_height=1080):
+    """One option (or None) per info, keeping the total under budget.
+
+    Every item starts at its best option; while the batch is over budget,
+    the item with the largest predicted size steps down to its next smaller
+    option.
+    Items without any sized option are left to yt-dlp and not counted."""
+    ranked = [[option for option in options_for(info, quality, max_height) if budget is None or option['bytes']]
+              for info in infos]
+    position = [0] * len(ranked)
+
+    def current(n):
+        return ranked[n][position[n]] if position[n] < len(ranked[n]) else None
+
+    if budget is not None:
+        while True:
+            chosen = [current(n) for n in range(len(ranked))]
+            total = sum(option['bytes'] for option in chosen if option)
+            if total <= budget:
+                break
+            lowerable = [n for n in range(len(ranked)) if chosen[n] and
+                         any(option['bytes'] < chosen[n]['bytes'] for option in ranked[n][position[n] + 1:])]
+            if not lowerable:
+                break  # over budget even at the lowest quality; the caller can compare the total
+            largest = max(lowerable, key=lambda n: chosen[n]['bytes'])
+            # Next lower-ranked option that actually saves bytes
+            position[largest] += 1
+            while ranked[largest][position[largest]]['bytes'] >= chosen[largest]['bytes']:
+                position[largest] += 1
+    return [current(n) for n in range(len(ranked))]
+
+
+def describe(option):
+    """'1080p ~240.3MiB' for preview rows"""
+    if option is None:
+        return ""
+    size = f"~{format_size(option['bytes'])}" if option['bytes'] else format_size(None)
+    return f"{option['label']} {size}"
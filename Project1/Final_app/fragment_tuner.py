@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""Adaptive fragment concurrency for HLS/DASH downloads ("turbo mode").
+
+Long HLS recordings are latency-bound: each fragment is a small request, so
+fetching several in parallel helps far more than bandwidth would suggest.
+yt-dlp fixes concurrent_fragment_downloads for the whole download, so the
+tuner adapts between downloads, per host: one more parallel fragment while
+that keeps raising throughput, half as many when the host starts throttling
+(HTTP 429 or fragment retries). A 403 is counted apart: it means an
+expired fragment URL or a failed login, which fewer connections do not
+fix. FragmentMeter measures each download from its progress hooks and
+yt-dlp's log messages."""
+import logging
+import threading
+import time
+
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 16
+START_CONCURRENCY = 4
+# Downloads with fewer fragments than this say nothing useful about the host
+MIN_FRAGMENTS = 10
+# Back off when more than this share of fragments needed a retry
+THROTTLE_ERROR_RATE = 0.05
+# Only keep adding parallel fragments while each step gains at least 10%
+GAIN_THRESHOLD = 1.1
+# Smoothing of the time between finished fragments
+INTERVAL_SMOOTHING = 0.2
+
+THROTTLE_MARKERS = ('HTTP Error 429', 'Too Many Requests')
+FORBIDDEN_MARKER = 'HTTP Error 403'
+
+
+class FragmentMeter:
+    """Fragment timings for one download.
+
+    Use hook() as the first progress hook and pass the meter as yt-dlp's
+    'logger' so fragment retries are counted; it passes yt-dlp's warnings
+    and errors on to the log, so they still reach download_log.txt.
+    hook() also adds fragment_seconds and fragment_concurrency to the
+    progress dict, so later hooks can show them."""
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+        self.started = time.monotonic()
+        self.fragments = 0
+        self.fragment_count = None
+        self.downloaded = 0
+        self.errors = 0
+        self.forbidden = 0
+        self.throttled = False
+        self._last_index = None
+        self._last_time = None
+        self._interval = None
+
+    def hook(self, d):
+        index = d.get('fragment_index')
+        if d['status'] != 'downloading' or index is None:
+            return
+        now = time.monotonic()
+        self.fragment_count = d.get('fragment_count') or self.fragment_count
+        self.downloaded = d.get('downloaded_bytes') or self.downloaded
+        if self._last_index is not None and index > self._last_index:
+            interval = (now - self._last_time) / (index - self._last_index)
+            if self._interval is None:
+                self._interval = interval
+            else:
+                self._interval += INTERVAL_SMOOTHING * (interval - self._interval)
+        if self._last_index is None or index > self._last_index:
+            self._last_index, self._last_time = index, now
+            self.fragments = index
+        d['fragment_seconds'] = self.seconds_per_fragment
+        d['fragment_concurrency'] = self.concurrency
+
+    @property
+    def seconds_per_fragment(self):
+        """Average time one fragment takes; fragments finish concurrency times as often"""
+        return self._interval * self.concurrency if self._interval is not None else None
+
+    @property
+    def throughput(self):
+        elapsed = time.monotonic() - self.started
+        return self.downloaded / elapsed if elapsed > 0 else 0
+
+    @property
+    def error_rate(self):
+        return self.errors / max(self.fragments, 1)
+
+    def stats(self):
+        return {
+            'fragments': self.fragments,
+            'concurrency': self.concurrency,
+            'seconds_per_fragment': self.seconds_per_fragment,
+            'throughput': self.throughput,
+            'errors': self.errors,
+            'forbidden': self.forbidden,
+            'throttled': self.throttled,
+        }
+
+    # yt-dlp logger interface
+
+    def _inspect(self, msg):
+        if FORBIDDEN_MARKER in msg:
+            # Not the host slowing us down; kept out of the retry rate the tuner backs off on
+            self.forbidden += 1
+            return
+        if 'Retrying fragment' in msg or 'fragment' in msg and 'retry' in msg.lower():
+            self.errors += 1
+        if any(marker in msg for marker in THROTTLE_MARKERS):
+            self.throttled = True
+
+    def debug(self, msg):
+        self._inspect(msg)
+
+    def info(self, msg):
+        self._inspect(msg)
+
+    def warning(self, msg):
+        self._inspect(msg)
+        logging.warning(f"yt-dlp: {msg}")
+
+    def error(self, msg):
+        self._inspect(msg)
+        logging.error(f"yt-dlp: {msg}")
+
+
+class FragmentTuner:
+    """Per-host fragment concurrency, adjusted after every fragmented download (AIMD)"""
+
+    def __init__(self, start=START_CONCURRENCY, maximum=MAX_CONCURRENCY):
+        self.start = start
+        self.maximum = maximum
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = {'concurrency': self.start, 'throughput': {}}
+        return state
+
+    def concurrency_for(self, host):
+        with self._lock:
+            return self._state(host)['concurrency']
+
+    def meter_for(self, host):
+        return FragmentMeter(self.concurrency_for(host))
+
+    def record(self, host, meter):
+        """Learn from a finished (or failed) download; returns the new concurrency for host"""
+        with self._lock:
+            state = self._state(host)
+            level = meter.concurrency
+            if meter.throttled or (meter.fragments >= MIN_FRAGMENTS and meter.error_rate > THROTTLE_ERROR_RATE):
+                new = max(MIN_CONCURRENCY, level // 2)
+                reason = "throttled" if meter.throttled else f"{meter.error_rate:.0%} fragment retries"
+            elif meter.fragments < MIN_FRAGMENTS:
+                return state['concurrency']
+            else:
+                throughput = state['throughput']
+                previous = throughput.get(level)
+                throughput[level] = meter.throughput if previous is None else (previous + meter.throughput) / 2
+                lower = throughput.get(level - 1)
+                if lower is None or throughput[level] >= lower * GAIN_THRESHOLD:
+                    new = min(self.maximum, level + 1)
+                else:
+                    new = level
+                reason = f"{throughput[level] / 1024:.0f} KiB/s at {level} parallel"
+            if new != state['concurrency']:
+                logging.info(f"Fragment concurrency for {host}: {state['concurrency']} -> {new} ({reason})")
+            state['concurrency'] = new
+            return new
+
+
+_default_tuner = None
+_default_tuner_lock = threading.Lock()
+
+
+def get_default_tuner():
+    global _default_tuner
+    with _default_tuner_lock:
+        if _default_tuner is None:
+            _default_tuner = FragmentTuner()
+        return _default_tuner
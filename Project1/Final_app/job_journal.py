@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""Append-only, crash-safe journal of download entries.
+
+Every state change is one JSON line that is flushed and fsync'd before
+record() returns. Replaying the file gives the last known state of each
+entry, so an interrupted batch can be rebuilt on the next start and the
+entries that already finished are skipped."""
+import json
+import logging
+import os
+import threading
+import time
+
+QUEUED = "queued"
+DOWNLOADING = "downloading"
+MERGED = "merged"
+DONE = "done"
+FAILED = "failed"
+
+# States an interrupted run leaves behind; these are offered for resuming
+UNFINISHED_STATES = (QUEUED, DOWNLOADING, MERGED)
+
+
+class JobJournal:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries = self._replay()
+        self._drop_torn_tail()
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def _replay(self):
+        """Latest state per entry URL, in the order entries were first seen"""
+        entries = {}
+        if not os.path.exists(self.path):
+            return entries
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves a torn last line; _drop_torn_tail() removes it
+                    logging.warning(f"Skipping unreadable journal line {line_no} in {self.path}")
+                    continue
+                if not isinstance(record, dict) or 'url' not in record:
+                    logging.warning(f"Skipping journal line {line_no} without an entry URL in {self.path}")
+                    continue
+                entries.setdefault(record['url'], {}).update(record)
+        return entries
+
+    def _drop_torn_tail(self):
+        """End the file with a newline, so the next record starts on a line of its own"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            size = f.seek(0, os.SEEK_END)
+            if not size:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            # Find the end of the last complete line
+            end = size
+            while end > 0:
+                start = max(end - 4096, 0)
+                f.seek(start)
+                newline = f.read(end - start).rfind(b"\n")
+                if newline != -1:
+                    end = start + newline + 1
+                    break
+                end = start
+            f.seek(end)
+            try:
+                # Complete record, only the newline is missing: it was replayed, so keep it
+                json.loads(f.read(size - end).decode('utf-8'))
+                f.seek(size)
+                f.write(b"\n")
+            except ValueError:
+                logging.warning(f"Dropping {size - end} bytes of a torn last line in {self.path}")
+                f.truncate(end)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def record(self, url, state, **fields):
+        """Append a state change for an entry and make it durable"""
+        with self._lock:
+            entry = self._entries.setdefault(url, {'url': url})
+            change = dict(fields, url=url, state=state, ts=time.time())
+            entry.update(change)
+            self._file.write(json.dumps(change, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            return dict(entry) if entry else None
+
+    def is_done(self, url):
+        """True if the entry finished and its output file is still on disk"""
+        entry = self.get(url)
+        if not entry or entry['state'] != DONE:
+            return False
+        return not entry.get('path') or os.path.exists(entry['path'])
+
+    def unfinished(self):
+        """Entries that were queued or in flight when the last run stopped"""
+        with self._lock:
+            return [dict(entry) for entry in self._entries.values() if entry['state'] in UNFINISHED_STATES]
+
+    def compact(self):
+        """Rewrite the journal with one line per entry; atomic via a temp file"""
+        with self._lock:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for entry in self._entries.values():
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
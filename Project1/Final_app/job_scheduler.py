@@ -0,0 +1,282 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+import logging
+import threading
+from urllib.parse import urlparse
+
+QUEUED = "queued"
+RUNNING = "running"
+PAUSED = "paused"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINAL_STATES = (DONE, FAILED, CANCELLED)
+
+# How often jobs held back by the admission check are looked at again
+ADMISSION_RECHECK_SECONDS = 5
+
+_job_ids = itertools.count(1)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker thread once the job has been cancelled"""
+
+
+def host_of(url):
+    """Return the host part of a URL, used for the per-host limit"""
+    try:
+        host = urlparse(url).hostname or ""
+    except ValueError:
+        host = ""
+    if host.startswith("www.") or host.startswith("m."):
+        host = host.split(".", 1)[1]
+    return host
+
+
+class DownloadJob:
+    def __init__(self, url, title="", platform="Unknown", priority=0, data=None):
+        self.id = next(_job_ids)
+        self.url = url
+        self.title = title or url
+        self.platform = platform
+        self.priority = priority
+        self.host = host_of(url)
+        self.data = data or {}
+        self.state = QUEUED
+        self.status_text = "Queued"
+        self.error = None
+        self.result = None
+        self._running = threading.Event()
+        self._running.set()
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def checkpoint(self):
+        """Block while the job is paused and raise JobCancelled once it is cancelled.
+
+        Runners call this from their worker thread (e.g. from a yt-dlp progress hook)."""
+        while not self._running.wait(0.25):
+            if self._cancelled.is_set():
+                break
+        if self._cancelled.is_set():
+            raise JobCancelled(f"Job {self.id} cancelled")
+
+    def __repr__(self):
+        return f"<DownloadJob {self.id} {self.state} {self.url}>"
+
+
+class JobScheduler:
+    """Bounded pool of download workers with a global and a per-host concurrency limit.
+
+    runner(job) is called on a worker thread and its return value stored in job.result.
+    on_update(job) is called (from any thread) whenever a job changes state.
+    admission, if given, has admit(job) -> None or the reason the job has to
+    wait, and release(job) once it has finished (see disk_space.DiskAdmission).
+    Held jobs stay queued with the reason as status_text; jobs behind them
+    may still start."""
+
+    def __init__(self, runner, max_workers=4, per_host_limit=2, ordering="fifo", on_update=None, admission=None):
+        if ordering not in ("fifo", "priority"):
+            raise ValueError(f"Unknown ordering: {ordering}")
+        self.runner = runner
+        self.max_workers = max(1, int(max_workers))
+        self.per_host_limit = max(1, int(per_host_limit)) if per_host_limit else None
+        self.ordering = ordering
+        self.on_update = on_update
+        self.admission = admission
+
+        self._lock = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._jobs = {}
+        self._running = {}
+        self._host_counts = {}
+        self._closed = False
+        self._recheck = None
+
+    # --- public API ---
+
+    def submit(self, job):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Scheduler has been shut down")
+            self._jobs[job.id] = job
+            heapq.heappush(self._queue, (self._sort_key(job), job))
+            self._dispatch()
+        self._notify(job)
+        return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def jobs(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def pause(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job or job.state in FINAL_STATES:
+            return False
+        with self._lock:
+            job._running.clear()
+            job.state = PAUSED
+            job.status_text = "Paused"
+        self._notify(job)
+        return True
+
+    def resume(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job or job.state != PAUSED:
+            return False
+        with self._lock:
+            job._running.set()
+            job.state = RUNNING if job.id in self._running else QUEUED
+            job.status_text = "Resumed" if job.state == RUNNING else "Queued"
+            self._dispatch()
+        self._notify(job)
+        return True
+
+    def cancel(self, job_id):
+        job = self._jobs.get(job_id)
+        if not job or job.state in FINAL_STATES:
+            return False
+        with self._lock:
+            job._cancelled.set()
+            job._running.set()
+            if job.id not in self._running:
+                # Still waiting in the queue; it is dropped lazily by _dispatch
+                job.state = CANCELLED
+                job.status_text = "Cancelled"
+                self._lock.notify_all()
+        self._notify(job)
+        return True
+
+    def set_max_workers(self, max_workers):
+        with self._lock:
+            self.max_workers = max(1, int(max_workers))
+            self._dispatch()
+
+    def set_per_host_limit(self, per_host_limit):
+        with self._lock:
+            self.per_host_limit = max(1, int(per_host_limit)) if per_host_limit else None
+            self._dispatch()
+
+    def active_count(self):
+        with self._lock:
+            return len(self._running)
+
+    def pending_count(self):
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.state in (QUEUED, PAUSED) and job.id not in self._running)
+
+    def wait(self, timeout=None):
+        """Block until every submitted job has reached a final state"""
+        with self._lock:
+            return self._lock.wait_for(
+                lambda: all(job.state in FINAL_STATES for job in self._jobs.values()), timeout)
+
+    def shutdown(self, cancel_pending=True):
+        with self._lock:
+            self._closed = True
+            pending = [job for job in self._jobs.values() if job.state not in FINAL_STATES]
+        if cancel_pending:
+            for job in pending:
+                self.cancel(job.id)
+
+    # --- internals ---
+
+    def _sort_key(self, job):
+        if self.ordering == "priority":
+            return (-job.priority, next(self._seq))
+        return (next(self._seq),)
+
+    def _host_available(self, job):
+        if not self.per_host_limit:
+            return True
+        return self._host_counts.get(job.host, 0) < self.per_host_limit
+
+    def _dispatch(self):
+        """Start as many queued jobs as the limits allow. Caller holds the lock."""
+        skipped = []
+        held = False
+        while self._queue and len(self._running) < self.max_workers:
+            key, job = heapq.heappop(self._queue)
+            if job.state == CANCELLED:
+                continue
+            if job.state == PAUSED or not self._host_available(job):
+                skipped.append((key, job))
+                continue
+            reason = self.admission.admit(job) if self.admission is not None else None
+            if reason:
+                skipped.append((key, job))
+                held = True
+                if job.status_text != reason:
+                    job.status_text = reason
+                    # on_update callbacks only hand the job to the UI thread, so this is safe under the lock
+                    self._notify(job)
+                continue
+            self._start(job)
+        for item in skipped:
+            heapq.heappush(self._queue, item)
+        if held and self._recheck is None and not self._closed:
+            # Space can also be freed outside the app; look again after a while
+            self._recheck = threading.Timer(ADMISSION_RECHECK_SECONDS, self._recheck_held)
+            self._recheck.daemon = True
+            self._recheck.start()
+
+    def _recheck_held(self):
+        with self._lock:
+            self._recheck = None
+            if not self._closed:
+                self._dispatch()
+
+    def _start(self, job):
+        job.state = RUNNING
+        job.status_text = "Starting..."
+        self._running[job.id] = job
+        self._host_counts[job.host] = self._host_counts.get(job.host, 0) + 1
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+
+    def _run(self, job):
+        self._notify(job)
+        try:
+            job.checkpoint()
+            job.result = self.runner(job)
+            job.state = DONE
+            job.status_text = "Done"
+        except JobCancelled:
+            job.state = CANCELLED
+            job.status_text = "Cancelled"
+        except Exception as e:
+            if job.cancelled:
+                job.state = CANCELLED
+                job.status_text = "Cancelled"
+            else:
+                job.state = FAILED
+                job.error = e
+                job.status_text = f"Failed: {e}"
+                logging.error(f"Job {job.id} failed for {job.url}: {e}")
+        finally:
+            if self.admission is not None:
+                self.admission.release(job)
+            with self._lock:
+                self._running.pop(job.id, None)
+                self._host_counts[job.host] -= 1
+                if not self._host_counts[job.host]:
+                    del self._host_counts[job.host]
+                if not self._closed:
+                    self._dispatch()
+                self._lock.notify_all()
+            self._notify(job)
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                logging.error(f"Job update callback failed: {e}")
@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""Success rates, phase latencies and error signatures from the download logs.
+
+Reads download_log.txt of both apps (and telemetry.jsonl, see telemetry.py),
+including rotated copies next to them (download_log.txt.1, .2.gz, ...) and
+gzip/bz2 files, one line at a time. Parsed lines are collected into
+pandas chunks of --chunk-rows rows, folded into running totals and dropped,
+so a log of any size is read in bounded memory: latencies go into fixed
+log-spaced NumPy histograms (percentiles are accurate to about 3%) and
+only the most frequent error signatures are kept.
+
+Text logs do not say which download a line belongs to: a completion is
+put down to the site of the last "Starting download" line of the same
+file. Once a directory has telemetry, its outcomes and errors are taken
+from there and the text log only adds the Facebook method lines.
+
+    python log_analytics.py
+    python log_analytics.py /var/log/downloads/download_log.txt --freq W
+    python log_analytics.py --csv events.csv --top 20
+"""
+import argparse
+import bz2
+import collections
+import glob
+import gzip
+import json
+import os
+import re
+import sys
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_LOGS = [
+    os.path.join(APP_DIR, 'telemetry.jsonl'),
+    os.path.join(APP_DIR, 'download_log.txt'),
+    os.path.join(APP_DIR, '..', 'MediaDownloaderApp', 'download_log.txt'),
+]
+
+CHUNK_ROWS = 100_000
+COLUMNS = ['time', 'kind', 'site', 'method', 'outcome', 'phase', 'seconds', 'error']
+# Latency histogram: 1ms to ~28h in 400 log-spaced bins
+LATENCY_BINS = np.logspace(-3, 5, 401)
+PERCENTILES = (50, 90, 99)
+# Error signatures kept between chunks; the rarest are dropped beyond this
+MAX_SIGNATURES = 10_000
+SIGNATURE_LENGTH = 120
+
+# Facebook strategy keys (telemetry) to the names used in the text log
+METHOD_NAMES = {'navigation': 'Facebook method 1', 'externalhit': 'Facebook method 2', 'mobile': 'Facebook method 3'}
+# Domain names (without TLD) of short links and CDNs, as the site they belong to
+SITE_ALIASES = {'youtu': 'youtube', 'googlevideo': 'youtube', 'fb': 'facebook', 'fbcdn': 'facebook'}
+
+LINE = re.compile(r'^(\d{4}-\d\d-\d\d \d\d:\d\d:\d\d),\d+ - (\w+) - (.*)$')
+STARTING = re.compile(r'^Starting download for URL: (\S+)')
+METHOD = re.compile(r'^(Facebook method \d+)(?: \([\w-]+\))? (failed|succeeded)(?: for \S+?)?(?:: (.*)| in ([\d.]+)s)?$')
+JOB_FAILED = re.compile(r'^(?:Download failed|Download error|Job \d+ failed for (\S+)|Unexpected error for)')
+URL = re.compile(r'https?://\S+')
+ANSI = re.compile(r'\x1b\[[0-9;]*m')
+YTDLP_ID = re.compile(r'\[([\w:]+)\] [\w-]+:')
+QUOTED = re.compile(r"'[^']*'|\"[^\"]*\"")
+NUMBER = re.compile(r'\d+')
+
+
+def open_log(path):
+    """Text stream of a log, decompressing .gz and .bz2"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+    if path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8', errors='replace')
+    return open(path, 'r', encoding='utf-8', errors='replace')
+
+
+def _rotation(path, base):
+    number = re.match(r'\.(\d+)', path[len(base):])
+    return int(number.group(1)) if number else 0
+
+
+def expand(path):
+    """path and its rotated copies, oldest first"""
+    base = re.sub(r'(\.\d+)?(\.gz|\.bz2)?$', '', path)
+    found = set(glob.glob(glob.escape(base) + '.*')) | ({base} if os.path.exists(base) else set())
+    found = [name for name in found if re.fullmatch(r'(\.\d+)?(\.gz|\.bz2)?', name[len(base):])]
+    return sorted(found, key=lambda name: (-_rotation(name, base), name))
+
+
+def site_of(url=None, extractor=None):
+    if extractor:
+        return extractor.split(':')[0].lower()
+    labels = ((urlparse(url).hostname or '') if url else '').lower().split('.')
+    name = labels[-2] if len(labels) > 1 else labels[0]
+    return SITE_ALIASES.get(name, name) or 'unknown'
+
+
+def signature(message):
+    """An error message with URLs, ids, paths, titles and numbers blanked out"""
+    message = ANSI.sub('', message or '')
+    if 'ERROR:' in message:
+        message = message.split('ERROR:', 1)[1]
+    message = URL.sub('<url>', message)
+    message = YTDLP_ID.sub(r'[\1] <id>:', message)
+    message = QUOTED.sub("'…'", message)
+    message = NUMBER.sub('N', message)
+    return ' '.join(message.split())[:SIGNATURE_LENGTH]
+
+
+def _error_text(message):
+    # "Download error for <title>: ERROR: ..." -- the title may contain ': ' too
+    if 'ERROR:' in message:
+        return message[message.index('ERROR:'):]
+    return message.split(': ', 1)[1] if ': ' in message else message
+
+
+def parse_text(lines, cutoff=None):
+    """Rows (see COLUMNS) from a text log; from cutoff on only Facebook method rows"""
+    site = 'unknown'
+    for line in lines:
+        match = LINE.match(line)
+        if not match:
+            continue  # tracebacks and other continuation lines
+        stamp, level, message = match.groups()
+        recent = cutoff is not None and stamp >= cutoff
+        started = STARTING.match(message)
+        if started:
+            site = site_of(started.group(1))
+            continue
+        method = METHOD.match(message)
+        if method:
+            name, result, error, seconds = method.groups()
+            ok = result == 'succeeded'
+            yield (stamp, 'method', 'facebook', name, 'ok' if ok else 'failed',
+                   'extract' if ok and not recent else None, float(seconds) if seconds and not recent else None,
+                   None if ok else signature(error))
+            continue
+        if recent:
+            continue
+        if message.startswith('Download completed successfully'):
+            yield stamp, 'job', site, None, 'ok', None, None, None
+            continue
+        failed = JOB_FAILED.match(message)
+        if failed:
+            yield (stamp, 'job', site_of(failed.group(1)) if failed.group(1) else site, None, 'failed', None, None,
+                   signature(_error_text(message)))
+        elif level in ('ERROR', 'CRITICAL'):
+            yield stamp, 'error', site, None, None, None, None, signature(_error_text(message))
+
+
+def parse_telemetry(lines):
+    """Rows (see COLUMNS) from telemetry.jsonl"""
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # a line cut short by a crash
+        stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(record.get('time') or 0))
+        site = site_of(record.get('url'), record.get('extractor'))
+        strategy = record.get('strategy')
+        method = METHOD_NAMES.get(strategy) or ('Facebook method 4' if (strategy or '').startswith('variant-') else None)
+        error = signature(record['error']) if record.get('error') else None
+        if record.get('event') == 'job':
+            yield stamp, 'job', site, method, 'ok' if record['outcome'] == 'done' else record['outcome'], \
+                None, None, error
+        elif record.get('event') == 'phase':
+            yield stamp, 'phase', site, method, 'failed' if error else 'ok', record['phase'], record.get('seconds'), \
+                None
+
+
+def chunks(rows, size=CHUNK_ROWS):
+    """DataFrames of at most size rows, built one at a time"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield _frame(batch)
+            batch = []
+    if batch:
+        yield _frame(batch)
+
+
+def _frame(batch):
+    frame = pd.DataFrame.from_records(batch, columns=COLUMNS)
+    frame['time'] = pd.to_datetime(frame['time'], format='%Y-%m-%d %H:%M:%S')
+    frame['seconds'] = pd.to_numeric(frame['seconds'])
+    for column in ('kind', 'site', 'method', 'outcome', 'phase'):
+        frame[column] = frame[column].astype('category')
+    return frame
+
+
+def _add(total, counts):
+    return counts if total is None else total.add(counts, fill_value=0)
+
+
+def _percentile(histogram, q):
+    target = histogram.sum() * q / 100
+    cumulative = np.cumsum(histogram)
+    i = int(np.searchsorted(cumulative, target))
+    below = cumulative[i - 1] if i else 0
+    # Interpolate geometrically within the bin
+    share = (target - below) / histogram[i] if histogram[i] else 0
+    return LATENCY_BINS[i] * (LATENCY_BINS[i + 1] / LATENCY_BINS[i]) ** share
+
+
+class Report:
+    """Running totals over any number of chunks"""
+
+    def __init__(self, freq='D'):
+        self.freq = freq
+        self.rows = 0
+        self.outcomes = None
+        self.methods = None
+        self.trend = None
+        self.errors = collections.Counter()
+        self.latency = {}
+        self.first = None
+        self.last = None
+
+    def add(self, frame):
+        self.rows += len(frame)
+        if not len(frame):
+            return
+        self.first = min(filter(None, (self.first, frame['time'].min())))
+        self.last = max(filter(None, (self.last, frame['time'].max())))
+
+        jobs = frame[frame['kind'] == 'job']
+        self.outcomes = _add(self.outcomes, jobs.groupby(['site', 'outcome'], observed=True).size())
+        self.trend = _add(self.trend, jobs.groupby([jobs['time'].dt.to_period(self.freq), 'outcome'],
+                                                   observed=True).size())
+        methods = frame[frame['kind'] == 'method']
+        self.methods = _add(self.methods, methods.groupby(['method', 'outcome'], observed=True).size())
+
+        self.errors.update(frame['error'].dropna().value_counts().to_dict())
+        if len(self.errors) > MAX_SIGNATURES:
+            self.errors = collections.Counter(dict(self.errors.most_common(MAX_SIGNATURES // 2)))
+
+        timed = frame[frame['seconds'].notna() & frame['phase'].notna()]
+        for phase, seconds in timed.groupby('phase', observed=True)['seconds']:
+            values = np.clip(seconds.to_numpy(dtype=float), LATENCY_BINS[0], LATENCY_BINS[-1])
+            counts, total, peak = self.latency.get(phase, (np.zeros(len(LATENCY_BINS) - 1, dtype=np.int64), 0.0, 0.0))
+            counts += np.histogram(values, LATENCY_BINS)[0]
+            self.latency[phase] = (counts, total + seconds.sum(), max(peak, seconds.max()))
+
+    @staticmethod
+    def _rates(counts, by):
+        if counts is None or not len(counts):
+            return None
+        table = counts.unstack('outcome', fill_value=0).astype(int)
+        for outcome in ('ok', 'failed'):
+            if outcome not in table:
+                table[outcome] = 0
+        table['total'] = table.sum(axis=1)
+        table['success'] = (table['ok'] / (table['ok'] + table['failed']).where(lambda n: n > 0)).map(
+            lambda rate: '' if pd.isna(rate) else f"{rate:.0%}")
+        table.index.name = by
+        return table.sort_values('total', ascending=False)
+
+    def success_by_site(self):
+        return self._rates(self.outcomes, 'site')
+
+    def success_by_method(self):
+        return self._rates(self.methods, 'method')
+
+    def latencies(self):
+        rows = []
+        for phase, (counts, total, peak) in sorted(self.latency.items()):
+            n = int(counts.sum())
+            rows.append(dict({'phase': phase, 'count': n, 'mean': total / n},
+                             **{f"p{q}": _percentile(counts, q) for q in PERCENTILES}, max=peak))
+        return pd.DataFrame(rows).set_index('phase').round(3) if rows else None
+
+    def trends(self):
+        table = self._rates(self.trend, 'period')
+        return table.sort_index() if table is not None else None
+
+    def top_errors(self, n=10):
+        return self.errors.most_common(n)
+
+
+def read(paths, report, csv_path=None, chunk_rows=CHUNK_ROWS):
+    """Feed every log in paths (with rotations) into report; returns the files read"""
+    by_dir = collections.OrderedDict()
+    for path in paths:
+        for name in expand(os.path.abspath(path)):
+            by_dir.setdefault(os.path.dirname(name), []).append(name)
+
+    read_files = []
+    header = True
+    for directory, names in by_dir.items():
+        # Telemetry first: where it starts, the text log is no longer the source of outcomes
+        telemetry_files = [name for name in names if '.jsonl' in os.path.basename(name)]
+        text_files = [name for name in names if name not in telemetry_files]
+        cutoff = None
+        for name in telemetry_files + text_files:
+            with open_log(name) as f:
+                rows = parse_telemetry(f) if name in telemetry_files else parse_text(f, cutoff)
+                for frame in chunks(rows, chunk_rows):
+                    if name in telemetry_files and len(frame) and (cutoff is None or
+                                                                   str(frame['time'].min()) < cutoff):
+                        cutoff = str(frame['time'].min())
+                    report.add(frame)
+                    if csv_path:
+                        frame.assign(source=name).to_csv(csv_path, mode='w' if header else 'a', header=header,
+                                                         index=False)
+                        header = False
+            read_files.append(name)
+    return read_files
+
+
+def _print_table(title, table):
+    print(f"\n{title}")
+    print("-" * len(title))
+    print(table.to_string() if table is not None else "(nothing logged)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Success rates, latencies and errors from the download logs.")
+    parser.add_argument('logs', nargs='*', default=DEFAULT_LOGS,
+                        help="log files (text or telemetry .jsonl, may be .gz/.bz2); rotated copies are "
+                             "read too (default: both apps' download_log.txt and telemetry.jsonl)")
+    parser.add_argument('--freq', default='D', help="trend period: D, W or M (default: D)")
+    parser.add_argument('--top', type=int, default=10, help="error signatures to list (default: 10)")
+    parser.add_argument('--csv', metavar='FILE', help="also write every parsed row here")
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    report = Report(args.freq)
+    files = read(args.logs, report, args.csv, args.chunk_rows)
+    if not files:
+        print("No logs found", file=sys.stderr)
+        return 1
+    print(f"{report.rows} events from {len(files)} file(s), {report.first} to {report.last}")
+    _print_table("Success rate by site", report.success_by_site())
+    _print_table("Facebook methods", report.success_by_method())
+    _print_table("Latency by phase (seconds)", report.latencies())
+    _print_table(f"Downloads per period ({args.freq})", report.trends())
+    print(f"\nTop error signatures\n{'-' * 20}")
+    for text, count in report.top_errors(args.top) or [(None, 0)]:
+        print(f"{count:>7}  {text}" if text else "(none)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""On-disk cache of yt-dlp info dicts, keyed by normalized URL.
+
+Entries expire after a TTL, or earlier when the signed media URLs inside the
+info dict expire (YouTube 'expire=', Facebook CDN 'oe='). The cache is kept
+under a size and entry budget by evicting the least recently used rows."""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlparse, parse_qsl, urlencode, urlunparse
+
+DEFAULT_TTL = 6 * 60 * 60
+DEFAULT_MAX_ENTRIES = 5000
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+# Treat a format URL as dead this long before it actually expires
+EXPIRY_MARGIN = 5 * 60
+
+TRACKING_PARAMS = {'fbclid', 'si', 'feature', 'pp', 'mibextid', 'rdid', 'share_url', 'ref', 'app'}
+
+
+def normalize_url(url):
+    """Canonical cache key for a URL: lower-case host, no fragment, no tracking params, sorted query"""
+    parts = urlparse(url.strip())
+    host = (parts.hostname or '').lower()
+    for prefix in ('www.', 'm.', 'mobile.'):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+            break
+    if host == 'youtu.be' and parts.path.strip('/'):
+        query = [('v', parts.path.strip('/'))] + parse_qsl(parts.query)
+        host, path = 'youtube.com', '/watch'
+    else:
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        path = parts.path.rstrip('/') or '/'
+    query = sorted((k, v) for k, v in query
+                   if k not in TRACKING_PARAMS and not k.startswith('utm_') and not k.startswith('__'))
+    return urlunparse(('https', host, path, '', urlencode(query), ''))
+
+
+def _url_expiry(url):
+    """Expiry timestamp encoded in a signed media URL, or None"""
+    try:
+        params = dict(parse_qsl(urlparse(url).query))
+    except ValueError:
+        return None
+    if params.get('expire', '').isdigit():
+        return int(params['expire'])
+    oe = params.get('oe')
+    if oe:
+        try:
+            return int(oe, 16)
+        except ValueError:
+            return None
+    return None
+
+
+def formats_expiry(info):
+    """Earliest expiry of any format URL in an info dict (and its entries), or None"""
+    earliest = None
+    stack = [info]
+    while stack:
+        item = stack.pop()
+        if not isinstance(item, dict):
+            continue
+        urls = [item.get('url')] + [fmt.get('url') for fmt in item.get('formats') or []]
+        for url in urls:
+            expiry = _url_expiry(url) if url else None
+            if expiry and (earliest is None or expiry < earliest):
+                earliest = expiry
+        stack.extend(item.get('entries') or [])
+    return earliest
+
+
+class MetadataCache:
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS info_cache (
+                key TEXT PRIMARY KEY,
+                info BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                expires REAL NOT NULL
+            )""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS info_cache_accessed ON info_cache (accessed)")
+        self._conn.commit()
+
+    def get(self, url):
+        """Return the cached info dict for a URL, or None if missing or expired"""
+        key = normalize_url(url)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT info, expires FROM info_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            if row[1] <= now:
+                self._conn.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE info_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        self.hits += 1
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, url, info, ttl=None):
+        now = time.time()
+        expires = now + (self.ttl if ttl is None else ttl)
+        url_expiry = formats_expiry(info)
+        if url_expiry:
+            expires = min(expires, url_expiry - EXPIRY_MARGIN)
+        if expires <= now:
+            return False
+
+        blob = zlib.compress(json.dumps(info, default=str).encode('utf-8'))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO info_cache (key, info, size, created, accessed, expires) VALUES (?, ?, ?, ?, ?, ?)",
+                (normalize_url(url), blob, len(blob), now, now, expires))
+            self._evict()
+            self._conn.commit()
+        return True
+
+    def invalidate(self, url):
+        with self._lock:
+            self._conn.execute("DELETE FROM info_cache WHERE key = ?", (normalize_url(url),))
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM info_cache")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM info_cache").fetchone()
+        return {'entries': count, 'bytes': size, 'hits': self.hits, 'misses': self.misses}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self):
+        """Drop expired rows, then least recently used rows until within budget. Caller holds the lock."""
+        self._conn.execute("DELETE FROM info_cache WHERE expires <= ?", (time.time(),))
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM info_cache").fetchone()
+        if count <= self.max_entries and size <= self.max_bytes:
+            return
+        evicted = 0
+        for key, row_size in self._conn.execute("SELECT key, size FROM info_cache ORDER BY accessed").fetchall():
+            if count <= self.max_entries and size <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM info_cache WHERE key = ?", (key,))
+            count -= 1
+            size -= row_size
+            evicted += 1
+        logging.debug(f"Metadata cache evicted {evicted} entries")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """Process-wide cache stored next to the downloader scripts"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'metadata_cache.sqlite3')
+            try:
+                _default_cache = MetadataCache(path)
+            except sqlite3.Error as e:
+                logging.error(f"Could not open metadata cache {path}: {e}")
+                _default_cache = MetadataCache(':memory:')
+        return _default_cache
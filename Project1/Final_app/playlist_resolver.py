@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Resolve flat playlist entries one by one in the background.
+
+A flat listing (extract_flat='in_playlist') returns titles and URLs for a
+whole playlist in one request, so rows can be shown at once. Full
+extraction of each entry (formats, thumbnail, duration) then runs here in a
+small worker pool. Entries are taken in playlist order, except that the
+UI can move any entry to the front: rows scrolled into view, and anything
+the user is about to download."""
+import heapq
+import itertools
+import logging
+import threading
+
+# Lower runs first; playlist position is added to BACKGROUND
+SELECTED = -2
+VISIBLE = -1
+BACKGROUND = 0
+
+
+class PlaylistResolver:
+    """resolve(entry) -> info runs on the workers; on_resolved(index, info) and
+    on_failed(index, error) are called from the worker threads."""
+
+    def __init__(self, resolve, on_resolved, on_failed=None, workers=4):
+        self.resolve = resolve
+        self.on_resolved = on_resolved
+        self.on_failed = on_failed
+        self.workers = workers
+        self._heap = []
+        self._priority = {}
+        self._entries = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._cancelled = False
+        self._threads = []
+        self.resolved = 0
+        self.failed = 0
+
+    def start(self, entries):
+        """Queue every entry (index -> entry) in playlist order and start the workers"""
+        with self._lock:
+            for index, entry in enumerate(entries):
+                self._entries[index] = entry
+                self._push(index, BACKGROUND + index)
+        for n in range(min(self.workers, len(entries))):
+            thread = threading.Thread(target=self._work, name=f"resolver-{n}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def total(self):
+        return len(self._entries)
+
+    def prioritize(self, index, level=VISIBLE):
+        """Move a pending entry ahead of the background queue; no-op once it is taken"""
+        with self._lock:
+            if index in self._priority and level < self._priority[index]:
+                self._push(index, level)
+
+    def cancel(self):
+        """Drop everything still queued; entries being resolved finish but are not reported"""
+        with self._lock:
+            self._cancelled = True
+            self._heap.clear()
+            self._priority.clear()
+
+    @property
+    def pending(self):
+        with self._lock:
+            return len(self._priority)
+
+    def _push(self, index, priority):
+        # Older heap items for this index are skipped when popped
+        self._priority[index] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), index))
+
+    def _next(self):
+        with self._lock:
+            while self._heap:
+                priority, _, index = heapq.heappop(self._heap)
+                if self._priority.get(index) == priority:
+                    del self._priority[index]
+                    return index
+            return None
+
+    def _work(self):
+        while not self._cancelled:
+            index = self._next()
+            if index is None:
+                return
+            try:
+                info = self.resolve(self._entries[index])
+            except Exception as e:
+                logging.warning(f"Could not resolve playlist entry {index}: {e}")
+                with self._lock:
+                    self.failed += 1
+                if self.on_failed and not self._cancelled:
+                    self.on_failed(index, e)
+                continue
+            with self._lock:
+                self.resolved += 1
+            if not self._cancelled:
+                self.on_resolved(index, info)
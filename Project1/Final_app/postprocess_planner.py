@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""Container policy for downloaded files: do nothing, remux, or transcode.
+
+yt-dlp's FFmpegVideoConvertor lets ffmpeg pick its default encoders, so a
+WebM/MKV with H.264 and AAC inside was re-encoded just to change the
+container. The planner looks at the streams with ffprobe first:
+
+    noop       already the target container with codecs it can hold
+    remux      codecs fit the target; copy the streams into a new container
+    transcode  re-encode only the streams that do not fit; copy the rest
+
+ContainerPolicyPP is a drop-in replacement for the convertor and reports
+the action taken and its wall time for each file."""
+import json
+import logging
+import os
+import shutil
+import subprocess
+import time
+
+from yt_dlp.postprocessor import PostProcessor
+from yt_dlp.utils import PostProcessingError
+
+NOOP = "noop"
+REMUX = "remux"
+TRANSCODE = "transcode"
+
+# Codecs each target container can carry without re-encoding (and that common players handle)
+COPYABLE = {
+    'mp4': {
+        'video': {'h264', 'hevc', 'av1', 'mpeg4'},
+        'audio': {'aac', 'mp3', 'alac', 'ac3', 'eac3'},
+    },
+    'mkv': {
+        'video': {'h264', 'hevc', 'av1', 'vp8', 'vp9', 'mpeg4'},
+        'audio': {'aac', 'mp3', 'opus', 'vorbis', 'flac', 'ac3', 'eac3', 'alac'},
+    },
+}
+# ffprobe's format_name for each target
+FORMAT_NAMES = {'mp4': 'mp4', 'mkv': 'matroska'}
+ENCODERS = {
+    'video': ['-c:{spec}', 'libx264', '-preset', 'veryfast', '-crf', '20'],
+    'audio': ['-c:{spec}', 'aac', '-b:{spec}', '192k'],
+}
+PROBE_TIMEOUT = 60
+
+
+def ffmpeg_tools(ffmpeg_location=None):
+    """(ffmpeg, ffprobe) executables next to ffmpeg_location, else from PATH; either may be None"""
+    tools = []
+    for name in ('ffmpeg', 'ffprobe'):
+        found = None
+        if ffmpeg_location:
+            folder = ffmpeg_location if os.path.isdir(ffmpeg_location) else os.path.dirname(ffmpeg_location)
+            for candidate in (f"{name}.exe", name):
+                if os.path.isfile(os.path.join(folder, candidate)):
+                    found = os.path.join(folder, candidate)
+                    break
+        tools.append(found or shutil.which(name))
+    return tools[0], tools[1]
+
+
+def probe(path, ffprobe):
+    """ffprobe's view of path: {'format': 'mov,mp4,...', 'streams': [{'index', 'type', 'codec'}, ...]}"""
+    output = subprocess.run(
+        [ffprobe, '-v', 'error', '-show_entries',
+         'format=format_name:stream=index,codec_type,codec_name:stream_disposition=attached_pic',
+         '-of', 'json', path],
+        capture_output=True, text=True, timeout=PROBE_TIMEOUT, check=True).stdout
+    data = json.loads(output or '{}')
+    streams = []
+    for stream in data.get('streams', []):
+        if stream.get('codec_type') not in ('video', 'audio'):
+            continue  # subtitles and data streams are dropped, as the convertor did
+        if stream.get('disposition', {}).get('attached_pic'):
+            continue  # cover art
+        streams.append({'index': stream['index'], 'type': stream['codec_type'], 'codec': stream.get('codec_name')})
+    return {'format': data.get('format', {}).get('format_name', ''), 'streams': streams}
+
+
+def plan(probed, path, target='mp4'):
+    """Choose what to do with path, given probe() output.
+
+    Returns {'action', 'copy': [stream...], 'encode': [stream...]}. A file
+    without audio or video streams raises PostProcessingError: ffmpeg would
+    fall back to its default mapping and re-encode whatever it finds."""
+    if not probed['streams']:
+        raise PostProcessingError(f"No audio or video streams in {path}")
+    copyable = COPYABLE[target]
+    copy, encode = [], []
+    for stream in probed['streams']:
+        (copy if stream['codec'] in copyable[stream['type']] else encode).append(stream)
+    in_target = (FORMAT_NAMES[target] in probed['format'].split(',')
+                 and os.path.splitext(path)[1].lower() == f".{target}")
+    if encode:
+        action = TRANSCODE
+    elif in_target:
+        action = NOOP
+    else:
+        action = REMUX
+    return {'action': action, 'copy': copy, 'encode': encode}
+
+
+def ffmpeg_command(ffmpeg, source, dest, planned, target='mp4'):
+    args = [ffmpeg, '-y', '-v', 'error', '-i', source]
+    if planned is None:
+        # Streams unknown: ffmpeg's default mapping, everything re-encoded
+        args += [arg.format(spec='v') for arg in ENCODERS['video']] + [arg.format(spec='a') for arg in ENCODERS['audio']]
+        return args + (['-movflags', '+faststart'] if target == 'mp4' else []) + [dest]
+    streams = sorted(planned['copy'] + planned['encode'], key=lambda stream: stream['index'])
+    for stream in streams:
+        args += ['-map', f"0:{stream['index']}"]
+    for n, stream in enumerate(streams):
+        spec = f"{n}"
+        if stream in planned['copy']:
+            args += [f"-c:{spec}", 'copy']
+        else:
+            args += [arg.format(spec=spec) for arg in ENCODERS[stream['type']]]
+    if target == 'mp4':
+        args += ['-movflags', '+faststart']
+    return args + [dest]
+
+
+def convert(path, target='mp4', ffmpeg_location=None):
+    """Bring path into the target container; returns a report dict.
+
+    The report has source, path (the resulting file), action, seconds and
+    the copied/encoded codecs. Without ffprobe every file is transcoded,
+    as before."""
+    started = time.monotonic()
+    ffmpeg, ffprobe = ffmpeg_tools(ffmpeg_location)
+    if ffmpeg is None:
+        raise FileNotFoundError("ffmpeg not found")
+    if ffprobe is not None:
+        planned = plan(probe(path, ffprobe), path, target)
+        action = planned['action']
+    else:
+        logging.warning("ffprobe not found, transcoding without looking at the streams")
+        planned, action = None, TRANSCODE
+
+    dest = path
+    if action != NOOP:
+        dest = f"{os.path.splitext(path)[0]}.{target}"
+        # Never write over the input: remuxing a .mp4 that is really something else goes via a temp name
+        tmp = f"{os.path.splitext(path)[0]}.convert.{target}"
+        try:
+            subprocess.run(ffmpeg_command(ffmpeg, path, tmp, planned, target), capture_output=True, text=True, check=True)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        os.replace(tmp, dest)
+
+    report = {
+        'source': path,
+        'path': dest,
+        'action': action,
+        'seconds': round(time.monotonic() - started, 3),
+        'copied': [stream['codec'] for stream in planned['copy']] if planned else [],
+        'encoded': [stream['codec'] for stream in planned['encode']] if planned else ['all'],
+    }
+    logging.info(f"Post-processing {os.path.basename(path)}: {report['action']} in {report['seconds']:.1f}s"
+                 + (f" (re-encoded {', '.join(str(codec) for codec in report['encoded'])})" if report['encoded'] else ""))
+    return report
+
+
+class ContainerPolicyPP(PostProcessor):
+    """Replacement for FFmpegVideoConvertor that only re-encodes when it has to.
+
+    on_report(report) is called with convert()'s report for every file."""
+
+    def __init__(self, downloader=None, target='mp4', ffmpeg_location=None, on_report=None):
+        super().__init__(downloader)
+        self.target = target
+        self.ffmpeg_location = ffmpeg_location
+        self.on_report = on_report
+
+    def run(self, info):
+        path = info['filepath']
+        try:
+            report = convert(path, self.target, self.ffmpeg_location)
+        except subprocess.CalledProcessError as e:
+            raise PostProcessingError(f"ffmpeg failed on {path}: {(e.stderr or '').strip()[-500:]}")
+        except subprocess.TimeoutExpired:
+            raise PostProcessingError(f"ffprobe did not answer within {PROBE_TIMEOUT}s on {path}")
+        except FileNotFoundError as e:
+            raise PostProcessingError(str(e))
+        if self.on_report:
+            self.on_report(report)
+        if report['path'] == path:
+            return [], info
+        info['filepath'] = report['path']
+        info['ext'] = self.target
+        return [path], info
+
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Post-processing stages that run next to the downloads instead of inside them.
+
+With yt-dlp doing everything in ydl.download(), a worker holds its network
+slot while ffmpeg merges or extracts audio. downloader_core hands the
+downloaded files to a PostprocessPipeline instead and returns as soon as
+the transfer is done, so the next download starts while ffmpeg works.
+
+Every stage (merge, convert, extract_audio) has its own queue with a
+maximum depth; submit() blocks when a stage is that far behind, which keeps
+downloads from piling up unprocessed files. All stages share one budget of
+CPU-sized slots. ffmpeg runs as its own process, so a thread per slot is
+enough to keep every core busy."""
+import concurrent.futures
+import logging
+import os
+import subprocess
+import threading
+import time
+
+import postprocess_planner
+
+MERGE = "merge"
+CONVERT = "convert"
+EXTRACT_AUDIO = "extract_audio"
+STAGES = (MERGE, CONVERT, EXTRACT_AUDIO)
+
+# Files a stage may have waiting before downloads feeding it are held back
+DEFAULT_QUEUE_DEPTH = 8
+
+AUDIO_CODECS = {
+    'mp3': (['-c:a', 'libmp3lame'], 'mp3'),
+    'aac': (['-c:a', 'aac'], 'm4a'),
+    'm4a': (['-c:a', 'aac'], 'm4a'),
+    'opus': (['-c:a', 'libopus'], 'opus'),
+    'flac': (['-c:a', 'flac'], 'flac'),
+    'wav': (['-c:a', 'pcm_s16le'], 'wav'),
+}
+
+# Container for a copied audio stream, by codec (as yt-dlp's FFmpegExtractAudio picks them)
+NATIVE_EXT = {'aac': 'm4a', 'mp3': 'mp3', 'opus': 'opus', 'vorbis': 'ogg', 'flac': 'flac', 'alac': 'm4a'}
+
+
+def _ffmpeg(ffmpeg_location):
+    ffmpeg = postprocess_planner.ffmpeg_tools(ffmpeg_location)[0]
+    if ffmpeg is None:
+        raise FileNotFoundError("ffmpeg not found")
+    return ffmpeg
+
+
+def _run(args, output):
+    tmp = f"{os.path.splitext(output)[0]}.tmp{os.path.splitext(output)[1]}"
+    try:
+        subprocess.run(args + [tmp], capture_output=True, text=True, check=True)
+    except subprocess.CalledProcessError as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise RuntimeError(f"ffmpeg failed for {os.path.basename(output)}: {(e.stderr or '').strip()[-500:]}")
+    os.replace(tmp, output)
+
+
+def merge(inputs, output, ffmpeg_location=None):
+    """Stream-copy separately downloaded video and audio into output; removes the inputs"""
+    args = [_ffmpeg(ffmpeg_location), '-y', '-v', 'error']
+    for path in inputs:
+        args += ['-i', path]
+    for n in range(len(inputs)):
+        args += ['-map', f"{n}"]
+    args += ['-c', 'copy']
+    if output.endswith('.mp4'):
+        args += ['-movflags', '+faststart']
+    _run(args, output)
+    for path in inputs:
+        os.remove(path)
+    return output
+
+
+def _native_audio(path, ffmpeg_location):
+    """(codec, has_video) of path, from ffprobe or else from the file extension"""
+    ffprobe = postprocess_planner.ffmpeg_tools(ffmpeg_location)[1]
+    if ffprobe is not None:
+        streams = postprocess_planner.probe(path, ffprobe)['streams']
+        audio = [stream['codec'] for stream in streams if stream['type'] == 'audio']
+        return (audio[0] if audio else None), any(stream['type'] == 'video' for stream in streams)
+    ext = os.path.splitext(path)[1].lower().lstrip('.')
+    return {'m4a': 'aac', 'mp3': 'mp3', 'opus': 'opus', 'ogg': 'vorbis', 'flac': 'flac'}.get(ext), ext not in NATIVE_EXT.values()
+
+
+def extract_audio(path, codec='mp3', quality='192', ffmpeg_location=None):
+    """Same result as yt-dlp's FFmpegExtractAudio; returns the audio file and removes path.
+
+    codec 'best' keeps the native codec: the audio stream is copied into its
+    own container, or the file is kept as it is when it already is one."""
+    if codec in (None, 'best'):
+        native, has_video = _native_audio(path, ffmpeg_location)
+        if native in NATIVE_EXT:
+            ext = NATIVE_EXT[native]
+            if not has_video and path.lower().endswith(f".{ext}"):
+                return path
+            encoder = ['-c:a', 'copy']
+        else:
+            # Unknown or no container of its own (e.g. a muxed fallback format): fall back to AAC
+            encoder, ext = AUDIO_CODECS['aac']
+            codec = 'aac'
+    else:
+        encoder, ext = AUDIO_CODECS.get(codec, AUDIO_CODECS['mp3'])
+    output = f"{os.path.splitext(path)[0]}.{ext}"
+    args = [_ffmpeg(ffmpeg_location), '-y', '-v', 'error', '-i', path, '-vn'] + encoder
+    if codec not in ('flac', 'wav', None, 'best'):
+        args += ['-b:a', f"{quality}k" if str(quality).isdigit() and int(quality) > 10 else '192k']
+    _run(args, output)
+    if output != path:
+        os.remove(path)
+    return output
+
+
+def convert(path, target='mp4', ffmpeg_location=None):
+    """Container conversion through the planner (noop, remux or transcode); returns the new path"""
+    report = postprocess_planner.convert(path, target, ffmpeg_location)
+    if report['path'] != path:
+        os.remove(path)
+    return report['path']
+
+
+class _Stage:
+    def __init__(self, name, slots, queue_depth):
+        self.name = name
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=slots, thread_name_prefix=f"pp-{name}")
+        self.capacity = threading.BoundedSemaphore(queue_depth + slots)
+        self.lock = threading.Lock()
+        self.submitted = 0
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.busy_seconds = 0.0
+        self.wait_seconds = 0.0
+
+    @property
+    def depth(self):
+        return self.submitted - self.completed - self.failed - self.running
+
+    def metrics(self):
+        with self.lock:
+            finished = self.completed + self.failed
+            return {
+                'queued': self.depth,
+                'running': self.running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'max_depth': self.max_depth,
+                'busy_seconds': round(self.busy_seconds, 3),
+                'avg_wait': round(self.wait_seconds / finished, 3) if finished else None,
+                'avg_seconds': round(self.busy_seconds / finished, 3) if finished else None,
+            }
+
+
+class PostprocessPipeline:
+    """Per-stage queues in front of a shared pool of CPU slots.
+
+    submit(stage, func, *args) returns a Future for func's return value."""
+
+    def __init__(self, workers=None, queue_depth=DEFAULT_QUEUE_DEPTH):
+        self.workers = workers or os.cpu_count() or 2
+        self._slots = threading.Semaphore(self.workers)
+        self._stages = {name: _Stage(name, self.workers, queue_depth) for name in STAGES}
+
+    def submit(self, stage, func, *args, **kwargs):
+        """Queue work for stage; blocks while that stage's queue is full"""
+        state = self._stages[stage]
+        state.capacity.acquire()
+        queued = time.monotonic()
+        with state.lock:
+            state.submitted += 1
+            state.max_depth = max(state.max_depth, state.depth)
+        try:
+            return state.executor.submit(self._run, state, queued, func, args, kwargs)
+        except RuntimeError:
+            with state.lock:
+                state.submitted -= 1
+            state.capacity.release()
+            raise
+
+    def _run(self, state, queued, func, args, kwargs):
+        with self._slots:
+            started = time.monotonic()
+            with state.lock:
+                state.running += 1
+                state.wait_seconds += started - queued
+            ok = False
+            try:
+                result = func(*args, **kwargs)
+                ok = True
+                return result
+            except Exception as e:
+                logging.error(f"{state.name} failed: {e}")
+                raise
+            finally:
+                with state.lock:
+                    state.running -= 1
+                    state.busy_seconds += time.monotonic() - started
+                    if ok:
+                        state.completed += 1
+                    else:
+                        state.failed += 1
+                state.capacity.release()
+
+    def metrics(self):
+        """{stage: {'queued', 'running', 'completed', 'failed', 'max_depth', 'busy_seconds', 'avg_wait', 'avg_seconds'}}"""
+        return {name: stage.metrics() for name, stage in self._stages.items()}
+
+    def pending(self):
+        return sum(stage.submitted - stage.completed - stage.failed for stage in self._stages.values())
+
+    def shutdown(self, wait=True):
+        for stage in self._stages.values():
+            stage.executor.shutdown(wait=wait)
+
+
+_default_pipeline = None
+_default_pipeline_lock = threading.Lock()
+
+
+def get_default_pipeline():
+    global _default_pipeline
+    with _default_pipeline_lock:
+        if _default_pipeline is None:
+            _default_pipeline = PostprocessPipeline()
+        return _default_pipeline
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Coalesced progress reporting from download threads to a Tk UI.
+
+yt-dlp can call progress hooks thousands of times a second on fragmented
+downloads. Worker threads only store the latest state per job here; the Tk
+thread picks the states up on a fixed timer (10 Hz by default), so the event
+queue sees one update per job per tick no matter how fast hooks fire. Speed
+and ETA are smoothed here instead of taken from yt-dlp's per-call values."""
+import logging
+import math
+import threading
+import time
+
+# Time constant of the speed average, in seconds
+SPEED_SMOOTHING = 3.0
+# Ignore samples closer together than this when measuring speed
+MIN_SAMPLE_INTERVAL = 0.2
+
+
+def format_bytes(value):
+    if value is None:
+        return "?"
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if value < 1024 or unit == "GiB":
+            return f"{value:.0f}{unit}" if unit == "B" else f"{value:.1f}{unit}"
+        value /= 1024
+
+
+def format_eta(seconds):
+    if seconds is None:
+        return "--:--"
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f"{seconds // 3600}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    return f"{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+def describe_fragments(snapshot):
+    """'fragment 120/900, 0.35s each, 6 in parallel' for turbo downloads, else ''"""
+    if snapshot.get('fragment_index') is None:
+        return ""
+    text = f"fragment {snapshot['fragment_index']}/{snapshot.get('fragment_count') or '?'}"
+    if snapshot.get('fragment_seconds') is not None:
+        text += f", {snapshot['fragment_seconds']:.2f}s each"
+    if snapshot.get('fragment_concurrency'):
+        text += f", {snapshot['fragment_concurrency']} in parallel"
+    return text
+
+
+def describe(snapshot):
+    """Short status line such as '42.0% of 120.3MiB at 2.1MiB/s, ETA 00:41'"""
+    if snapshot['percent'] is None:
+        return f"{format_bytes(snapshot['downloaded'])} at {format_bytes(snapshot['speed'])}/s (Unknown Size)"
+    return (f"{snapshot['percent']:.1f}% of {format_bytes(snapshot['total'])} at "
+            f"{format_bytes(snapshot['speed'])}/s, ETA {format_eta(snapshot['eta'])}")
+
+
+class _Meter:
+    """Exponentially smoothed transfer rate for one job"""
+
+    def __init__(self):
+        self.last_time = None
+        self.last_bytes = 0
+        self.speed = None
+
+    def sample(self, downloaded, now):
+        if self.last_time is None or downloaded < self.last_bytes:
+            # First sample, or yt-dlp moved on to the next file (e.g. audio after video)
+            self.last_time, self.last_bytes = now, downloaded
+            return self.speed
+        elapsed = now - self.last_time
+        if elapsed < MIN_SAMPLE_INTERVAL:
+            return self.speed
+        rate = (downloaded - self.last_bytes) / elapsed
+        if self.speed is None:
+            self.speed = rate
+        else:
+            self.speed += (1 - math.exp(-elapsed / SPEED_SMOOTHING)) * (rate - self.speed)
+        self.last_time, self.last_bytes = now, downloaded
+        return self.speed
+
+
+class ProgressReporter:
+    """callback(key, snapshot) runs on the Tk thread at most once per key per tick.
+
+    snapshot has status, downloaded, total, percent (None if the size is
+    unknown), speed, eta, filename, fragment_index, fragment_count, and for
+    turbo downloads fragment_seconds and fragment_concurrency."""
+
+    def __init__(self, root, callback, interval_ms=100):
+        self.root = root
+        self.callback = callback
+        self.interval_ms = interval_ms
+        self._lock = threading.Lock()
+        self._latest = {}
+        self._meters = {}
+        self._calls = []
+        self._running = True
+        self.root.after(self.interval_ms, self._tick)
+
+    def hook(self, key):
+        """A yt-dlp progress hook that reports under key"""
+        return lambda d: self.report(key, d)
+
+    def report(self, key, d):
+        """Record a yt-dlp progress dict; safe to call from any thread"""
+        downloaded = d.get('downloaded_bytes') or 0
+        total = d.get('total_bytes') or d.get('total_bytes_estimate')
+        with self._lock:
+            meter = self._meters.get(key)
+            if meter is None:
+                meter = self._meters[key] = _Meter()
+            speed = meter.sample(downloaded, time.monotonic()) if d['status'] == 'downloading' else meter.speed
+            percent = None
+            eta = None
+            if total:
+                percent = min(downloaded * 100 / total, 100.0)
+                if speed:
+                    eta = max(total - downloaded, 0) / speed
+            if d['status'] == 'finished':
+                percent = 100.0
+                eta = 0
+            self._latest[key] = {
+                'status': d['status'],
+                'downloaded': downloaded,
+                'total': total,
+                'percent': percent,
+                'speed': speed,
+                'eta': eta,
+                'filename': d.get('filename'),
+                'fragment_index': d.get('fragment_index'),
+                'fragment_count': d.get('fragment_count'),
+                'fragment_seconds': d.get('fragment_seconds'),
+                'fragment_concurrency': d.get('fragment_concurrency'),
+            }
+
+    def post(self, func, *args):
+        """Run func(*args) on the Tk thread at the next tick, after pending progress, in order"""
+        with self._lock:
+            self._calls.append((func, args))
+
+    def discard(self, key):
+        """Forget a finished job so no stale progress is delivered for it"""
+        with self._lock:
+            self._latest.pop(key, None)
+            self._meters.pop(key, None)
+
+    def stop(self):
+        self._running = False
+
+    def _tick(self):
+        if not self._running:
+            return
+        with self._lock:
+            latest, self._latest = self._latest, {}
+            calls, self._calls = self._calls, []
+        updates = [(self.callback, (key, snapshot)) for key, snapshot in latest.items()] + calls
+        for func, args in updates:
+            try:
+                func(*args)
+            except Exception as e:
+                logging.error(f"Progress update failed: {e}")
+        self.root.after(self.interval_ms, self._tick)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""Multi-connection byte-range downloader for progressive (single file) formats.
+
+Hosts that throttle each connection cap a single stream far below the link
+speed. The file is split into byte ranges that are fetched over a small pool
+of persistent connections into a preallocated .part file. When a connection
+runs out of work it takes over the back half of the segment that would
+otherwise finish last. Servers that ignore Range get one plain stream.
+
+Only the standard library is used, so a local http.server that honours
+Range is enough to exercise every path."""
+import http.client
+import logging
+import os
+import re
+import ssl
+import threading
+import time
+from urllib.parse import urlsplit, urljoin
+
+import disk_space
+
+DEFAULT_CONNECTIONS = 4
+CHUNK_SIZE = 256 * 1024
+# Never split a segment into pieces smaller than this
+MIN_SEGMENT_SIZE = 1024 * 1024
+MAX_REDIRECTS = 5
+SEGMENT_RETRIES = 3
+
+CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+
+
+class SegmentedDownloadError(Exception):
+    pass
+
+
+class _WriteError(Exception):
+    """Writing to the .part file failed; not retried, since the bytes were already claimed"""
+
+
+# Everything a failed transfer can raise; callers fall back to another downloader on these
+NETWORK_ERRORS = (SegmentedDownloadError, OSError, http.client.HTTPException)
+
+
+class _Segment:
+    def __init__(self, start, end):
+        self.start = start
+        self.end = end          # inclusive; may shrink when another connection takes over the tail
+        self.pos = start        # next byte to fetch
+        self.started = None
+        self.worker = None
+
+    @property
+    def remaining(self):
+        return max(self.end - self.pos + 1, 0)
+
+    def rate(self, now):
+        if not self.started or now <= self.started:
+            return 0
+        return (self.pos - self.start) / (now - self.started)
+
+
+def _connect(parts, timeout):
+    port = parts.port
+    if parts.scheme == 'https':
+        return http.client.HTTPSConnection(parts.hostname, port, timeout=timeout,
+                                           context=ssl.create_default_context())
+    return http.client.HTTPConnection(parts.hostname, port, timeout=timeout)
+
+
+def _request_path(parts):
+    return (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+
+
+class SegmentedDownloader:
+    """download(url, path) returns a result dict with per-segment throughput.
+
+    progress_hooks get yt-dlp style dicts (status, downloaded_bytes,
+    total_bytes, filename, tmpfilename) from the worker threads, so
+    SecondGen's pause/cancel checkpoint works unchanged: a hook that raises
+    aborts the whole download."""
+
+    def __init__(self, connections=DEFAULT_CONNECTIONS, headers=None, progress_hooks=None,
+                 chunk_size=CHUNK_SIZE, min_segment_size=MIN_SEGMENT_SIZE, timeout=30):
+        self.connections = max(1, connections)
+        self.headers = dict(headers or {})
+        self.headers['Accept-Encoding'] = 'identity'  # byte offsets must match the file
+        self.progress_hooks = list(progress_hooks or [])
+        self.chunk_size = chunk_size
+        self.min_segment_size = min_segment_size
+        self.timeout = timeout
+
+    # --- probing ---
+
+    def _open(self, url, extra_headers=None):
+        """GET url, following redirects; returns (final_url, connection, response)"""
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            conn = _connect(parts, self.timeout)
+            conn.request('GET', _request_path(parts), headers=dict(self.headers, **(extra_headers or {})))
+            response = conn.getresponse()
+            if response.status in (301, 302, 303, 307, 308) and response.getheader('Location'):
+                url = urljoin(url, response.getheader('Location'))
+                response.read()
+                conn.close()
+                continue
+            return url, conn, response
+        raise SegmentedDownloadError(f"Too many redirects for {url}")
+
+    def probe(self, url):
+        """(final_url, total_size or None, supports_ranges, connection, response)"""
+        final_url, conn, response = self._open(url, {'Range': 'bytes=0-0'})
+        if response.status == 206:
+            match = CONTENT_RANGE.match(response.getheader('Content-Range') or '')
+            response.read()
+            if match and match.group(3) != '*':
+                return final_url, int(match.group(3)), True, conn, None
+            conn.close()
+            return final_url, None, False, None, None
+        if response.status == 200:
+            length = response.getheader('Content-Length')
+            return final_url, int(length) if length else None, False, conn, response
+        conn.close()
+        raise SegmentedDownloadError(f"HTTP {response.status} {response.reason} for {url}")
+
+    # --- download ---
+
+    def download(self, url, path):
+        started = time.monotonic()
+        tmp_path = f"{path}.part"
+        final_url, size, ranged, conn, response = self.probe(url)
+
+        if not ranged or not size or size < 2 * self.min_segment_size or self.connections == 1:
+            if response is None:
+                if conn:
+                    conn.close()
+                final_url, conn, response = self._open(final_url)
+            logging.info(f"Single-stream download of {url} (ranges {'supported' if ranged else 'not supported'})")
+            try:
+                written = self._single_stream(response, tmp_path, size, path)
+            finally:
+                conn.close()
+            os.replace(tmp_path, path)
+            elapsed = time.monotonic() - started
+            return {'path': path, 'bytes': written, 'duration': round(elapsed, 3), 'ranged': False,
+                    'connections': 1, 'segments': [{'start': 0, 'end': written - 1, 'bytes': written,
+                                                    'seconds': round(elapsed, 3),
+                                                    'throughput': written / elapsed if elapsed else 0}]}
+
+        conn.close()
+        self._preallocate(tmp_path, size)
+        segments = self._run_segments(final_url, tmp_path, size, path)
+        actual = os.path.getsize(tmp_path)
+        if actual != size:
+            raise SegmentedDownloadError(f"Size mismatch for {url}: expected {size}, got {actual}")
+        os.replace(tmp_path, path)
+        elapsed = time.monotonic() - started
+        logging.info(f"Downloaded {size} bytes of {url} over {self.connections} connections in {elapsed:.1f}s "
+                     f"({len(segments)} segments)")
+        return {'path': path, 'bytes': size, 'duration': round(elapsed, 3), 'ranged': True,
+                'connections': self.connections, 'segments': segments}
+
+    def _preallocate(self, tmp_path, size):
+        with open(tmp_path, 'wb') as f:
+            disk_space.preallocate(f, size)
+
+    def _report(self, downloaded, total, path, tmp_path):
+        status = {'status': 'downloading', 'downloaded_bytes': downloaded, 'total_bytes': total,
+                  'filename': path, 'tmpfilename': tmp_path}
+        for hook in self.progress_hooks:
+            hook(status)
+
+    def _single_stream(self, response, tmp_path, size, path):
+        written = 0
+        with open(tmp_path, 'wb') as f:
+            if size:
+                # One extent up front; a short transfer fails below anyway
+                disk_space.preallocate(f, size)
+            while True:
+                chunk = response.read(self.chunk_size)
+                if not chunk:
+                    break
+                f.write(chunk)
+                written += len(chunk)
+                self._report(written, size, path, tmp_path)
+        if size and written != size:
+            raise SegmentedDownloadError(f"Connection closed after {written} of {size} bytes")
+        return written
+
+    def _run_segments(self, url, tmp_path, size, path):
+        segment_size = -(-size // self.connections)
+        pending = [_Segment(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+        state = {
+            'lock': threading.Lock(),
+            'pending': pending,
+            'active': [],
+            'finished': [],
+            'downloaded': 0,
+            'error': None,
+        }
+        workers = [threading.Thread(target=self._worker, args=(n, url, tmp_path, size, path, state),
+                                    name=f"segment-{n}", daemon=True)
+                   for n in range(min(self.connections, len(pending)))]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if state['error'] is not None:
+            raise state['error']
+        return sorted(state['finished'], key=lambda s: s['start'])
+
+    def _next_segment(self, worker_id, state):
+        """A pending segment, or the tail of the active one that would finish last. Caller holds the lock."""
+        if state['pending']:
+            return state['pending'].pop(0)
+        now = time.monotonic()
+        victim = None
+        worst = 0
+        for segment in state['active']:
+            if segment.remaining < 2 * self.min_segment_size:
+                continue
+            rate = segment.rate(now)
+            eta = segment.remaining / rate if rate else float('inf')
+            if eta > worst:
+                victim, worst = segment, eta
+        if victim is None:
+            return None
+        middle = victim.pos + victim.remaining // 2
+        tail = _Segment(middle, victim.end)
+        victim.end = middle - 1
+        logging.debug(f"Connection {worker_id} took bytes {tail.start}-{tail.end} from connection {victim.worker}")
+        return tail
+
+    def _worker(self, worker_id, url, tmp_path, size, path, state):
+        parts = urlsplit(url)
+        conn = None
+        lock = state['lock']
+        try:
+            with open(tmp_path, 'r+b') as f:
+                while True:
+                    with lock:
+                        if state['error'] is not None:
+                            return
+                        segment = self._next_segment(worker_id, state)
+                        if segment is None:
+                            return
+                        segment.worker = worker_id
+                        segment.started = time.monotonic()
+                        state['active'].append(segment)
+                    conn = self._fetch_segment(conn, parts, segment, f, size, path, tmp_path, state)
+                    elapsed = time.monotonic() - segment.started
+                    fetched = segment.pos - segment.start
+                    with lock:
+                        state['active'].remove(segment)
+                        state['finished'].append({
+                            'start': segment.start, 'end': segment.pos - 1, 'bytes': fetched,
+                            'seconds': round(elapsed, 3), 'connection': worker_id,
+                            'throughput': fetched / elapsed if elapsed else 0,
+                        })
+        except Exception as e:
+            with lock:
+                if state['error'] is None:
+                    state['error'] = e
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def _fetch_segment(self, conn, parts, segment, f, size, path, tmp_path, state):
+        """Fetch one segment, retrying on connection errors; returns the connection to reuse (or None)"""
+        attempts = 0
+        while segment.pos <= segment.end:
+            if conn is None:
+                conn = _connect(parts, self.timeout)
+            requested_end = segment.end
+            try:
+                conn.request('GET', _request_path(parts),
+                             headers=dict(self.headers, Range=f"bytes={segment.pos}-{requested_end}"))
+                response = conn.getresponse()
+                if response.status != 206:
+                    response.read()
+                    raise SegmentedDownloadError(f"HTTP {response.status} for range {segment.pos}-{requested_end}")
+                match = CONTENT_RANGE.match(response.getheader('Content-Range') or '')
+                if not match or int(match.group(1)) != segment.pos:
+                    raise SegmentedDownloadError(f"Server sent the wrong range for {segment.pos}-{requested_end}")
+                while segment.pos <= segment.end:
+                    chunk = response.read(min(self.chunk_size, segment.end - segment.pos + 1))
+                    if not chunk:
+                        raise SegmentedDownloadError(f"Connection closed at byte {segment.pos}")
+                    with state['lock']:
+                        # The tail may have been handed to another connection while we read.
+                        # Claiming the bytes before writing them means a later split starts after them.
+                        chunk = chunk[:segment.end - segment.pos + 1]
+                        offset = segment.pos
+                        segment.pos += len(chunk)
+                        state['downloaded'] += len(chunk)
+                        downloaded = state['downloaded']
+                    try:
+                        f.seek(offset)
+                        f.write(chunk)
+                    except OSError as e:
+                        raise _WriteError(f"Could not write {tmp_path}: {e}") from e
+                    self._report(downloaded, size, path, tmp_path)
+                if segment.end < requested_end:
+                    # Another connection took over our tail; the rest of this response is unread
+                    conn.close()
+                    conn = None
+            except (OSError, http.client.HTTPException, SegmentedDownloadError) as e:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                attempts += 1
+                if attempts > SEGMENT_RETRIES:
+                    raise
+                logging.warning(f"Segment {segment.pos}-{segment.end} failed ({e}), retrying ({attempts}/{SEGMENT_RETRIES})")
+                time.sleep(attempts)
+        return conn
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""Structured per-job telemetry, and non-blocking logging for the apps.
+
+downloader_core.download() keeps a JobTelemetry for every call and writes
+one JSON line per phase to the 'telemetry' logger:
+
+    {"event": "phase", "phase": "extract", "job": "3f2a...", "seconds": 1.8, "strategy": "mobile", ...}
+    {"event": "phase", "phase": "transfer", "ttfb": 0.42, "bytes": 73400320,
+     "avg_bps": 5242880, "peak_bps": 9437184, "fragments": 412, "fragment_retries": 3, ...}
+    {"event": "phase", "phase": "merge", "seconds": 2.1, "queued": 0.3, ...}
+    {"event": "job", "outcome": "done", "seconds": 19.6, "phases": {"extract": 1.8, ...}, ...}
+
+setup_logging() replaces the logging.basicConfig(DEBUG) calls: worker
+threads only put records on a queue, and one listener thread writes the
+text log and the telemetry file, each rotated by size."""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+import uuid
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+MAX_BYTES = 10 * 1024 * 1024
+BACKUP_COUNT = 5
+# Throughput is sampled over windows of at least this long for peak_bps
+RATE_WINDOW = 1.0
+# yt-dlp post-processor names, as the phase names postprocess_pool uses
+PHASE_NAMES = {'Merger': 'merge', 'ExtractAudio': 'extract_audio', 'VideoConvertor': 'convert',
+               'VideoRemuxer': 'convert'}
+
+logger = logging.getLogger('telemetry')
+logger.setLevel(logging.INFO)
+# Telemetry lines go only to the telemetry file, never into the text log
+logger.propagate = False
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+class _JsonLines(logging.Formatter):
+    def format(self, record):
+        return json.dumps(record.msg, ensure_ascii=False, default=str)
+
+
+def setup_logging(log_file=None, telemetry_file=None, level=logging.INFO, max_bytes=MAX_BYTES,
+                  backup_count=BACKUP_COUNT):
+    """Route the root logger (if log_file) and telemetry (if telemetry_file) through one queue.
+
+    Files rotate at max_bytes, keeping backup_count old ones. Safe to call
+    more than once; only the first call configures anything."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return _listener
+        records = queue.SimpleQueue()
+        handlers = []
+        if log_file:
+            text = logging.handlers.RotatingFileHandler(log_file, maxBytes=max_bytes, backupCount=backup_count,
+                                                        encoding='utf-8')
+            text.setFormatter(logging.Formatter(TEXT_FORMAT))
+            text.addFilter(lambda record: record.name != logger.name)
+            handlers.append(text)
+            root = logging.getLogger()
+            root.addHandler(logging.handlers.QueueHandler(records))
+            root.setLevel(level)
+        if telemetry_file:
+            jsonl = logging.handlers.RotatingFileHandler(telemetry_file, maxBytes=max_bytes,
+                                                         backupCount=backup_count, encoding='utf-8')
+            jsonl.setFormatter(_JsonLines())
+            jsonl.addFilter(lambda record: record.name == logger.name)
+            handlers.append(jsonl)
+            logger.addHandler(_RawQueueHandler(records))
+        _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+        return _listener
+
+
+def shutdown():
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class _RawQueueHandler(logging.handlers.QueueHandler):
+    # QueueHandler.prepare() formats msg into a string; telemetry keeps its dict for _JsonLines
+    def prepare(self, record):
+        return record
+
+
+def emit(record):
+    """Write one telemetry record (a JSON-serialisable dict); a no-op until setup_logging(telemetry_file=...)"""
+    if logger.handlers:
+        record.setdefault('time', round(time.time(), 3))
+        logger.info(record)
+
+
+class JobTelemetry:
+    """Timings and transfer statistics of one download.
+
+    transfer_hook and postprocessor_hook go into the yt-dlp options; phase()
+    times a block; finish() writes the job record with the outcome."""
+
+    def __init__(self, url, **fields):
+        self.id = uuid.uuid4().hex[:12]
+        self.fields = dict(url=url, **fields)
+        self.started = time.monotonic()
+        self.phases = {}
+        self._lock = threading.Lock()
+        self._finished = False
+        self._transfer_started = None
+        self._first_byte = None
+        self._file_bytes = {}
+        self._last_sample = None
+        self._peak = 0.0
+        self._pp_started = {}
+        self._pp_seconds = 0.0
+
+    def note(self, **fields):
+        """Add fields to every later record of this job (e.g. strategy, extractor)"""
+        with self._lock:
+            self.fields.update(fields)
+
+    def record_phase(self, name, seconds, **fields):
+        with self._lock:
+            self.phases[name] = round(self.phases.get(name, 0) + seconds, 3)
+            record = dict(self.fields, event='phase', job=self.id, phase=name, seconds=round(seconds, 3), **fields)
+        emit(record)
+
+    def phase(self, name, **fields):
+        return _Phase(self, name, fields)
+
+    # --- transfer ---
+
+    def start_transfer(self):
+        with self._lock:
+            self._transfer_started = time.monotonic()
+
+    def transfer_hook(self, d):
+        if d['status'] not in ('downloading', 'finished'):
+            return
+        now = time.monotonic()
+        name = d.get('tmpfilename') or d.get('filename')
+        done = d.get('downloaded_bytes') or (d.get('total_bytes') if d['status'] == 'finished' else 0) or 0
+        with self._lock:
+            if self._transfer_started is None:
+                self._transfer_started = now
+            if done and self._first_byte is None:
+                self._first_byte = now
+            self._file_bytes[name] = max(done, self._file_bytes.get(name, 0))
+            total = sum(self._file_bytes.values())
+            if self._last_sample is None:
+                self._last_sample = (now, total)
+            elif now - self._last_sample[0] >= RATE_WINDOW:
+                self._peak = max(self._peak, (total - self._last_sample[1]) / (now - self._last_sample[0]))
+                self._last_sample = (now, total)
+
+    def end_transfer(self, meter=None, error=None, **fields):
+        """Write the transfer record; meter is the turbo FragmentMeter, if any"""
+        now = time.monotonic()
+        with self._lock:
+            if self._transfer_started is None:
+                return
+            # yt-dlp runs its post-processors inside the transfer; they have their own records
+            seconds = max(now - self._transfer_started - self._pp_seconds, 0)
+            total = sum(self._file_bytes.values())
+            stats = {
+                'ttfb': round(self._first_byte - self._transfer_started, 3) if self._first_byte else None,
+                'bytes': total,
+                'avg_bps': round(total / seconds) if seconds > 0 else None,
+                'peak_bps': round(max(self._peak, total / seconds if seconds > 0 else 0)),
+                'files': len(self._file_bytes),
+            }
+            self._transfer_started = None
+            self._pp_seconds = 0.0
+        if meter is not None:
+            stats.update(fragments=meter.fragments, fragment_retries=meter.errors, fragment_forbidden=meter.forbidden,
+                         throttled=meter.throttled, concurrency=meter.concurrency)
+        if error is not None:
+            stats['error'] = str(error)
+        self.record_phase('transfer', seconds, **stats, **fields)
+
+    # --- yt-dlp's own post-processors (merger, audio extraction, conversion) ---
+
+    def postprocessor_hook(self, d):
+        name = d.get('postprocessor') or 'postprocess'
+        if d['status'] == 'started':
+            self._pp_started[name] = time.monotonic()
+        elif d['status'] == 'finished' and name in self._pp_started:
+            seconds = time.monotonic() - self._pp_started.pop(name)
+            with self._lock:
+                if self._transfer_started is not None:
+                    self._pp_seconds += seconds
+            self.record_phase(PHASE_NAMES.get(name, name.lower()), seconds)
+
+    def finish(self, outcome, error=None, **fields):
+        """Write the job record once; later calls are ignored"""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            record = dict(self.fields, event='job', job=self.id, outcome=outcome,
+                          seconds=round(time.monotonic() - self.started, 3), phases=dict(self.phases), **fields)
+        if error is not None:
+            record['error'] = str(error)
+        emit(record)
+
+
+class _Phase:
+    def __init__(self, trace, name, fields):
+        self.trace = trace
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        return self.fields
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.fields['error'] = str(exc)
+        self.trace.record_phase(self.name, time.monotonic() - self.started, **self.fields)
+        return False
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""SegmentedDownloader against a local http.server that honours Range.
+
+    python -m pytest test_segmented_download.py
+"""
+import http.server
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+import segmented_download
+
+PAYLOAD = random.Random(1234).randbytes(256 * 1024)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, as the downloader reuses its connections
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.headers.get('Range'))
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if not match or not server.ranges:
+            self._send(200, PAYLOAD, {})
+            return
+        start = int(match.group(1))
+        end = min(int(match.group(2)) if match.group(2) else len(PAYLOAD) - 1, len(PAYLOAD) - 1)
+        with server.lock:
+            fault = server.faults.pop(start, None) if start else None
+        if fault == 'wrong-range':
+            start += 1
+        body = PAYLOAD[start:end + 1]
+        headers = {'Content-Range': f"bytes {start}-{end}/{len(PAYLOAD)}"}
+        if fault == 'short-read':
+            # Announce the whole range, send half of it and hang up
+            self._send(206, body[:len(body) // 2], headers, length=len(body))
+            self.close_connection = True
+            return
+        self._send(206, body, headers, slow=start < server.slow_below)
+
+    def _send(self, status, body, headers, length=None, slow=False):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body) if length is None else length))
+        self.end_headers()
+        step = 4096
+        for pos in range(0, len(body), step):
+            self.wfile.write(body[pos:pos + step])
+            if slow:
+                self.wfile.flush()
+                time.sleep(0.01)
+
+
+class SegmentedDownloadTest(unittest.TestCase):
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.ranges = True
+        self.server.faults = {}
+        self.server.slow_below = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/video.mp4"
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'video.mp4')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.dir)
+
+    def download(self, connections, **kwargs):
+        kwargs.setdefault('min_segment_size', 16 * 1024)
+        kwargs.setdefault('chunk_size', 4096)
+        result = segmented_download.SegmentedDownloader(connections, **kwargs).download(self.url, self.path)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), PAYLOAD)
+        self.assertFalse(os.path.exists(self.path + '.part'))
+        self.assertEqual(result['bytes'], len(PAYLOAD))
+        return result
+
+    def test_single_connection(self):
+        result = self.download(1)
+        self.assertFalse(result['ranged'])
+
+    def test_four_connections(self):
+        result = self.download(4)
+        self.assertTrue(result['ranged'])
+        self.assertEqual(sum(segment['bytes'] for segment in result['segments']), len(PAYLOAD))
+        self.assertGreaterEqual(len({segment['connection'] for segment in result['segments']}), 2)
+
+    def test_server_without_ranges(self):
+        self.server.ranges = False
+        result = self.download(4)
+        self.assertFalse(result['ranged'])
+
+    def test_slow_segment_is_split(self):
+        # The first quarter crawls, so the connections done early take over its tail
+        self.server.slow_below = 1
+        result = self.download(4)
+        self.assertGreater(len(result['segments']), 4)
+        self.assertEqual(sum(segment['bytes'] for segment in result['segments']), len(PAYLOAD))
+        starts = sorted(segment['start'] for segment in result['segments'])
+        self.assertEqual(len(starts), len(set(starts)))
+
+    def test_wrong_range_is_retried(self):
+        self.server.faults[len(PAYLOAD) // 4] = 'wrong-range'
+        self.download(4)
+
+    def test_short_read_is_retried(self):
+        self.server.faults[len(PAYLOAD) // 2] = 'short-read'
+        self.download(4)
+        # The retry asks only for what was not received yet
+        resumed = [r for r in self.server.requests
+                   if r and len(PAYLOAD) // 2 < int(r[6:].split('-')[0]) < len(PAYLOAD) * 3 // 4]
+        self.assertTrue(resumed)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+"""Background thumbnail loading for the preview lists.
+
+Images are fetched on a thread pool through one pooled HTTP session, decoded
+and resized off the Tk thread, and kept in a memory LRU plus an on-disk cache
+keyed by a hash of URL and size. Only the PhotoImage is created on the Tk
+thread, when the result is handed to the row's callback."""
+import collections
+import concurrent.futures
+import hashlib
+import io
+import logging
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image, ImageTk
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thumbnail_cache')
+
+
+class ThumbnailLoader:
+    def __init__(self, root, size=(120, 67), workers=8, memory_items=512, cache_dir=DEFAULT_CACHE_DIR, timeout=5):
+        self.root = root
+        self.size = tuple(size)
+        self.timeout = timeout
+        self.memory_items = memory_items
+        self.cache_dir = cache_dir
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers, max_retries=1)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36'
+
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnail")
+        self._memory = collections.OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def cache_key(self, url):
+        return hashlib.sha1(f"{self.size[0]}x{self.size[1]}:{url}".encode('utf-8')).hexdigest()
+
+    def request(self, url, callback):
+        """Load a thumbnail and call callback(photo_image_or_None) on the Tk thread.
+
+        Must be called from the Tk thread. Memory hits are delivered immediately."""
+        key = self.cache_key(url)
+        with self._lock:
+            image = self._memory.get(key)
+            if image is not None:
+                self._memory.move_to_end(key)
+        if image is not None:
+            callback(ImageTk.PhotoImage(image))
+            return
+
+        generation = self._generation
+        with self._lock:
+            waiting = self._pending.get(key)
+            if waiting is not None:
+                waiting.append((generation, callback))
+                return
+            self._pending[key] = [(generation, callback)]
+        future = self._executor.submit(self._load, url, key)
+        future.add_done_callback(lambda f, key=key: self._finished(key, f))
+
+    def cancel_pending(self):
+        """Drop callbacks for everything requested so far (e.g. the list was cleared)"""
+        self._generation += 1
+
+    def get_cached(self, url):
+        """PIL image from the memory cache, or None"""
+        with self._lock:
+            return self._memory.get(self.cache_key(url))
+
+    def close(self):
+        self.cancel_pending()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+    # --- worker side ---
+
+    def _load(self, url, key):
+        image = self._load_from_disk(key)
+        if image is None:
+            response = self.session.get(url, timeout=self.timeout)
+            response.raise_for_status()
+            image = Image.open(io.BytesIO(response.content))
+            image.thumbnail(self.size, Image.LANCZOS)
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+            self._save_to_disk(key, image)
+        image.load()
+        with self._lock:
+            self._memory[key] = image
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_items:
+                self._memory.popitem(last=False)
+        return image
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.png")
+
+    def _load_from_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with Image.open(path) as image:
+                image.load()
+                return image.copy()
+        except Exception as e:
+            logging.error(f"Corrupt cached thumbnail {path}: {e}")
+            os.remove(path)
+            return None
+
+    def _save_to_disk(self, key, image):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            image.save(tmp_path, format='PNG')
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logging.error(f"Could not cache thumbnail {path}: {e}")
+
+    def _finished(self, key, future):
+        with self._lock:
+            callbacks = self._pending.pop(key, [])
+        try:
+            image = future.result()
+        except Exception as e:
+            logging.error(f"Failed to load thumbnail: {e}")
+            image = None
+        self.root.after(0, self._deliver, image, callbacks)
+
+    # --- Tk side ---
+
+    def _deliver(self, image, callbacks):
+        photo = ImageTk.PhotoImage(image) if image is not None else None
+        for generation, callback in callbacks:
+            if generation != self._generation:
+                continue
+            try:
+                callback(photo)
+            except Exception as e:
+                logging.error(f"Thumbnail callback failed: {e}")
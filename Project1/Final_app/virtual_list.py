@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""Virtualized, scrollable list for tkinter.
+
+Only the rows in the viewport (plus a small buffer) have widgets. Row widgets
+are built once per slot and recycled as the list scrolls, so memory stays
+flat whether the list has 20 entries or 20,000."""
+import tkinter as tk
+from tkinter import Canvas, Scrollbar
+
+
+class VirtualList(tk.Frame):
+    """make_row(parent) builds one reusable row widget.
+    bind_row(row, index, item) fills a row for an item.
+    unbind_row(row) is called before a row is reused or hidden; drop images there."""
+
+    def __init__(self, master, row_height, make_row, bind_row, unbind_row=None, buffer_rows=3,
+                 row_padding=5, bg="#fdf6ec", **kwargs):
+        super().__init__(master, bg=bg, **kwargs)
+        self.row_height = row_height
+        self.row_padding = row_padding
+        self.make_row = make_row
+        self.bind_row = bind_row
+        self.unbind_row = unbind_row
+        self.buffer_rows = buffer_rows
+        self.items = []
+
+        self.canvas = Canvas(self, bg=bg, highlightthickness=0)
+        self.scrollbar = Scrollbar(self, orient="vertical", command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=self._on_yscroll)
+        self.canvas.pack(side="left", fill="both", expand=True)
+        self.scrollbar.pack(side="right", fill="y")
+        self.canvas.bind("<Configure>", self._on_configure)
+
+        self._free = []      # (row, window_id) not showing anything
+        self._bound = {}     # item index -> (row, window_id)
+        self._width = 1
+        self._refresh_pending = False
+
+    # --- public API ---
+
+    def set_items(self, items):
+        """Replace the whole list and scroll back to the top"""
+        for index in list(self._bound):
+            self._release(index)
+        self.items = list(items)
+        self._update_scrollregion()
+        self.canvas.yview_moveto(0)
+        self.refresh()
+
+    def append(self, item):
+        self.items.append(item)
+        self._update_scrollregion()
+        self.schedule_refresh()
+
+    def update_item(self, index, item):
+        """Replace one item; re-binds its row if it is currently materialised"""
+        self.items[index] = item
+        if index in self._bound:
+            row, _ = self._bound[index]
+            if self.unbind_row:
+                self.unbind_row(row)
+            self.bind_row(row, index, item)
+
+    def visible_range(self):
+        """(first, last) item indices currently in the viewport, last exclusive"""
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), 1)
+        stride = self.row_height + self.row_padding
+        first = max(int(top // stride), 0)
+        last = min(int((top + height) // stride) + 1, len(self.items))
+        return first, last
+
+    def row_count(self):
+        """Number of row widgets that exist (not the number of items)"""
+        return len(self._free) + len(self._bound)
+
+    def schedule_refresh(self):
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.after_idle(self.refresh)
+
+    def refresh(self):
+        self._refresh_pending = False
+        first, last = self.visible_range()
+        first = max(first - self.buffer_rows, 0)
+        last = min(last + self.buffer_rows, len(self.items))
+
+        for index in [i for i in self._bound if i < first or i >= last]:
+            self._release(index)
+
+        stride = self.row_height + self.row_padding
+        for index in range(first, last):
+            if index in self._bound:
+                continue
+            row, window_id = self._free.pop() if self._free else self._new_slot()
+            self.canvas.coords(window_id, 0, index * stride)
+            self.canvas.itemconfigure(window_id, state="normal")
+            self._bound[index] = (row, window_id)
+            self.bind_row(row, index, self.items[index])
+
+    # --- internals ---
+
+    def _new_slot(self):
+        row = self.make_row(self.canvas)
+        window_id = self.canvas.create_window(0, 0, window=row, anchor="nw",
+                                              width=self._width, height=self.row_height)
+        return row, window_id
+
+    def _release(self, index):
+        row, window_id = self._bound.pop(index)
+        if self.unbind_row:
+            self.unbind_row(row)
+        self.canvas.itemconfigure(window_id, state="hidden")
+        self._free.append((row, window_id))
+
+    def _update_scrollregion(self):
+        total = len(self.items) * (self.row_height + self.row_padding)
+        self.canvas.configure(scrollregion=(0, 0, self._width, total))
+
+    def _on_yscroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.schedule_refresh()
+
+    def _on_configure(self, event):
+        self._width = max(event.width, 1)
+        for row, window_id in list(self._bound.values()) + self._free:
+            self.canvas.itemconfigure(window_id, width=self._width)
+        self._update_scrollregion()
+        self.schedule_refresh()
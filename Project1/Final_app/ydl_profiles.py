@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+"""Precomputed yt-dlp option profiles.
+
+The profiles below are built once per registry. build() hands out a copy with
+the per-job overlay applied; only the nested lists and dicts are copied, so a
+caller can change its headers or hooks without touching the shared profile.
+The cookies.txt and ffmpeg lookups are cached too. Retries and fragment
+concurrency for every downloader are tuned here."""
+import os
+import threading
+import time
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+COOKIE_FILE = 'cookies.txt'
+
+# Filesystem checks are repeated at most this often (cookies.txt can appear while the app runs)
+FS_CHECK_TTL = 60
+
+RETRY_OPTS = {
+    'retries': 10,
+    'fragment_retries': 10,
+    'extractor_retries': 5,
+}
+CONCURRENT_FRAGMENTS = 1
+
+DESKTOP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+}
+
+NAVIGATION_HEADERS = dict(DESKTOP_HEADERS, **{
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+})
+
+MOBILE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 14_7_1 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/14.1.2 Mobile/15E148 Safari/604.1',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+EXTERNALHIT_HEADERS = {
+    'User-Agent': 'facebookexternalhit/1.1 (+http://www.facebook.com/externalhit_uatext.php)',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Accept-Language': 'en-us,en;q=0.5',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+EXTRACTION_BASE = {
+    'quiet': True,
+    'extract_flat': False,
+    'force_generic_extractor': False,
+    'skip_download': True,
+    'simulate': True,
+    'getthumbnail': True,
+    'ignoreerrors': False,
+    'dump_single_json': True,
+}
+
+DOWNLOAD_BASE = dict(RETRY_OPTS, **{
+    'concurrent_fragment_downloads': CONCURRENT_FRAGMENTS,
+    'restrictfilenames': True,
+    'postprocessors': [],
+    'no_warnings': True,
+    'quiet': True,
+    'noplaylist': False,
+    'outtmpl': '%(title)s_%(id)s.%(ext)s',
+})
+
+# A pure audio format; only sites without one fall back to the smallest format that has sound
+AUDIO_FORMAT = "bestaudio/worst[acodec!=none]"
+
+# name -> (base options, headers, profile specific options)
+PROFILE_SPECS = {
+    'desktop': (EXTRACTION_BASE, DESKTOP_HEADERS, {}),
+    'navigation': (EXTRACTION_BASE, NAVIGATION_HEADERS, {}),
+    'mobile': (EXTRACTION_BASE, MOBILE_HEADERS, {}),
+    'externalhit': (EXTRACTION_BASE, EXTERNALHIT_HEADERS, {}),
+    'best-1080': (DOWNLOAD_BASE, DESKTOP_HEADERS, {
+        'format': "best[height<=1080]/bestvideo[height<=1080]+bestaudio/best",
+        'merge_output_format': 'mp4',
+    }),
+    'worst': (DOWNLOAD_BASE, DESKTOP_HEADERS, {
+        'format': "worstvideo+worstaudio/worst",
+        'merge_output_format': 'mp4',
+    }),
+    # Keeps the native codec (m4a/opus): ffmpeg only copies the audio stream out
+    'audio-only': (DOWNLOAD_BASE, DESKTOP_HEADERS, {
+        'format': AUDIO_FORMAT,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'best',
+        }],
+        'extract_audio': True,
+    }),
+    'audio-mp3': (DOWNLOAD_BASE, DESKTOP_HEADERS, {
+        'format': AUDIO_FORMAT,
+        'postprocessors': [{
+            'key': 'FFmpegExtractAudio',
+            'preferredcodec': 'mp3',
+            'preferredquality': '192',
+        }],
+        'extract_audio': True,
+    }),
+}
+
+# Quality names used by the GUIs and the batch CLI
+QUALITY_PROFILES = {
+    'best': 'best-1080',
+    'worst': 'worst',
+    'audio': 'audio-only',
+    'audio-mp3': 'audio-mp3',
+}
+
+
+def _copy_nested(value):
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+class ProfileRegistry:
+    def __init__(self, cookie_path=COOKIE_FILE, ffmpeg_dir=MODULE_DIR):
+        self.cookie_path = cookie_path
+        self.ffmpeg_path = os.path.join(ffmpeg_dir, 'ffmpeg.exe')
+        self._profiles = {}
+        for name, (base, headers, specific) in PROFILE_SPECS.items():
+            opts = dict(base, http_headers=dict(headers))
+            opts.update(specific)
+            self._profiles[name] = opts
+        self._checks = {}
+        self._lock = threading.Lock()
+
+    def names(self):
+        return list(self._profiles)
+
+    def is_download_profile(self, name):
+        return PROFILE_SPECS[name][0] is DOWNLOAD_BASE
+
+    def _cached_check(self, key, probe):
+        now = time.monotonic()
+        with self._lock:
+            checked = self._checks.get(key)
+            if checked and now - checked[0] < FS_CHECK_TTL:
+                return checked[1]
+        value = probe()
+        with self._lock:
+            self._checks[key] = (now, value)
+        return value
+
+    def cookie_file(self):
+        return self._cached_check('cookies', lambda: self.cookie_path if os.path.exists(self.cookie_path) else None)
+
+    def ffmpeg_location(self):
+        return self._cached_check('ffmpeg', lambda: self.ffmpeg_path if os.path.exists(self.ffmpeg_path) else None)
+
+    def refresh(self):
+        """Forget the cached filesystem checks, e.g. after cookies.txt was rewritten"""
+        with self._lock:
+            self._checks.clear()
+
+    def build(self, name, cookies=False, **overlay):
+        """Options for one job: a copy of the named profile with overlay applied on top"""
+        opts = {key: _copy_nested(value) for key, value in self._profiles[name].items()}
+        if self.is_download_profile(name):
+            ffmpeg_path = self.ffmpeg_location()
+            if ffmpeg_path:
+                opts['ffmpeg_location'] = ffmpeg_path
+        if cookies:
+            opts['cookiefile'] = self.cookie_file()
+        opts.update(overlay)
+        return opts
+
+    def for_quality(self, quality, cookies=False, **overlay):
+        return self.build(QUALITY_PROFILES.get(quality, 'best-1080'), cookies=cookies, **overlay)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_default_registry():
+    """Process-wide registry, built on first use"""
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = ProfileRegistry()
+        return _default_registry
@@ -4,13 +4,17 @@ from tkinter import ttk, messagebox, filedialog
 from yt_dlp import YoutubeDL
 import os
 import re
-import urllib.request
-from PIL import Image, ImageTk
-from io import BytesIO
+import sys
 import threading
-import queue
 import logging
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final_app'))  # Shared helpers
+import cookie_store
+import postprocess_planner
+from progress_reporter import ProgressReporter, describe
+from thumbnail_cache import ThumbnailLoader
+from virtual_list import VirtualList
+
 class VideoDownloader:
     def __init__(self, root):
         self.root = root
@@ -21,10 +25,10 @@ class VideoDownloader:
         self.app_dir = os.path.abspath(os.path.dirname(__file__) if '__file__' in globals() else os.getcwd())
         self.setup_logging()
 
-        # Threading queue for progress updates
-        self.progress_queue = queue.Queue()
         self.is_downloading = False
         self.active_button = None
+        self.active_url = None
+        self.thumbnail_loader = ThumbnailLoader(self.root, size=(100, 56))
 
         # Apply colorful theme
         style = ttk.Style()
@@ -78,8 +82,8 @@ class VideoDownloader:
         self.progress = ttk.Progressbar(root, orient="horizontal", length=300, mode="determinate", style="TProgressbar")
         self.progress.pack(pady=10)
 
-        # Start polling for progress updates
-        self.check_progress_queue()
+        # Progress from download threads is coalesced and pushed to the widgets at 10 Hz
+        self.progress_reporter = ProgressReporter(self.root, self.show_progress)
 
     def setup_logging(self):
         log_file = os.path.join(self.app_dir, 'download_log.txt')
@@ -96,34 +100,24 @@ class VideoDownloader:
             self.location_entry.insert(0, folder)
 
     def update_progress(self, d):
-        if d['status'] == 'downloading':
-            try:
-                percent_str = d.get('_percent_str', '0%')
-                clean_percent = re.sub(r'\x1b\[[0-9;]*[mK]', '', percent_str).replace('%', '')
-                percent = float(clean_percent)
-                self.progress_queue.put(('progress', percent))
-            except (ValueError, AttributeError):
-                self.progress_queue.put(('progress', min(self.progress['value'] + 1, 100)))
-        elif d['status'] == 'finished':
-            self.progress_queue.put(('progress', 100))
-            self.progress_queue.put(('status', 'Download complete!', 'green'))
-
-    def check_progress_queue(self):
-        try:
-            while True:
-                msg_type, value, *extra = self.progress_queue.get_nowait()
-                if msg_type == 'progress':
-                    self.progress['value'] = value
-                elif msg_type == 'status':
-                    color = extra[0] if extra else 'blue'
-                    self.status_label.config(text=value, foreground=color)
-                    if value == 'Download complete!' and self.active_button:
-                        self.active_button.configure(style="Download.TButton")
-                        self.active_button = None
-                self.root.update_idletasks()
-        except queue.Empty:
-            pass
-        self.root.after(100, self.check_progress_queue)
+        self.progress_reporter.report('download', d)
+        if d['status'] == 'finished':
+            self.progress_reporter.post(self.set_status, 'Download complete!', 'green')
+
+    def show_progress(self, key, snapshot):
+        if snapshot['percent'] is not None:
+            self.progress['value'] = snapshot['percent']
+        if snapshot['status'] == 'downloading':
+            self.status_label.config(text=describe(snapshot), foreground="blue")
+
+    def set_progress(self, value):
+        self.progress['value'] = value
+
+    def set_status(self, value, color='blue'):
+        self.status_label.config(text=value, foreground=color)
+        if value == 'Download complete!' and self.active_button:
+            self.active_button.configure(style="Download.TButton")  # Revert button color
+            self.active_button = None
 
     def validate_url(self, url):
         url = url.strip()
@@ -155,16 +149,6 @@ class VideoDownloader:
 
         return None, None
 
-    def fetch_thumbnail(self, url):
-        try:
-            with urllib.request.urlopen(url) as response:
-                img_data = response.read()
-            img = Image.open(BytesIO(img_data))
-            img = img.resize((100, 56), Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(img)
-        except Exception:
-            return None
-
     def analyze_url(self):
         if self.is_downloading:
             messagebox.showwarning("Warning", "A download is already in progress. Please wait.")
@@ -224,19 +208,50 @@ class VideoDownloader:
         playlist_window.geometry("600x400")
         playlist_window.configure(bg="#E8F5E9")
 
-        canvas = tk.Canvas(playlist_window, bg="#E8F5E9")
-        scrollbar = ttk.Scrollbar(playlist_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        scrollbar.pack(side="right", fill="y")
-        canvas.pack(side="left", fill="both", expand=True)
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+        videos = [video for video in videos if video and video.get('url')]
+
+        def make_row(parent):
+            frame = ttk.Frame(parent)
+            frame.item = None
+            frame.thumbnail = ttk.Label(frame)
+            frame.thumbnail.pack(side="left", padx=5)
+            frame.title = ttk.Label(frame, wraplength=400, style="TLabel", foreground="#2E7D32")
+            frame.title.pack(side="left", padx=5)
+            frame.button = ttk.Button(frame, text="Download", style="Download.TButton")
+            frame.button.pack(side="right", padx=5)
+            frame.button.config(command=lambda f=frame: self.start_download_thread(f.item['url'], "youtube", save_path, f.button))
+            return frame
+
+        def bind_row(frame, idx, video):
+            frame.item = video
+            frame.title.config(text=video.get('title', f"Video {idx + 1}"))
+            if self.is_downloading and video['url'] == self.active_url:
+                self.active_button = frame.button
+                frame.button.configure(style="Active.TButton")
+            else:
+                if self.active_button is frame.button:
+                    self.active_button = None
+                frame.button.configure(style="Download.TButton")
+            frame.thumbnail.config(image="")
+            frame.thumbnail.image = None
+            if video.get('thumbnail'):
+                self.thumbnail_loader.request(video['thumbnail'], lambda photo, f=frame, v=video: set_thumbnail(f, v, photo))
+
+        def unbind_row(frame):
+            frame.item = None
+            frame.thumbnail.config(image="")
+            frame.thumbnail.image = None
+
+        def set_thumbnail(frame, video, photo):
+            if frame.item is video and photo:
+                frame.thumbnail.config(image=photo)
+                frame.thumbnail.image = photo
+
+        # Only the visible rows are real widgets, so huge playlists stay cheap
+        video_list = VirtualList(playlist_window, row_height=66, make_row=make_row, bind_row=bind_row,
+                                 unbind_row=unbind_row, bg="#E8F5E9")
+        video_list.pack(fill="both", expand=True)
+        canvas = video_list.canvas
 
         def on_mouse_wheel(event):
             canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
@@ -251,32 +266,7 @@ class VideoDownloader:
         canvas.bind_all("<Button-4>", on_button_4)
         canvas.bind_all("<Button-5>", on_button_5)
 
-        self.photo_references = []
-        playlist_window.photo_references = self.photo_references
-
-        for idx, video in enumerate(videos):
-            if not video.get('url'):
-                continue
-            frame = ttk.Frame(scrollable_frame)
-            frame.pack(fill="x", padx=5, pady=5)
-
-            thumbnail_url = video.get('thumbnail')
-            if thumbnail_url:
-                photo = self.fetch_thumbnail(thumbnail_url)
-                if photo:
-                    self.photo_references.append(photo)
-                    ttk.Label(frame, image=photo).pack(side="left", padx=5)
-
-            title = video.get('title', f"Video {idx + 1}")
-            ttk.Label(frame, text=title, wraplength=400, style="TLabel", foreground="#2E7D32").pack(side="left", padx=5)
-
-            button = ttk.Button(
-                frame,
-                text="Download",
-                style="Download.TButton"
-            )
-            button.pack(side="right", padx=5)
-            button.config(command=lambda url=video['url'], plat="youtube", sp=save_path, btn=button: self.start_download_thread(url, plat, sp, btn))
+        video_list.set_items(videos)
 
     def start_download_thread(self, url, platform, save_path, button):
         if self.is_downloading:
@@ -285,6 +275,7 @@ class VideoDownloader:
 
         self.is_downloading = True
         self.active_button = button
+        self.active_url = url
         if button:
             button.configure(style="Active.TButton")
 
@@ -322,6 +313,9 @@ class VideoDownloader:
             self.status_label.config(text=f"Error: {str(e)}", foreground="red")
             messagebox.showerror("Error", str(e))
 
+    def report_postprocess(self, report):
+        self.progress_reporter.post(self.set_status, f"MP4 {report['action']} took {report['seconds']:.1f}s", 'blue')
+
     def download_video(self, url, platform, save_path):
         try:
             ffmpeg_path = os.path.join(self.app_dir, 'ffmpeg.exe') if os.path.exists(os.path.join(self.app_dir, 'ffmpeg.exe')) else 'ffmpeg'
@@ -339,10 +333,6 @@ class VideoDownloader:
                     ),
                     'Accept-Language': 'en-US,en;q=0.9',
                 },
-                'postprocessors': [{
-                    'key': 'FFmpegVideoConvertor',
-                    'preferedformat': 'mp4',
-                }],
                 'ffmpeg_location': ffmpeg_path,
                 'verbose': True,
             }
@@ -356,18 +346,22 @@ class VideoDownloader:
                 else:
                     logging.warning("No cookies.txt found. Facebook download may fail due to authentication.")
 
-            with YoutubeDL(ydl_opts) as ydl:
+            # Shares one cookie jar with any other download in this process instead of rewriting cookies.txt
+            with cookie_store.open_ydl(ydl_opts) as ydl:
+                # Remux when the codecs already fit MP4, re-encode only when they do not
+                ydl.add_post_processor(postprocess_planner.ContainerPolicyPP(
+                    ydl, ffmpeg_location=ffmpeg_path, on_report=self.report_postprocess), when='post_process')
                 logging.info(f"Starting download for URL: {url}")
                 ydl.download([url])
                 logging.info("Download completed successfully")
 
-            self.progress_queue.put(('status', f"{platform.capitalize()} video downloaded successfully!", 'green'))
-            self.progress_queue.put(('progress', 100))
+            self.progress_reporter.post(self.set_status, f"{platform.capitalize()} video downloaded successfully!", 'green')
+            self.progress_reporter.post(self.set_progress, 100)
 
         except Exception as e:
             logging.error(f"Download failed: {str(e)}")
-            self.progress_queue.put(('status', f"Error: {str(e)}", 'red'))
-            self.progress_queue.put(('progress', 0))
+            self.progress_reporter.post(self.set_status, f"Error: {str(e)}", 'red')
+            self.progress_reporter.post(self.set_progress, 0)
         finally:
             self.is_downloading = False
 
@@ -1,14 +1,15 @@
 import yt_dlp
 import tkinter as tk
 from tkinter import filedialog, messagebox, Canvas, Scrollbar, Frame, ttk
-from PIL import Image, ImageTk
-import requests
-import io
 import threading
 import os
+import sys
 import datetime
 import re # Import regex for sanitizing filenames
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final_app')) # Shared helpers
+from thumbnail_cache import ThumbnailLoader
+
 class MediaDownloaderApp:
     def __init__(self, root):
         self.root = root
@@ -18,6 +19,7 @@ class MediaDownloaderApp:
         self.media_results = []
         self.save_path = ""
         self.download_in_progress = False # Flag to prevent multiple concurrent downloads
+        self.thumbnail_loader = ThumbnailLoader(root, size=(160, 90)) # Background, cached thumbnail fetching
 
         # --- Input Frame ---
         input_frame = Frame(root, bg="#d9eb76", padx=10, pady=10)
@@ -101,6 +103,7 @@ class MediaDownloaderApp:
 
         for widget in self.scrollable_content.winfo_children():
             widget.destroy() # Clear previous results
+        self.thumbnail_loader.cancel_pending() # Ignore thumbnails still loading for the old results
 
         self.progress_label.config(text="Fetching media info...")
         self.progress.start()
@@ -138,24 +141,12 @@ class MediaDownloaderApp:
                 container = Frame(self.scrollable_content, bg="white", bd=1, relief="solid")
                 container.pack(fill="x", pady=5, padx=10) # Reduced pady for closer packing
 
-                # Handle potential missing thumbnail or errors
-                tk_img = None
+                # Placeholder first; the thumbnail is fetched in the background and swapped in
+                thumbnail = tk.Label(container, text="Loading..." if result.get('thumbnail') else "No Image",
+                                     bg="white", width=20, height=5, relief="groove")
+                thumbnail.pack(side="left", padx=10, pady=5)
                 if result.get('thumbnail'):
-                    try:
-                        response = requests.get(result['thumbnail'], timeout=5)
-                        img_data = response.content
-                        img = Image.open(io.BytesIO(img_data)).resize((160, 90), Image.LANCZOS) # Smaller size for better performance
-                        tk_img = ImageTk.PhotoImage(img)
-                    except Exception as img_e:
-                        print(f"Failed to load thumbnail for {result.get('title')}: {img_e}")
-                        # Fallback to no image label if thumbnail fails
-                
-                if tk_img:
-                    thumbnail = tk.Label(container, image=tk_img, bg="white")
-                    thumbnail.image = tk_img # Keep a reference
-                    thumbnail.pack(side="left", padx=10, pady=5)
-                else:
-                    tk.Label(container, text="No Image", bg="white", width=20, height=5, relief="groove").pack(side="left", padx=10, pady=5)
+                    self.thumbnail_loader.request(result['thumbnail'], lambda tk_img, label=thumbnail: self._set_thumbnail(label, tk_img))
 
 
                 info_frame = Frame(container, bg="white")
@@ -175,6 +166,16 @@ class MediaDownloaderApp:
         
         self.canvas.update_idletasks() # Update canvas scroll region after adding content
 
+    def _set_thumbnail(self, label, tk_img):
+        """Swap the placeholder for the loaded thumbnail (runs on the main thread)."""
+        if not label.winfo_exists():
+            return
+        if tk_img is None:
+            label.config(text="No Image")
+            return
+        label.config(image=tk_img, text="", width=0, height=0, relief="flat")
+        label.image = tk_img # Keep a reference
+
     def download_media(self, media_url, title):
         if self.download_in_progress:
             messagebox.showwarning("Warning", "A download is already in progress. Please wait.")
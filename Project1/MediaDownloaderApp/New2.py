@@ -3,11 +3,14 @@ from tkinter import ttk, messagebox, filedialog
 from yt_dlp import YoutubeDL
 import os
 import re
-import urllib.request
-from PIL import Image, ImageTk
-from io import BytesIO
+import sys
 import threading
-import queue
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Final_app'))  # Shared helpers
+import download_archive
+from progress_reporter import ProgressReporter, describe
+from thumbnail_cache import ThumbnailLoader
+from virtual_list import VirtualList
 
 class VideoDownloader:
     def __init__(self, root):
@@ -15,10 +18,11 @@ class VideoDownloader:
         self.root.title("Facebook & YouTube Video Downloader (Updated July 2025)")
         self.root.geometry("500x450")
 
-        # Threading queue for progress updates
-        self.progress_queue = queue.Queue()
         self.is_downloading = False
         self.active_button = None  # Track the currently downloading button
+        self.active_url = None
+        self.thumbnail_loader = ThumbnailLoader(self.root, size=(100, 56))
+        self.archive = download_archive.get_default_archive()
 
         # Apply colorful theme
         style = ttk.Style()
@@ -67,8 +71,8 @@ class VideoDownloader:
         self.progress = ttk.Progressbar(root, orient="horizontal", length=300, mode="determinate", style="TProgressbar")
         self.progress.pack(pady=10)
 
-        # Start polling for progress updates
-        self.check_progress_queue()
+        # Progress from download threads is coalesced and pushed to the widgets at 10 Hz
+        self.progress_reporter = ProgressReporter(self.root, self.show_progress)
 
     def browse_location(self):
         """Open a dialog to select download folder."""
@@ -79,35 +83,25 @@ class VideoDownloader:
 
     def update_progress(self, d):
         """Update progress bar during download (called from download thread)."""
-        if d['status'] == 'downloading':
-            try:
-                percent_str = d.get('_percent_str', '0%')
-                clean_percent = re.sub(r'\x1b\[[0-9;]*[mK]', '', percent_str).replace('%', '')
-                percent = float(clean_percent)
-                self.progress_queue.put(('progress', percent))
-            except (ValueError, AttributeError):
-                self.progress_queue.put(('progress', min(self.progress['value'] + 1, 100)))
-        elif d['status'] == 'finished':
-            self.progress_queue.put(('progress', 100))
-            self.progress_queue.put(('status', 'Download complete!', 'green'))
-
-    def check_progress_queue(self):
-        """Poll the queue for progress and status updates."""
-        try:
-            while True:
-                msg_type, value, *extra = self.progress_queue.get_nowait()
-                if msg_type == 'progress':
-                    self.progress['value'] = value
-                elif msg_type == 'status':
-                    color = extra[0] if extra else 'blue'
-                    self.status_label.config(text=value, foreground=color)
-                    if value == 'Download complete!' and self.active_button:
-                        self.active_button.configure(style="Download.TButton")  # Revert button color
-                        self.active_button = None
-                self.root.update_idletasks()
-        except queue.Empty:
-            pass
-        self.root.after(100, self.check_progress_queue)
+        self.progress_reporter.report('download', d)
+        if d['status'] == 'finished':
+            self.progress_reporter.post(self.set_status, 'Download complete!', 'green')
+
+    def show_progress(self, key, snapshot):
+        if snapshot['percent'] is not None:
+            self.progress['value'] = snapshot['percent']
+        if snapshot['status'] == 'downloading':
+            self.status_label.config(text=describe(snapshot), foreground="blue")
+
+    def set_progress(self, value):
+        self.progress['value'] = value
+
+    def set_status(self, value, color='blue'):
+        """Apply a status message on the Tk thread."""
+        self.status_label.config(text=value, foreground=color)
+        if value in ('Download complete!', 'Already downloaded, skipped') and self.active_button:
+            self.active_button.configure(style="Download.TButton")  # Revert button color
+            self.active_button = None
 
     def validate_url(self, url):
         """Validate and standardize URL, detect platform and playlist."""
@@ -140,17 +134,6 @@ class VideoDownloader:
         
         return None, None
 
-    def fetch_thumbnail(self, url):
-        """Fetch and resize thumbnail image."""
-        try:
-            with urllib.request.urlopen(url) as response:
-                img_data = response.read()
-            img = Image.open(BytesIO(img_data))
-            img = img.resize((100, 56), Image.Resampling.LANCZOS)
-            return ImageTk.PhotoImage(img)
-        except Exception:
-            return None
-
     def analyze_url(self):
         """Analyze URL and display playlist videos if applicable."""
         if self.is_downloading:
@@ -209,25 +192,59 @@ class VideoDownloader:
             messagebox.showerror("Error", str(e))
 
     def show_playlist_videos(self, videos, save_path):
-        """Display a scrollable list of videos with thumbnails and download buttons."""
+        """Display a scrollable list of videos with thumbnails and download buttons.
+
+        Only the rows on screen exist as widgets; they are recycled while scrolling."""
         playlist_window = tk.Toplevel(self.root)
         playlist_window.title("Select Videos to Download")
         playlist_window.geometry("600x400")
         playlist_window.configure(bg="#ECB689")  # Light green background
 
-        canvas = tk.Canvas(playlist_window, bg="#75F07F")
-        scrollbar = ttk.Scrollbar(playlist_window, orient="vertical", command=canvas.yview)
-        scrollable_frame = ttk.Frame(canvas)
-
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
-        canvas.configure(yscrollcommand=scrollbar.set)
-
-        scrollbar.pack(side="right", fill="y")
-        canvas.pack(side="left", fill="both", expand=True)
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
+        videos = [video for video in videos if video and video.get('url')]
+
+        def make_row(parent):
+            frame = ttk.Frame(parent)
+            frame.item = None
+            frame.thumbnail = ttk.Label(frame)
+            frame.thumbnail.pack(side="left", padx=5)
+            frame.title = ttk.Label(frame, wraplength=400, style="TLabel", foreground="#2E7D32")
+            frame.title.pack(side="left", padx=5)
+            frame.button = ttk.Button(frame, text="Download", style="Download.TButton")
+            frame.button.pack(side="right", padx=5)
+            frame.button.config(command=lambda f=frame: self.start_download_thread(f.item['url'], "youtube", save_path, f.button))
+            return frame
+
+        def bind_row(frame, idx, video):
+            frame.item = video
+            frame.title.config(text=video.get('title', f"Video {idx + 1}"))
+            frame.button.config(text="Downloaded" if self.archive.contains_info(video) else "Download")
+            # The button follows the video it was pressed for, not the recycled widget
+            if self.is_downloading and video['url'] == self.active_url:
+                self.active_button = frame.button
+                frame.button.configure(style="TButton")
+            else:
+                if self.active_button is frame.button:
+                    self.active_button = None
+                frame.button.configure(style="Download.TButton")
+            frame.thumbnail.config(image="")
+            frame.thumbnail.image = None
+            if video.get('thumbnail'):
+                self.thumbnail_loader.request(video['thumbnail'], lambda photo, f=frame, v=video: set_thumbnail(f, v, photo))
+
+        def unbind_row(frame):
+            frame.item = None
+            frame.thumbnail.config(image="")
+            frame.thumbnail.image = None  # Let the PhotoImage go once the row scrolls away
+
+        def set_thumbnail(frame, video, photo):
+            if frame.item is video and photo:
+                frame.thumbnail.config(image=photo)
+                frame.thumbnail.image = photo
+
+        video_list = VirtualList(playlist_window, row_height=66, make_row=make_row, bind_row=bind_row,
+                                 unbind_row=unbind_row, bg="#75F07F")
+        video_list.pack(fill="both", expand=True)
+        canvas = video_list.canvas
 
         # Enable mouse wheel and touchpad scrolling
         def on_mouse_wheel(event):
@@ -243,31 +260,7 @@ class VideoDownloader:
         canvas.bind_all("<Button-4>", on_button_4)  # Linux/macOS
         canvas.bind_all("<Button-5>", on_button_5)  # Linux/macOS
 
-        self.photo_references = []
-
-        for idx, video in enumerate(videos):
-            if not video.get('url'):
-                continue
-            frame = ttk.Frame(scrollable_frame)
-            frame.pack(fill="x", padx=5, pady=5)
-
-            thumbnail_url = video.get('thumbnail')
-            if thumbnail_url:
-                photo = self.fetch_thumbnail(thumbnail_url)
-                if photo:
-                    self.photo_references.append(photo)
-                    ttk.Label(frame, image=photo).pack(side="left", padx=5)
-
-            title = video.get('title', f"Video {idx + 1}")
-            ttk.Label(frame, text=title, wraplength=400, style="TLabel", foreground="#2E7D32").pack(side="left", padx=5)
-
-            button = ttk.Button(
-                frame,
-                text="Download",
-                style="Download.TButton",
-                command=lambda url=video['url'], plat="youtube", sp=save_path, btn=frame: self.start_download_thread(url, plat, sp, btn.winfo_children()[-1])
-            )
-            button.pack(side="right", padx=5)
+        video_list.set_items(videos)
 
     def start_download_thread(self, url, platform, save_path, button=None):
         """Start download in a separate thread."""
@@ -277,6 +270,7 @@ class VideoDownloader:
 
         self.is_downloading = True
         self.active_button = button
+        self.active_url = url
         if button:
             button.configure(style="TButton")  # Change to default style (gray) when downloading
 
@@ -309,15 +303,20 @@ class VideoDownloader:
                 ydl_opts['extractor_args'] = {'facebook': {'skip_dash_manifest': True}}
                 ydl_opts['http_headers']['Referer'] = 'https://www.facebook.com/'
 
+            skipped = download_archive.SkipSummary()
             with YoutubeDL(ydl_opts) as ydl:
+                self.archive.attach(ydl, on_skip=skipped)
                 ydl.download([url])
 
-            self.progress_queue.put(('status', f"{platform.capitalize()} video downloaded successfully!", 'green'))
-            self.progress_queue.put(('progress', 100))
+            if skipped:
+                self.progress_reporter.post(self.set_status, 'Already downloaded, skipped', 'green')
+            else:
+                self.progress_reporter.post(self.set_status, f"{platform.capitalize()} video downloaded successfully!", 'green')
+            self.progress_reporter.post(self.set_progress, 100)
 
         except Exception as e:
-            self.progress_queue.put(('status', f"Error: {str(e)}", 'red'))
-            self.progress_queue.put(('progress', 0))
+            self.progress_reporter.post(self.set_status, f"Error: {str(e)}", 'red')
+            self.progress_reporter.post(self.set_progress, 0)
         finally:
             self.is_downloading = False
 